@@ -1,16 +1,22 @@
 from fastapi import APIRouter, Request, HTTPException, Query
 from pydantic import BaseModel
-from app.supabase_client import supabase
 from app.supabase_client import (
     create_supabase_user,
-    hash_pw,
+    check_password,
+    hash_password,
     insert_user_record,
-    verify_password,
     get_user_record,
-    get_social_accounts,
+    PasswordQueueFull,
+    get_social_accounts as fetch_social_accounts,
+    get_social_account_tokens,
+    get_user_id_by_email,
+    run_blocking,
 )
+from app.auth import password_queue_full
 import logging
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 class RegisterRequest(BaseModel):
@@ -22,41 +28,49 @@ class LoginRequest(BaseModel):
     password: str
 
 @router.post("/register")
-def register_user(data: RegisterRequest):
-    existing = get_user_record(data.email)
+async def register_user(data: RegisterRequest):
+    existing = await run_blocking(get_user_record, data.email)
     if existing:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    uid = create_supabase_user(data.email, data.password)
-    hashed = hash_pw(data.password)
-    insert_user_record(uid, data.email, hashed)
+    # Hash first: a full bcrypt queue must not leave an orphaned Supabase user
+    try:
+        hashed = await hash_password(data.password)
+    except PasswordQueueFull:
+        raise password_queue_full()
+    uid = await run_blocking(create_supabase_user, data.email, data.password)
+    await run_blocking(insert_user_record, uid, data.email, hashed)
     return {"message": "User registered", "uid": uid}
 
 @router.post("/login")
-def login_user(data: LoginRequest):
-    user = get_user_record(data.email)
+async def login_user(data: LoginRequest):
+    user = await run_blocking(get_user_record, data.email)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not verify_password(data.password, user["password_hash"].encode()):
+    try:
+        valid = await check_password(data.password, user["password_hash"].encode())
+    except PasswordQueueFull:
+        raise password_queue_full()
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect password")
 
     return {"message": "Login successful", "user_id": user["id"]}
 
 @router.get("/api/social-accounts")
 async def get_social_accounts(request: Request):
-    print("Session:", request.session)
+    logger.debug("Session: %s", request.session)
     user = request.session.get("user")
     if not user or "id" not in user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
     try:
         user_id = user["id"]
-        response = supabase.table("social_accounts").select("*").eq("user_id", user_id).execute()
-        print("Supabase response:", response)
-        return {"accounts": response.data}
-    except Exception as e:
-        print("Error:", e)
+        accounts = await run_blocking(fetch_social_accounts, user_id)
+        logger.debug("Supabase response: %s", accounts)
+        return {"accounts": accounts}
+    except Exception:
+        logger.exception("Failed to load social accounts for user %s", user_id)
         raise HTTPException(status_code=500, detail="Internal server error")
     
 
@@ -69,18 +83,15 @@ async def get_social_accounts_by_email(email: str = Query(..., description="User
 
     try:
         # Fetch user by email
-        users_response = supabase.table("users_app").select("id").eq("email", email).execute()
-        users = users_response.data
+        user_id = await run_blocking(get_user_id_by_email, email)
 
-        if not users:
+        if not user_id:
             raise HTTPException(status_code=404, detail="User not found")
 
-        user_id = users[0]["id"]
         logging.debug(f"Found user_id: {user_id}")
 
         # Fetch related social accounts
-        accounts_response = supabase.table("social_accounts").select("provider, account_id, access_token").eq("user_id", user_id).execute()
-        accounts = accounts_response.data
+        accounts = await run_blocking(get_social_account_tokens, user_id)
 
         if not accounts:
             raise HTTPException(status_code=404, detail="No social accounts found for this user")
@@ -95,6 +106,8 @@ async def get_social_accounts_by_email(email: str = Query(..., description="User
             "access_token_fb": fb_account["access_token"] if fb_account else None
         }
 
-    except Exception as e:
-        logging.exception("Unhandled exception occurred")
+    except HTTPException:
+        raise
+    except Exception:
+        logger.exception("Failed to look up social accounts for %s", email)
         raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
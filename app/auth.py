@@ -2,12 +2,15 @@
 from fastapi import APIRouter, Request, HTTPException, Header, Depends
 from pydantic import BaseModel, EmailStr, Field
 from app.supabase_client import (
-    supabase, create_supabase_user, hash_pw,
-    get_user_record, insert_user_record, verify_password
+    supabase, create_supabase_user, check_password, hash_password,
+    get_user_record, insert_user_record, run_blocking, PasswordQueueFull
 )
+from app.metrics import TOKEN_CACHE_LOOKUPS
+from app.ttl_cache import TTLCache
 from jose import JWTError, jwt
 import os
-from typing import Dict
+import time
+from typing import Dict, Optional
 from datetime import datetime, timedelta
 import logging
 
@@ -22,6 +25,12 @@ SECRET_KEY = "aff51256575b1b07cc23ec80c8ddb362"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Verified claims per token, so repeat calls skip the signature check. Entries
+# never outlive the token's own `exp`.
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", "300"))
+_verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=TOKEN_CACHE_TTL)
+
 ###############################################################################
 # Models
 ###############################################################################
@@ -49,11 +58,21 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_token(token: str):
+    cached = _verified_tokens.get(token)
+    if cached is not None:
+        TOKEN_CACHE_LOOKUPS.labels("hit").inc()
+        return dict(cached)
+    TOKEN_CACHE_LOOKUPS.labels("miss").inc()
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    ttl = TOKEN_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        _verified_tokens.set(token, dict(payload), ttl=ttl)
+    return payload
 
 def get_current_user(authorization: str = Header(...)):
     if not authorization.startswith("Bearer "):
@@ -61,25 +80,40 @@ def get_current_user(authorization: str = Header(...)):
     token = authorization.split(" ")[1]
     return decode_token(token)
 
+def get_optional_user(authorization: Optional[str] = Header(None)):
+    # Anonymous callers are allowed; a header that is sent must be valid
+    if authorization is None:
+        return None
+    return get_current_user(authorization)
+
 def verify_admin_token(user: dict = Depends(get_current_user)):
     if user.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+def password_queue_full():
+    """The 503 that login and register routes answer PasswordQueueFull with."""
+    return HTTPException(status_code=503, detail="Too many logins in progress", headers={"Retry-After": "1"})
+
 ###############################################################################
 # Routes
 ###############################################################################
 
 @router.post("/api/signup")
 async def signup(payload: SignUpPayload, user_info: Dict = Depends(verify_admin_token)):
-    existing_user = get_user_record(payload.email)
+    existing_user = await run_blocking(get_user_record, payload.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    uid = create_supabase_user(payload.email, payload.password, payload.role)
-    hashed_password = hash_pw(payload.password)
+    # Hash first: a full bcrypt queue must not leave an orphaned Supabase user
+    try:
+        hashed_password = await hash_password(payload.password)
+    except PasswordQueueFull:
+        raise password_queue_full()
+    uid = await run_blocking(create_supabase_user, payload.email, payload.password, payload.role)
 
-    insert_user_record(
+    await run_blocking(
+        insert_user_record,
         uid=uid,
         email=payload.email,
         hashed_pw=hashed_password,
@@ -94,8 +128,12 @@ async def signup(payload: SignUpPayload, user_info: Dict = Depends(verify_admin_
 
 @router.post("/api/login")
 async def login(payload: LoginPayload):
-    record = get_user_record(payload.email)
-    if not record or not verify_password(payload.password, record["password_hash"].encode()):
+    record = await run_blocking(get_user_record, payload.email)
+    try:
+        valid = bool(record) and await check_password(payload.password, record["password_hash"].encode())
+    except PasswordQueueFull:
+        raise password_queue_full()
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
     # Prepare user data for token and response
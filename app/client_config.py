@@ -1,3 +1,17 @@
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Supabase table with one row per client: email, tenant (optional, defaults to
+# the email), n8n_webhook and completion_webhook (optional). Rows replace the
+# built-in list below once loaded.
+CLIENT_CONFIG_TABLE = os.getenv("CLIENT_CONFIG_TABLE", "client_config")
+# Seconds between reloads from Supabase (0 = only use the built-in list)
+CLIENT_CONFIG_REFRESH = float(os.getenv("CLIENT_CONFIG_REFRESH", "60"))
+
 clients = [
     {
         "email": "granit.g4shii@gmail.com",
@@ -9,8 +23,75 @@ clients = [
     }
 ]
 
+
+class ClientRegistry:
+    """Client configs indexed by email and by tenant, reloaded from Supabase.
+
+    Lookups reload the table at most every `refresh` seconds, in the calling
+    thread. A failed reload keeps the current entries.
+    """
+
+    def __init__(self, entries, refresh=CLIENT_CONFIG_REFRESH):
+        self.refresh = refresh
+        self.loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._index(entries)
+
+    def _index(self, entries):
+        by_email, by_tenant = {}, {}
+        for entry in entries:
+            by_email[entry["email"]] = entry
+            by_tenant[entry.get("tenant") or entry["email"]] = entry
+        # Swapped in one assignment each, so readers never see a half-built index
+        self._by_email, self._by_tenant = by_email, by_tenant
+
+    def reload(self):
+        # Imported here: the Supabase client needs its env at import time
+        from app.supabase_client import supabase
+
+        try:
+            rows = supabase.table(CLIENT_CONFIG_TABLE).select("*").execute().data
+        except Exception:
+            logger.warning("Client config reload failed, keeping %d entries", len(self._by_email), exc_info=True)
+        else:
+            if rows:
+                self._index(rows)
+        self.loaded_at = time.monotonic()
+
+    def _maybe_reload(self):
+        if not self.refresh or time.monotonic() - self.loaded_at < self.refresh:
+            return
+        # One thread reloads; the others keep reading the current index
+        if self._lock.acquire(blocking=False):
+            try:
+                self.reload()
+            finally:
+                self._lock.release()
+
+    def by_email(self, email: str) -> dict | None:
+        self._maybe_reload()
+        return self._by_email.get(email)
+
+    def by_tenant(self, tenant: str) -> dict | None:
+        self._maybe_reload()
+        return self._by_tenant.get(tenant)
+
+
+registry = ClientRegistry(clients)
+
+
 def get_n8n_webhook_by_email(email: str) -> str | None:
-    for client in clients:
-        if client["email"] == email:
-            return client["n8n_webhook"]
-    return None
\ No newline at end of file
+    client = registry.by_email(email)
+    return client["n8n_webhook"] if client else None
+
+
+def get_completion_webhook(tenant: str) -> str | None:
+    """Where to POST job completion events for `tenant`, if anywhere."""
+    client = registry.by_tenant(tenant)
+    return client.get("completion_webhook") if client else None
+
+
+def get_tenant(email: str) -> str:
+    """Tenant a client's jobs are billed to: its configured tenant, else its email."""
+    client = registry.by_email(email)
+    return (client or {}).get("tenant") or email
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import logging
+
+import redis
+
+from app.redis_client import redis_client
+from app.scheduling import MAX_BACKLOG_SECONDS, RENDER_SLOT_TTL
+
+logger = logging.getLogger(__name__)
+
+# How long a submission may hold its in-flight key: the longest queue wait
+# admission allows, plus the render itself
+INFLIGHT_TTL = max(MAX_BACKLOG_SECONDS.values()) + RENDER_SLOT_TTL
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def request_fingerprint(image_urls, settings) -> str:
+    """Fingerprint of a submission, known before anything is downloaded."""
+    return _digest({"image_urls": list(image_urls), "settings": settings})
+
+
+def content_seed(image_paths) -> str:
+    """Seed derived from the image bytes, for deterministic template choice."""
+    return _digest([file_digest(p) for p in image_paths])
+
+
+def job_fingerprint(image_paths, transitions, settings) -> str:
+    """Fingerprint of the rendered output: image bytes + transitions + encode settings."""
+    return _digest({
+        "images": [file_digest(p) for p in image_paths],
+        "transitions": list(transitions),
+        "settings": settings,
+    })
+
+
+def _inflight_key(fingerprint: str) -> str:
+    return f"render:inflight:{fingerprint}"
+
+
+def _joined_key(job_id: str) -> str:
+    return f"render:joined:{job_id}"
+
+
+# Marks a joined-tenants set whose job has already sent its events
+_JOINED_CLOSED = "\x00closed"
+
+
+def claim_inflight(fingerprint: str, task_id: str):
+    """Register `task_id` as the job rendering `fingerprint`.
+
+    Returns None when the claim succeeded, or the id of the task already
+    working on it. Redis outages never block a submission.
+    """
+    try:
+        if redis_client.set(_inflight_key(fingerprint), task_id, nx=True, ex=INFLIGHT_TTL):
+            return None
+        return redis_client.get(_inflight_key(fingerprint))
+    except redis.RedisError:
+        logger.warning("Dedup claim skipped, Redis unavailable", exc_info=True)
+        return None
+
+
+def force_claim_inflight(fingerprint: str, task_id: str) -> None:
+    try:
+        redis_client.set(_inflight_key(fingerprint), task_id, ex=INFLIGHT_TTL)
+    except redis.RedisError:
+        logger.warning("Dedup claim skipped, Redis unavailable", exc_info=True)
+
+
+def release_inflight(fingerprint: str, task_id: str) -> None:
+    # Only the owner may release; a stale key from another task stays put
+    try:
+        key = _inflight_key(fingerprint)
+        if redis_client.get(key) == task_id:
+            redis_client.delete(key)
+    except redis.RedisError:
+        logger.warning("Dedup release skipped, Redis unavailable", exc_info=True)
+
+
+def join_inflight(job_id: str, tenant: str) -> bool:
+    """Record `tenant` as waiting on `job_id`, so its completion event reaches them too.
+
+    Returns False if the job has already sent its events, in which case the
+    caller should not join it. Redis outages never block a submission.
+    """
+    key = _joined_key(job_id)
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.sadd(key, tenant)
+            pipe.sismember(key, _JOINED_CLOSED)
+            pipe.expire(key, INFLIGHT_TTL)
+            _, closed, _ = pipe.execute()
+        return not closed
+    except redis.RedisError:
+        logger.warning("Dedup join not recorded, Redis unavailable", exc_info=True)
+        return True
+
+
+def close_joined(job_id: str) -> list:
+    """Tenants that joined `job_id`; anyone joining after this call is refused."""
+    key = _joined_key(job_id)
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.smembers(key)
+            pipe.sadd(key, _JOINED_CLOSED)
+            pipe.expire(key, INFLIGHT_TTL)
+            members, _, _ = pipe.execute()
+    except redis.RedisError:
+        logger.warning("Joined tenants not read, Redis unavailable", exc_info=True)
+        return []
+    return sorted(member for member in members if member != _JOINED_CLOSED)
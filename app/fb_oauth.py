@@ -1,15 +1,35 @@
+import asyncio
 from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import JSONResponse
-import os, uuid, json, urllib.parse, requests
+import os, uuid, json, logging, urllib.parse
+import httpx
 from dotenv import load_dotenv
-from app.supabase_client import upsert_social_record
+from app.http_client import get_http_client
+from app.supabase_client import run_blocking, social_record, upsert_social_records
 
 load_dotenv()
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 FB_APP_ID = os.getenv("FACEBOOK_APP_ID")
 FB_APP_SECRET = os.getenv("FACEBOOK_APP_SECRET")
 BASE_DOMAIN = os.getenv("BASE_DOMAIN", "localhost:8000")  # e.g. yourdomain.com/api/fb/callback
+GRAPH_API_URL = os.getenv("GRAPH_API_URL", "https://graph.facebook.com/v19.0")
+
+
+async def _instagram_account(client: httpx.AsyncClient, page: dict):
+    """The IG business account id linked to `page`, or None."""
+    try:
+        resp = await client.get(
+            f"{GRAPH_API_URL}/{page['id']}",
+            params={"fields": "instagram_business_account", "access_token": page["access_token"]}
+        )
+    except httpx.HTTPError:
+        logger.warning("IG lookup failed for page %s", page["id"], exc_info=True)
+        return None
+    if not resp.is_success:
+        return None
+    return resp.json().get("instagram_business_account", {}).get("id")
 
 # STEP 1: Return login URL to frontend
 @router.get("/api/fb/login-url")
@@ -28,7 +48,7 @@ async def get_fb_login_url(user_id: str):
 
 # STEP 2: Handle callback and respond to frontend
 @router.get("/api/fb/callback")
-def fb_callback(code: str = None, state: str = None, error: str = None, error_message: str = None):
+async def fb_callback(code: str = None, state: str = None, error: str = None, error_message: str = None):
     if error:
         return JSONResponse({"error": error_message}, status_code=400)
 
@@ -42,73 +62,73 @@ def fb_callback(code: str = None, state: str = None, error: str = None, error_me
         return JSONResponse({"error": f"Invalid state: {str(e)}"}, status_code=400)
 
     redirect_uri = f"https://{BASE_DOMAIN}/api/fb/callback"
+    client = get_http_client()
 
-    # Step 1: Short-lived token
-    token_response = requests.get("https://graph.facebook.com/v19.0/oauth/access_token", params={
-        "client_id": FB_APP_ID,
-        "redirect_uri": redirect_uri,
-        "client_secret": FB_APP_SECRET,
-        "code": code,
-    })
-    if not token_response.ok:
-        return JSONResponse({"error": "Failed to get short-lived token"}, status_code=400)
-
-    short_token = token_response.json().get("access_token")
-
-    # Step 2: Long-lived token
-    long_token_response = requests.get("https://graph.facebook.com/v19.0/oauth/access_token", params={
-        "grant_type": "fb_exchange_token",
-        "client_id": FB_APP_ID,
-        "client_secret": FB_APP_SECRET,
-        "fb_exchange_token": short_token,
-    })
-    long_token = long_token_response.json().get("access_token")
-
-    # Step 3: Get Pages
-    pages_response = requests.get("https://graph.facebook.com/v19.0/me/accounts", params={
-        "access_token": long_token,
-    })
-    pages = pages_response.json().get("data", [])
+    try:
+        # Step 1: Short-lived token
+        token_response = await client.get(f"{GRAPH_API_URL}/oauth/access_token", params={
+            "client_id": FB_APP_ID,
+            "redirect_uri": redirect_uri,
+            "client_secret": FB_APP_SECRET,
+            "code": code,
+        })
+        if not token_response.is_success:
+            return JSONResponse({"error": "Failed to get short-lived token"}, status_code=400)
+
+        short_token = token_response.json().get("access_token")
+
+        # Step 2: Long-lived token
+        long_token_response = await client.get(f"{GRAPH_API_URL}/oauth/access_token", params={
+            "grant_type": "fb_exchange_token",
+            "client_id": FB_APP_ID,
+            "client_secret": FB_APP_SECRET,
+            "fb_exchange_token": short_token,
+        })
+        long_token = long_token_response.json().get("access_token")
+
+        # Step 3: Get Pages
+        pages_response = await client.get(f"{GRAPH_API_URL}/me/accounts", params={
+            "access_token": long_token,
+        })
+        pages = pages_response.json().get("data", [])
+    except httpx.HTTPError:
+        logger.exception("Graph API request failed")
+        return JSONResponse({"error": "Facebook is unavailable, try again"}, status_code=502)
 
     if not pages:
         return JSONResponse({"error": "No Facebook Pages found"}, status_code=400)
 
-    page = pages[0]
-    page_id = page["id"]
-    page_token = page["access_token"]
+    # Step 4: IG accounts (optional), for every page at once
+    ig_ids = await asyncio.gather(*(_instagram_account(client, page) for page in pages))
 
-    # Step 4: Get IG Account (optional)
-    ig_id = None
-    ig_response = requests.get(
-        f"https://graph.facebook.com/v19.0/{page_id}",
-        params={"fields": "instagram_business_account", "access_token": page_token}
-    )
-    if ig_response.ok:
-        ig_data = ig_response.json().get("instagram_business_account", {})
-        ig_id = ig_data.get("id")
-
-    # Step 5: Save to Supabase
-    upsert_social_record(
-        user_id=user_id,
-        provider="facebook",
-        account_id=page_id,
-        access_token=page_token,
-        metadata={"page": page},
-        token=None  # You can add auth token support here if needed
-    )
-    if ig_id:
-        upsert_social_record(
+    # Step 5: Save every page and linked IG account in one upsert
+    records = []
+    for page, ig_id in zip(pages, ig_ids):
+        records.append(social_record(
             user_id=user_id,
-            provider="instagram",
-            account_id=ig_id,
-            access_token=page_token,
-            metadata={"linked_fb_page_id": page_id},
-            token=None
-        )
-
+            provider="facebook",
+            account_id=page["id"],
+            access_token=page["access_token"],
+            metadata={"page": page},
+        ))
+        if ig_id:
+            records.append(social_record(
+                user_id=user_id,
+                provider="instagram",
+                account_id=ig_id,
+                access_token=page["access_token"],
+                metadata={"linked_fb_page_id": page["id"]},
+            ))
+    await run_blocking(upsert_social_records, records)
+
+    # The first page stays the default the frontend shows
     return JSONResponse({
         "status": "connected",
-        "facebook_id": page_id,
-        "instagram_id": ig_id,
-        "access_token": page_token,
+        "facebook_id": pages[0]["id"],
+        "instagram_id": ig_ids[0],
+        "access_token": pages[0]["access_token"],
+        "pages": [
+            {"facebook_id": page["id"], "instagram_id": ig_id, "name": page.get("name")}
+            for page, ig_id in zip(pages, ig_ids)
+        ],
     })
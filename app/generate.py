@@ -1,30 +1,302 @@
+import hashlib
 import os
-import subprocess
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-def download_images(urls, folder):
-    os.makedirs(folder, exist_ok=True)
-    paths = []
-    for i, url in enumerate(urls):
-        filename = os.path.join(folder, f'image{i+1}.jpg')
-        resp = requests.get(url)
+from app.image_cache import get_image_cache
+from app.metrics import observe_fetch, span
+from app.video_utils import _run_ffmpeg
+
+# Fetch stage tuning (override via env)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+FETCH_CONNECT_TIMEOUT = float(os.getenv("FETCH_CONNECT_TIMEOUT", "5"))
+FETCH_READ_TIMEOUT = float(os.getenv("FETCH_READ_TIMEOUT", "30"))
+FETCH_RETRIES = int(os.getenv("FETCH_RETRIES", "3"))
+FETCH_CHUNK_SIZE = 64 * 1024
+
+# Largest image we hand to the renderer; matches the output canvas
+NORMALIZE_MAX_WIDTH = 1080
+NORMALIZE_MAX_HEIGHT = 1920
+# Normalizing ffmpeg processes at once per worker process. The io worker runs
+# up to 100 downloads as greenlets, so without a bound a burst of jobs would
+# start one CPU-bound ffmpeg each; defaults to the core count.
+NORMALIZE_CONCURRENCY = int(os.getenv("NORMALIZE_CONCURRENCY", "0")) or os.cpu_count() or 1
+
+_session = None
+_session_lock = threading.Lock()
+_normalize_slots = threading.BoundedSemaphore(NORMALIZE_CONCURRENCY)
+
+
+def get_http_session():
+    """Shared keep-alive session used by every fetch in this process."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=FETCH_RETRIES,
+                backoff_factor=0.5,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET",),
+            )
+            adapter = HTTPAdapter(
+                pool_connections=FETCH_CONCURRENCY,
+                pool_maxsize=FETCH_CONCURRENCY,
+                max_retries=retry,
+            )
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def fetch_to_file(url, filename, session=None, headers=None):
+    """Stream `url` to `filename` in chunks instead of holding it in memory.
+
+    Returns a dict with the HTTP status, a sha256 of the body and the
+    response validators. On 304 Not Modified nothing is written.
+    """
+    session = session or get_http_session()
+    tmp_filename = filename + ".part"
+    digest = hashlib.sha256()
+    with session.get(url, stream=True, headers=headers,
+                     timeout=(FETCH_CONNECT_TIMEOUT, FETCH_READ_TIMEOUT)) as resp:
         resp.raise_for_status()
-        with open(filename, 'wb') as f:
-            f.write(resp.content)
-
-        # Resize the image to max 720x1280 using ffmpeg
-        resized_filename = filename  # overwrite same file
-        resize_cmd = [
-            "ffmpeg",
-            "-y",
-            "-i", filename,
-            "-vf", "scale='min(720,iw)':'min(1280,ih)':force_original_aspect_ratio=decrease",
-            resized_filename
-        ]
-        result = subprocess.run(resize_cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            print(f"FFmpeg resize error: {result.stderr}")
-            raise RuntimeError("Image resizing failed")
-
-        paths.append(resized_filename)
+        meta = {
+            "status": resp.status_code,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
+        if resp.status_code == 304:
+            return meta
+        try:
+            with open(tmp_filename, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=FETCH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            # Don't leave a truncated download behind
+            try:
+                os.remove(tmp_filename)
+            except FileNotFoundError:
+                pass
+            raise
+    meta["content_hash"] = digest.hexdigest()
+    return meta
+
+
+def fetch_images(urls, folder, concurrency=None):
+    """Download all urls at once (bounded by `concurrency`), preserving order."""
+    os.makedirs(folder, exist_ok=True)
+    session = get_http_session()
+    filenames = [os.path.join(folder, f'image{i+1}.jpg') for i in range(len(urls))]
+    workers = max(1, min(concurrency or FETCH_CONCURRENCY, len(urls) or 1))
+    def fetch(url, filename):
+        start = time.perf_counter()
+        fetch_to_file(url, filename, session=session)
+        observe_fetch(url, "fetched", time.perf_counter() - start)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda args: fetch(*args), zip(urls, filenames)))
+    return filenames
+
+
+def image_size(path):
+    """Read (width, height) from the image header without decoding it.
+
+    Supports JPEG, PNG, GIF and WebP; returns None for anything else.
+    """
+    with open(path, 'rb') as f:
+        head = f.read(32)
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8X':
+                w = int.from_bytes(head[24:27], 'little') + 1
+                h = int.from_bytes(head[27:30], 'little') + 1
+                return w, h
+            if chunk == b'VP8 ':
+                w, h = struct.unpack('<HH', head[26:30])
+                return w & 0x3fff, h & 0x3fff
+            if chunk == b'VP8L':
+                bits = int.from_bytes(head[21:25], 'little')
+                return (bits & 0x3fff) + 1, ((bits >> 14) & 0x3fff) + 1
+            return None
+        if head[:2] != b'\xff\xd8':
+            return None
+        # Walk JPEG markers until a start-of-frame segment
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xff:
+                return None
+            code = marker[1]
+            if code in (0xd8, 0x01) or 0xd0 <= code <= 0xd7:
+                continue
+            length_bytes = f.read(2)
+            if len(length_bytes) < 2:
+                return None
+            length = struct.unpack('>H', length_bytes)[0]
+            if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+                h, w = struct.unpack('>xHH', f.read(5))
+                return w, h
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def needs_normalize(path, max_width=NORMALIZE_MAX_WIDTH, max_height=NORMALIZE_MAX_HEIGHT):
+    size = image_size(path)
+    if size is None:
+        return True
+    width, height = size
+    return width > max_width or height > max_height
+
+
+def normalize_images(paths, max_width=NORMALIZE_MAX_WIDTH, max_height=NORMALIZE_MAX_HEIGHT):
+    """Downscale oversized images in place with a single ffmpeg process.
+
+    Images already within max_width x max_height are left untouched; the
+    render graph does the final scale/pad to the canvas. At most
+    NORMALIZE_CONCURRENCY of these run at once in a process.
+    """
+    oversized = [p for p in paths if needs_normalize(p, max_width, max_height)]
+    if not oversized:
+        return paths
+
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"]
+    for path in oversized:
+        cmd.extend(["-i", path])
+    for i, path in enumerate(oversized):
+        cmd.extend([
+            "-map", f"{i}:v:0",
+            "-frames:v", "1",
+            "-filter:v", f"scale={max_width}:{max_height}:force_original_aspect_ratio=decrease",
+            "-q:v", "2",
+            "-f", "image2",
+            path + ".norm.jpg",
+        ])
+    with _normalize_slots, span("normalize", images=len(oversized)):
+        try:
+            _run_ffmpeg(cmd, kind="normalize")
+        except RuntimeError as e:
+            raise RuntimeError("Image normalization failed") from e
+
+    for path in oversized:
+        os.replace(path + ".norm.jpg", path)
     return paths
+
+
+def _resolve_cached(cache, url, filename, session):
+    """Serve one URL from the cache where possible.
+
+    Returns (outcome, fetch_meta); fetch_meta is only set for misses, whose
+    downloaded file still needs normalizing before it can be cached.
+    """
+    # A blob can be evicted between lookup and link; the URL entry is then
+    # dropped and the image fetched in full, as link_cached_images falls back
+    entry = cache.lookup(url)
+    if entry and cache.is_fresh(entry):
+        try:
+            cache.link(entry["content_hash"], filename)
+            return "hits", None
+        except FileNotFoundError:
+            cache.drop_url(url)
+            entry = None
+
+    meta = fetch_to_file(url, filename, session=session, headers=cache.validators(entry))
+    if meta["status"] == 304:
+        try:
+            cache.link(entry["content_hash"], filename)
+        except FileNotFoundError:
+            cache.drop_url(url)
+            meta = fetch_to_file(url, filename, session=session)
+        else:
+            cache.put_url(url, entry["content_hash"], entry.get("etag"), entry.get("last_modified"))
+            return "revalidated", None
+
+    # Same bytes already normalized under another URL (or an older validator)
+    if cache.has_blob(meta["content_hash"]):
+        try:
+            cache.link(meta["content_hash"], filename)
+        except FileNotFoundError:
+            return "misses", meta
+        cache.put_url(url, meta["content_hash"], meta["etag"], meta["last_modified"])
+        return "content_hits", None
+    return "misses", meta
+
+
+def cached_input_hashes(urls):
+    """Content hashes of `urls` in the image cache, or None unless all are cached."""
+    cache = get_image_cache()
+    if cache is None:
+        return None
+    entries = [cache.lookup(url) for url in urls]
+    if not all(entries):
+        return None
+    return [entry["content_hash"] for entry in entries]
+
+
+def link_cached_images(hashes, folder):
+    """Place already normalized cached images into `folder` by content hash.
+
+    Returns the filenames (named as download_images names them), or None if
+    the cache is disabled or any image has been evicted since.
+    """
+    cache = get_image_cache()
+    if cache is None or not all(cache.has_blob(h) for h in hashes):
+        return None
+    os.makedirs(folder, exist_ok=True)
+    filenames = [os.path.join(folder, f'image{i+1}.jpg') for i in range(len(hashes))]
+    try:
+        for content_hash, filename in zip(hashes, filenames):
+            cache.link(content_hash, filename)
+    except FileNotFoundError:
+        return None
+    cache.record(hits=len(hashes))
+    return filenames
+
+
+def download_images(urls, folder):
+    cache = get_image_cache()
+    if cache is None:
+        paths = fetch_images(urls, folder)
+        return normalize_images(paths)
+
+    os.makedirs(folder, exist_ok=True)
+    session = get_http_session()
+    filenames = [os.path.join(folder, f'image{i+1}.jpg') for i in range(len(urls))]
+    workers = max(1, min(FETCH_CONCURRENCY, len(urls) or 1))
+
+    def resolve(url, filename):
+        start = time.perf_counter()
+        outcome, meta = _resolve_cached(cache, url, filename, session=session)
+        observe_fetch(url, outcome, time.perf_counter() - start)
+        return outcome, meta
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda args: resolve(*args), zip(urls, filenames)))
+
+    # Normalize all misses in one pass, then publish them to the cache
+    missed = [(url, filename, meta) for url, filename, (outcome, meta)
+              in zip(urls, filenames, results) if outcome == "misses"]
+    normalize_images([filename for _, filename, _ in missed])
+    for url, filename, meta in missed:
+        cache.put_blob(meta["content_hash"], filename)
+        cache.put_url(url, meta["content_hash"], meta["etag"], meta["last_modified"])
+
+    counters = {}
+    for outcome, _ in results:
+        counters[outcome] = counters.get(outcome, 0) + 1
+    cache.record(**counters)
+    if missed:
+        cache.evict()
+    return filenames
@@ -0,0 +1,198 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+
+# Shared on-disk cache of normalized source images (override via env).
+# Point IMAGE_CACHE_DIR at a volume shared by all workers on the host; set it
+# to an empty string to disable caching.
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", os.path.join("tmp", "image_cache"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# How long a cached URL is trusted before it is revalidated with ETag/Last-Modified
+IMAGE_CACHE_TTL = int(os.getenv("IMAGE_CACHE_TTL", str(24 * 3600)))
+
+
+def url_key(url):
+    return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+
+def _tmp_name(path):
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def link_or_copy(src, dest):
+    """Place `src` at `dest` atomically, hardlinking when the filesystem allows."""
+    tmp = _tmp_name(dest)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+class ImageCache:
+    """Content-addressed store of normalized images, safe across processes.
+
+    Layout under `root`:
+      urls/<sha256(url)>.json   URL entry: validators, content hash, last check
+      blobs/<hh>/<hash>.img     normalized image keyed by source content hash
+      stats.json                hit/miss counters shared by all workers
+      .lock                     flock guarding stats updates and eviction
+
+    Blobs and URL entries are written via rename so readers never see partial
+    files; jobs hardlink blobs into their own directory, so eviction never
+    pulls an image out from under a running render.
+    """
+
+    def __init__(self, root, max_bytes=IMAGE_CACHE_MAX_BYTES, ttl=IMAGE_CACHE_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.urls_dir = os.path.join(root, "urls")
+        self.blobs_dir = os.path.join(root, "blobs")
+        os.makedirs(self.urls_dir, exist_ok=True)
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _write_json(self, path, data):
+        tmp = _tmp_name(path)
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def blob_path(self, content_hash):
+        return os.path.join(self.blobs_dir, content_hash[:2], f"{content_hash}.img")
+
+    def lookup(self, url):
+        """Return the URL entry if its blob is still cached, else None."""
+        try:
+            with open(os.path.join(self.urls_dir, f"{url_key(url)}.json")) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self.blob_path(entry["content_hash"])):
+            return None
+        return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.get("checked_at", 0) < self.ttl
+
+    @staticmethod
+    def validators(entry):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def has_blob(self, content_hash):
+        return os.path.exists(self.blob_path(content_hash))
+
+    def link(self, content_hash, dest):
+        blob = self.blob_path(content_hash)
+        # Bump mtime so eviction treats it as recently used
+        os.utime(blob)
+        link_or_copy(blob, dest)
+
+    def put_url(self, url, content_hash, etag=None, last_modified=None):
+        self._write_json(os.path.join(self.urls_dir, f"{url_key(url)}.json"), {
+            "url": url,
+            "content_hash": content_hash,
+            "etag": etag,
+            "last_modified": last_modified,
+            "checked_at": time.time(),
+        })
+
+    def drop_url(self, url):
+        try:
+            os.remove(os.path.join(self.urls_dir, f"{url_key(url)}.json"))
+        except FileNotFoundError:
+            pass
+
+    def put_blob(self, content_hash, path):
+        blob = self.blob_path(content_hash)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        link_or_copy(path, blob)
+
+    def record(self, **counters):
+        """Add to the shared counters, e.g. record(hits=3, misses=1)."""
+        path = os.path.join(self.root, "stats.json")
+        with self._locked():
+            try:
+                with open(path) as f:
+                    stats = json.load(f)
+            except (OSError, ValueError):
+                stats = {}
+            for name, value in counters.items():
+                stats[name] = stats.get(name, 0) + value
+            self._write_json(path, stats)
+
+    def stats(self):
+        try:
+            with open(os.path.join(self.root, "stats.json")) as f:
+                stats = json.load(f)
+        except (OSError, ValueError):
+            stats = {}
+        blobs = list(self._iter_blobs())
+        stats["entries"] = len(blobs)
+        stats["bytes"] = sum(size for _, size, _ in blobs)
+        lookups = sum(stats.get(k, 0) for k in ("hits", "revalidated", "content_hits", "misses"))
+        stats["hit_rate"] = (lookups - stats.get("misses", 0)) / lookups if lookups else 0.0
+        return stats
+
+    def _iter_blobs(self):
+        for dirpath, _, filenames in os.walk(self.blobs_dir):
+            for name in filenames:
+                if not name.endswith(".img"):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        """Drop least recently used blobs until the cache fits in max_bytes."""
+        with self._locked():
+            blobs = sorted(self._iter_blobs(), key=lambda b: b[2])
+            total = sum(size for _, size, _ in blobs)
+            evicted = 0
+            for path, size, _ in blobs:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                evicted += 1
+        if evicted:
+            self.record(evictions=evicted)
+        return evicted
+
+
+_cache = None
+
+
+def get_image_cache():
+    """Process-wide cache instance, or None when IMAGE_CACHE_DIR is empty."""
+    global _cache
+    if not IMAGE_CACHE_DIR:
+        return None
+    if _cache is None:
+        _cache = ImageCache(IMAGE_CACHE_DIR)
+    return _cache
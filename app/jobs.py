@@ -0,0 +1,85 @@
+import os
+import json
+
+from app.redis_client import redis_client
+from celery_worker import celery_app
+
+# Batch membership should live as long as the task results it points at
+# (Celery's result_expires defaults to one day)
+BATCH_TTL = int(os.getenv("BATCH_TTL", "86400"))
+
+FINISHED_STATES = ("SUCCESS", "FAILURE", "REVOKED")
+
+
+def _status(task_id: str, state: str, info) -> dict:
+    status = {"task_id": task_id, "state": state}
+    if state == "PROGRESS":
+        status["progress"] = info
+    elif state == "SUCCESS":
+        status["result"] = info
+    elif state == "FAILURE":
+        status["error"] = str(info)
+    return status
+
+
+def job_status(task_id: str) -> dict:
+    result = celery_app.AsyncResult(task_id)
+    return _status(task_id, result.state, result.info)
+
+
+def bulk_job_status(task_ids) -> list:
+    """Status for many jobs with a single result-backend round trip.
+
+    Key-value backends (Redis) support MGET; anything else falls back to one
+    lookup per task.
+    """
+    task_ids = list(task_ids)
+    backend = celery_app.backend
+    if not hasattr(backend, "mget"):
+        return [job_status(task_id) for task_id in task_ids]
+
+    values = backend.mget([backend.get_key_for_task(task_id) for task_id in task_ids]) if task_ids else []
+    statuses = []
+    for task_id, value in zip(task_ids, values):
+        if value is None:
+            statuses.append(_status(task_id, "PENDING", None))
+            continue
+        meta = backend.decode_result(value)
+        statuses.append(_status(task_id, meta["status"], meta["result"]))
+    return statuses
+
+
+def save_batch(batch_id: str, job_ids) -> None:
+    redis_client.set(f"batch:{batch_id}", json.dumps(list(job_ids)), ex=BATCH_TTL)
+
+
+def load_batch(batch_id: str):
+    value = redis_client.get(f"batch:{batch_id}")
+    return json.loads(value) if value else None
+
+
+def save_preview(job_id: str, spec: dict) -> None:
+    """Remember a preview's submission so it can be approved for a full render."""
+    redis_client.set(f"preview:{job_id}", json.dumps(spec), ex=BATCH_TTL)
+
+
+def load_preview(job_id: str):
+    value = redis_client.get(f"preview:{job_id}")
+    return json.loads(value) if value else None
+
+
+def batch_status(batch_id: str):
+    job_ids = load_batch(batch_id)
+    if job_ids is None:
+        return None
+    jobs = bulk_job_status(job_ids)
+    counts = {}
+    for job in jobs:
+        counts[job["state"]] = counts.get(job["state"], 0) + 1
+    return {
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "finished": sum(counts.get(state, 0) for state in FINISHED_STATES),
+        "states": counts,
+        "jobs": jobs,
+    }
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+
+import redis
+
+from app.metrics import LOOKUP_CACHE_REQUESTS
+from app.ttl_cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Seconds a lookup is served from cache; writes through this app invalidate
+# sooner, rows changed elsewhere (dashboard, other services) show up after this
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "300"))
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "4096"))
+# Opt-in Redis tier shared by every uvicorn worker. Cached rows include access
+# tokens and password hashes, so only enable it on a private Redis.
+LOOKUP_CACHE_REDIS = os.getenv("LOOKUP_CACHE_REDIS", "0") == "1"
+# With the Redis tier on, in-process copies only live this long, which bounds
+# how stale another worker can be after an invalidation
+LOOKUP_CACHE_LOCAL_TTL = float(os.getenv("LOOKUP_CACHE_LOCAL_TTL", "5"))
+
+_MISSING = object()
+
+
+class LookupCache:
+    """Read-through cache for one kind of Supabase lookup.
+
+    get() checks the in-process TTLCache, then (when enabled) Redis, then
+    calls the loader and fills both. Loader results must be JSON-serializable;
+    None (not found) is cached too. Redis outages fall through to the loader.
+    """
+
+    def __init__(self, name, ttl=LOOKUP_CACHE_TTL, maxsize=LOOKUP_CACHE_SIZE, shared=LOOKUP_CACHE_REDIS):
+        self.name = name
+        self.ttl = ttl
+        self.shared = shared
+        local_ttl = min(ttl, LOOKUP_CACHE_LOCAL_TTL) if shared else ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=local_ttl)
+
+    def _redis_key(self, key):
+        return f"lookup:{self.name}:{key}"
+
+    def _redis(self):
+        from app.redis_client import redis_client
+
+        return redis_client
+
+    def get(self, key, loader):
+        value = self.local.get(key, _MISSING)
+        if value is not _MISSING:
+            LOOKUP_CACHE_REQUESTS.labels(self.name, "local_hit").inc()
+            return value
+
+        if self.shared:
+            try:
+                raw = self._redis().get(self._redis_key(key))
+            except redis.RedisError:
+                logger.warning("Lookup cache read skipped, Redis unavailable", exc_info=True)
+                raw = None
+            if raw is not None:
+                value = json.loads(raw)
+                self.local.set(key, value)
+                LOOKUP_CACHE_REQUESTS.labels(self.name, "redis_hit").inc()
+                return value
+
+        LOOKUP_CACHE_REQUESTS.labels(self.name, "miss").inc()
+        value = loader()
+        self.local.set(key, value)
+        if self.shared:
+            try:
+                self._redis().set(self._redis_key(key), json.dumps(value), ex=int(self.ttl))
+            except redis.RedisError:
+                logger.warning("Lookup cache write skipped, Redis unavailable", exc_info=True)
+        return value
+
+    def invalidate(self, key):
+        self.local.pop(key)
+        if self.shared:
+            try:
+                self._redis().delete(self._redis_key(key))
+            except redis.RedisError:
+                logger.warning("Lookup cache invalidation skipped, Redis unavailable", exc_info=True)
@@ -1,28 +1,44 @@
 import os
+import math
 import uuid
+import json
+import asyncio
 import shutil
-from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi import FastAPI, Request, HTTPException, Depends
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, Response, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from starlette.middleware.sessions import SessionMiddleware
 
+from celery import group
+from collections import Counter
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from app.video_utils import generate_cool_video
 from app.generate import download_images
+from app.image_cache import get_image_cache
 from transitions import get_random_template
 
 # Ensure Supabase client loads
 import app.supabase_client as _
 
-from app.auth import router as auth_router
+from app.auth import get_optional_user, router as auth_router
 from app.fb_oauth import router as fb_router
 from app.tiktok_oauth import router as tiktok_router
 from app.api import router as api_router
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.tasks import generate_video_task
+from app.tasks import generate_video_task, prefetch_images_task, video_job_signature
+from app.jobs import FINISHED_STATES, batch_status, bulk_job_status, job_status, load_preview, save_batch, save_preview
+from app.dedup import claim_inflight, force_claim_inflight, join_inflight, request_fingerprint
+from app.video_utils import (
+    PREVIEW_PROFILE, get_encode_settings, validate_extras, validate_renditions, validate_timing
+)
+from app.client_config import get_tenant
+from app.scheduling import DEFAULT_LANE, DEFAULT_TENANT, LANES, MAX_BACKLOG_SECONDS, check_admission
+from app.metrics import render_latest
+from app.http_client import close_http_client
 
 app = FastAPI()
 
@@ -40,6 +56,25 @@ templates = Jinja2Templates(directory="app/templates")
 
 class VideoRequest(BaseModel):
     image_urls: List[str]
+    profile: Optional[str] = None  # preview | draft | standard | archival (see ENCODE_PROFILES)
+    durations: Optional[List[float]] = None  # seconds per slide, one per image
+    transition_durations: Optional[List[float]] = None  # seconds per transition, len(image_urls) - 1
+    priority: Optional[str] = None  # interactive | bulk (default)
+    renditions: Optional[List[str]] = None  # e.g. ["9x16", "4x5", "1x1"] (see RENDITIONS)
+    extras: Optional[List[str]] = None  # any of poster, teaser, hls
+    render_budget: Optional[float] = None  # estimated CPU seconds; heavy transitions are swapped for cheap ones
+
+class ApproveRequest(BaseModel):
+    profile: Optional[str] = None  # full-quality profile; defaults to ENCODE_PROFILE
+    priority: Optional[str] = None
+
+class BatchVideoRequest(BaseModel):
+    videos: List[VideoRequest]
+
+class JobStatusRequest(BaseModel):
+    task_ids: List[str]
+
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "500"))
 
 # Routers
 app.include_router(auth_router)
@@ -47,6 +82,10 @@ app.include_router(fb_router)
 app.include_router(tiktok_router)
 app.include_router(api_router)
 
+@app.on_event("shutdown")
+async def shutdown():
+    await close_http_client()
+
 # Health check (for Render)
 @app.get("/health")
 def health():
@@ -73,17 +112,260 @@ async def connect_tiktok():
     return RedirectResponse("/tiktok/login")
 
 
-@app.post("/generate-video/")
-async def generate_video_endpoint(request: VideoRequest):
+def validate_submission(request: VideoRequest) -> dict:
+    """Return the encode settings for a video spec, or raise a 400."""
+    try:
+        settings = get_encode_settings(request.profile)
+        validate_timing(len(request.image_urls), request.durations, request.transition_durations, settings)
+        validate_renditions(request.renditions)
+        validate_extras(request.extras)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if request.priority is not None and request.priority not in LANES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(LANES)}")
+    return settings
+
+
+def lane_of(request: VideoRequest) -> str:
+    # Previews are someone waiting on a screen, so they default to the fast lane
+    if request.priority:
+        return request.priority
+    return "interactive" if request.profile == PREVIEW_PROFILE else DEFAULT_LANE
+
+
+async def admit(lane: str, jobs: int = 1):
+    """Refuse new work with a 429 when the lane's backlog is too deep.
+
+    The ETA comes from queue depth, running renders and recent render times.
+    """
+    admitted, eta = await run_in_threadpool(check_admission, lane, jobs)
+    if not admitted:
+        retry_after = max(1, math.ceil(eta - MAX_BACKLOG_SECONDS[lane]))
+        raise HTTPException(
+            status_code=429,
+            detail={"message": f"The {lane} queue is saturated", "eta_seconds": eta, "retry_after": retry_after},
+            headers={"Retry-After": str(retry_after)}
+        )
+
+
+async def request_tenant(user: Optional[dict] = Depends(get_optional_user)) -> str:
+    """Tenant of the authenticated caller; anonymous submissions share DEFAULT_TENANT."""
+    if user is None:
+        return DEFAULT_TENANT
+    return await run_in_threadpool(get_tenant, user["sub"])
+
+
+def plan_submission(request: VideoRequest, settings: dict, tenant: str, input_hashes=None):
+    """Build the task signature for a validated video spec.
+
+    Returns (job_id, signature); signature is None when an identical
+    submission is already running and job_id is that job. Blocks on Redis,
+    so handlers call it through run_in_threadpool.
+    """
     job_id = str(uuid.uuid4())
-    # Pass only image_urls to Celery task; job_id generated inside task for uniqueness
-    task = generate_video_task.delay(request.image_urls)
+
+    # Identical submissions (e.g. n8n retries) join the job already running
+    dedup_key = request_fingerprint(request.image_urls, {
+        **settings,
+        "durations": request.durations,
+        "transition_durations": request.transition_durations,
+        "renditions": request.renditions,
+        "extras": request.extras,
+        "render_budget": request.render_budget
+    })
+    existing = claim_inflight(dedup_key, job_id)
+    if existing:
+        # Joiners get the job's completion event under their own tenant
+        if join_inflight(existing, tenant) and not generate_video_task.AsyncResult(existing).ready():
+            return existing, None
+        # Key outlived its task (or it has already reported); take it over
+        force_claim_inflight(dedup_key, job_id)
+
+    # The job id doubles as the id of the task holding its result
+    signature = video_job_signature(
+        job_id,
+        request.image_urls,
+        dedup_key=dedup_key,
+        profile=settings["profile"],
+        durations=request.durations,
+        transition_durations=request.transition_durations,
+        tenant=tenant,
+        lane=lane_of(request),
+        input_hashes=input_hashes,
+        renditions=request.renditions,
+        extras=request.extras,
+        render_budget=request.render_budget
+    )
+    if settings["profile"] == PREVIEW_PROFILE:
+        save_preview(job_id, request.dict())
+    return job_id, signature
+
+
+@app.post("/generate-video/")
+async def generate_video_endpoint(request: VideoRequest, tenant: str = Depends(request_tenant)):
+    settings = validate_submission(request)
+    await admit(lane_of(request))
+    job_id, signature = await run_in_threadpool(plan_submission, request, settings, tenant)
+    if signature is None:
+        return {
+            "status": "joined",
+            "task_id": job_id,
+            "job_id": job_id
+        }
+    await run_in_threadpool(signature.apply_async)
     return {
         "status": "submitted",
-        "task_id": task.id,
-        "job_id": job_id  # Note: job_id generated here is not linked to the task's job_id in task
+        "task_id": job_id,
+        "job_id": job_id
     }
 
+
+@app.post("/generate-video/batch")
+async def generate_video_batch(request: BatchVideoRequest, tenant: str = Depends(request_tenant)):
+    if not request.videos:
+        raise HTTPException(status_code=400, detail="At least one video is required")
+    if len(request.videos) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batches are limited to {MAX_BATCH_SIZE} videos")
+
+    # Validate everything before claiming any dedup keys
+    settings = []
+    for i, video in enumerate(request.videos):
+        try:
+            settings.append(validate_submission(video))
+        except HTTPException as e:
+            raise HTTPException(status_code=400, detail=f"videos[{i}]: {e.detail}")
+
+    # The whole batch is admitted or refused
+    for lane, count in Counter(lane_of(video) for video in request.videos).items():
+        await admit(lane, count)
+
+    planned = await run_in_threadpool(
+        lambda: [plan_submission(video, s, tenant) for video, s in zip(request.videos, settings)]
+    )
+    signatures = [signature for _, signature in planned if signature is not None]
+
+    if signatures:
+        # URLs shared by several videos are downloaded and normalized once,
+        # into the image cache, before the renders fan out
+        url_counts = Counter(url for video in request.videos for url in set(video.image_urls))
+        shared_urls = [url for url, count in url_counts.items() if count > 1]
+        members = group(signatures)
+        if shared_urls:
+            await run_in_threadpool(prefetch_images_task.apply_async, (shared_urls,), {"then": members})
+        else:
+            await run_in_threadpool(members.apply_async)
+
+    batch_id = str(uuid.uuid4())
+    await run_in_threadpool(save_batch, batch_id, [job_id for job_id, _ in planned])
+    return {
+        "status": "submitted",
+        "batch_id": batch_id,
+        "jobs": [
+            {"job_id": job_id, "status": "submitted" if signature is not None else "joined"}
+            for job_id, signature in planned
+        ]
+    }
+
+
+@app.post("/jobs/{job_id}/approve")
+async def approve_preview(job_id: str, request: ApproveRequest, tenant: str = Depends(request_tenant)):
+    """Render an approved preview at full quality.
+
+    The full render links the preview's normalized images straight from the
+    image cache instead of downloading them again; transitions are seeded
+    from the image contents, so they match what the preview showed.
+    """
+    spec = await run_in_threadpool(load_preview, job_id)
+    if spec is None:
+        raise HTTPException(status_code=404, detail="Preview not found")
+    status = await run_in_threadpool(job_status, job_id)
+    result = status.get("result") or {}
+    if status["state"] != "SUCCESS" or result.get("status") != "completed":
+        raise HTTPException(status_code=409, detail="Preview has not completed")
+    if request.profile == PREVIEW_PROFILE:
+        raise HTTPException(status_code=400, detail="Approve with a full-quality profile")
+
+    video = VideoRequest(**{**spec, "profile": request.profile, "priority": request.priority})
+    settings = validate_submission(video)
+    await admit(lane_of(video))
+    full_job_id, signature = await run_in_threadpool(
+        plan_submission, video, settings, tenant, input_hashes=result.get("input_hashes")
+    )
+    if signature is not None:
+        await run_in_threadpool(signature.apply_async)
+    return {
+        "status": "submitted" if signature is not None else "joined",
+        "task_id": full_job_id,
+        "job_id": full_job_id,
+        "preview_job_id": job_id
+    }
+
+
+# Seconds between result-backend reads for each open SSE stream
+SSE_POLL_INTERVAL = float(os.getenv("SSE_POLL_INTERVAL", "1.0"))
+SSE_KEEPALIVE = 15.0
+
+
+@app.post("/jobs/status")
+async def get_jobs(request: JobStatusRequest):
+    return {"jobs": await run_in_threadpool(bulk_job_status, request.task_ids)}
+
+
+@app.get("/jobs/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    status = await run_in_threadpool(batch_status, batch_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return status
+
+
+@app.get("/jobs/{task_id}")
+async def get_job(task_id: str):
+    return await run_in_threadpool(job_status, task_id)
+
+
+@app.get("/jobs/{task_id}/events")
+async def job_events(task_id: str, request: Request):
+    """Server-Sent Events stream of job status; one event per change, ends when the job does."""
+    async def stream():
+        last = None
+        idle = 0.0
+        while not await request.is_disconnected():
+            status = await run_in_threadpool(job_status, task_id)
+            if status != last:
+                last = status
+                idle = 0.0
+                yield f"event: status\ndata: {json.dumps(status)}\n\n"
+                if status["state"] in FINISHED_STATES:
+                    yield "event: end\ndata: {}\n\n"
+                    return
+            elif idle >= SSE_KEEPALIVE:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(SSE_POLL_INTERVAL)
+            idle += SSE_POLL_INTERVAL
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Prometheus scrape target: stage latency histograms, failures by stage,
+# ffmpeg CPU/RSS, queue depth and in-flight renders
+@app.get("/metrics")
+def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+# Source image cache counters (hits, misses, evictions, size)
+@app.get("/cache/images")
+def image_cache_stats():
+    cache = get_image_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
 # Endpoint to serve generated video from local storage (optional if you rely on R2 URL)
 @app.get("/videos/{job_id}/output.mp4")
 def get_video(job_id: str):
@@ -0,0 +1,160 @@
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+)
+from prometheus_client.core import GaugeMetricFamily
+
+logger = logging.getLogger(__name__)
+
+# Set PROMETHEUS_MULTIPROC_DIR (an empty directory shared by every uvicorn and
+# Celery process on the host) so /metrics aggregates all of them
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "video_stage_seconds", "Wall time of each job stage", ["stage"], buckets=STAGE_BUCKETS
+)
+STAGE_FAILURES = Counter(
+    "video_stage_failures_total", "Jobs that failed, by the stage they failed in", ["stage"]
+)
+JOBS = Counter("video_jobs_total", "Finished jobs by outcome", ["status"])
+FETCH_SECONDS = Histogram(
+    "image_fetch_seconds", "Time to resolve one source image URL", ["outcome"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+FFMPEG_CPU_SECONDS = Histogram(
+    "ffmpeg_cpu_seconds", "User+system CPU of each ffmpeg process", ["kind"], buckets=STAGE_BUCKETS
+)
+FFMPEG_MAX_RSS_BYTES = Histogram(
+    "ffmpeg_max_rss_bytes", "Peak resident memory of each ffmpeg process", ["kind"],
+    buckets=tuple(mb * 1024 ** 2 for mb in (32, 64, 128, 256, 512, 1024, 2048, 4096))
+)
+FFMPEG_RUNNING = Gauge(
+    "ffmpeg_processes_running", "ffmpeg processes currently running", ["kind"], multiprocess_mode="livesum"
+)
+SUPABASE_CLIENTS_CREATED = Counter(
+    "supabase_clients_created_total", "Supabase clients built (each opens its own HTTP pool)", ["kind"]
+)
+SUPABASE_CLIENT_LOOKUPS = Counter(
+    "supabase_client_lookups_total", "Per-token Supabase client lookups", ["result"]
+)
+SUPABASE_TOKEN_CLIENTS = Gauge(
+    "supabase_token_clients", "Per-token Supabase clients currently cached", multiprocess_mode="livesum"
+)
+LOOKUP_CACHE_REQUESTS = Counter(
+    "lookup_cache_requests_total", "Cached Supabase lookups by where they were answered",
+    ["cache", "result"]
+)
+BCRYPT_QUEUE = Gauge(
+    "bcrypt_queue_depth", "Password hashes/checks waiting for a bcrypt worker", multiprocess_mode="livesum"
+)
+BCRYPT_WAIT_SECONDS = Histogram(
+    "bcrypt_wait_seconds", "Time a password hash/check waited for a bcrypt worker",
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+)
+BCRYPT_SECONDS = Histogram(
+    "bcrypt_seconds", "Time spent in bcrypt", ["op"], buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1, 2)
+)
+BCRYPT_REJECTED = Counter("bcrypt_rejected_total", "Logins refused because the bcrypt queue was full")
+TOKEN_CACHE_LOOKUPS = Counter("token_cache_lookups_total", "Verified-token cache lookups", ["result"])
+WEBHOOK_EVENTS = Counter("webhook_events_total", "Job completion events queued for a webhook")
+WEBHOOK_DELIVERIES = Counter(
+    "webhook_deliveries_total", "Webhook batch POSTs by outcome (delivered, retry, dead)", ["outcome"]
+)
+WEBHOOK_DEAD_LETTERS = Counter("webhook_dead_letter_events_total", "Events moved to the dead-letter list")
+
+
+def observe_stage(stage, seconds, job_id=None):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    logger.info("span stage=%s seconds=%.3f job_id=%s", stage, seconds, job_id)
+
+
+@contextmanager
+def span(stage, **fields):
+    """Time a block as `stage`, outside of a JobProgress (e.g. normalize)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(seconds)
+        logger.info("span stage=%s seconds=%.3f %s", stage, seconds,
+                    " ".join(f"{k}={v}" for k, v in fields.items()))
+
+
+def observe_fetch(url, outcome, seconds):
+    FETCH_SECONDS.labels(outcome).observe(seconds)
+    logger.debug("span stage=fetch outcome=%s seconds=%.3f url=%s", outcome, seconds, url)
+
+
+def observe_ffmpeg(kind, rusage):
+    """Record a reaped ffmpeg's resource usage (from os.wait4)."""
+    cpu = rusage.ru_utime + rusage.ru_stime
+    # ru_maxrss is in kilobytes on Linux
+    rss = rusage.ru_maxrss * 1024
+    FFMPEG_CPU_SECONDS.labels(kind).observe(cpu)
+    FFMPEG_MAX_RSS_BYTES.labels(kind).observe(rss)
+    logger.info("ffmpeg kind=%s cpu_seconds=%.3f max_rss_mb=%.1f", kind, cpu, rss / 1024 ** 2)
+
+
+class QueueCollector:
+    """Queue depth and in-flight renders, read from Redis at scrape time."""
+
+    def describe(self):
+        # Keeps registration from calling collect() (and Redis) at import
+        return []
+
+    def collect(self):
+        # Imported here: scheduling pulls in the Celery app
+        from app.scheduling import LANES, parked_renders, queue_depth, renders_in_flight
+        from celery_worker import IO_QUEUE
+
+        depth = GaugeMetricFamily("celery_queue_depth", "Messages waiting per queue", labels=["queue"])
+        in_flight = GaugeMetricFamily("renders_in_flight", "Renders holding a tenant slot")
+        parked = GaugeMetricFamily("renders_parked", "Queued renders whose tenants are all at their cap",
+                                   labels=["lane"])
+        try:
+            for queue in [IO_QUEUE] + [lane["queue"] for lane in LANES.values()]:
+                depth.add_metric([queue], queue_depth(queue))
+            in_flight.add_metric([], renders_in_flight())
+            for lane in LANES:
+                parked.add_metric([lane], parked_renders(lane))
+        except Exception:
+            logger.warning("Queue metrics unavailable", exc_info=True)
+            return
+        yield depth
+        yield in_flight
+        yield parked
+
+
+_queue_collector = QueueCollector()
+if not MULTIPROC_DIR:
+    REGISTRY.register(_queue_collector)
+
+
+def _registry():
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    from prometheus_client import multiprocess
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(_queue_collector)
+    return registry
+
+
+def render_latest():
+    """(body, content type) for a /metrics response."""
+    return generate_latest(_registry()), CONTENT_TYPE_LATEST
+
+
+def start_metrics_server(port):
+    """Serve /metrics from a Celery worker host."""
+    from prometheus_client import start_http_server
+
+    start_http_server(port, registry=_registry())
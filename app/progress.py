@@ -0,0 +1,64 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app.metrics import observe_stage
+
+# Minimum seconds between progress writes to the result backend
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "0.5"))
+
+
+class JobProgress:
+    """Publishes a job's stage, stage progress and stage timings as Celery state.
+
+    State is written under `job_id` with the custom PROGRESS state, so
+    AsyncResult(job_id).info is what /jobs/{task_id} and its SSE stream
+    report. Writes are throttled to one per PROGRESS_INTERVAL, except at
+    stage boundaries. With task=None only the timings are kept.
+    """
+
+    def __init__(self, task, job_id, interval=PROGRESS_INTERVAL, timings=None):
+        self.task = task
+        self.job_id = job_id
+        self.interval = interval
+        self.timings = dict(timings or {})
+        self.stage_name = None
+        self.stage_progress = 0.0
+        self._last_publish = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        self.stage_name = name
+        self.stage_progress = 0.0
+        self.publish(force=True)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 3)
+            observe_stage(name, self.timings[name], job_id=self.job_id)
+
+    def update(self, done, total):
+        self.stage_progress = min(1.0, done / total) if total else 0.0
+        self.publish()
+
+    def meta(self):
+        return {
+            "job_id": self.job_id,
+            "stage": self.stage_name,
+            "stage_progress": round(self.stage_progress, 4),
+            "timings": dict(self.timings),
+        }
+
+    def publish(self, force=False):
+        if self.task is None:
+            return
+        # Called from ffmpeg's progress reader thread as well as the task
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_publish < self.interval:
+                return
+            self._last_publish = now
+            self.task.update_state(task_id=self.job_id, state="PROGRESS", meta=self.meta())
@@ -0,0 +1,8 @@
+# redis_client.py
+import redis
+
+from celery_worker import broker_url
+
+# Shared Redis connection (same instance as the Celery broker) for
+# coordination state such as in-flight job keys
+redis_client = redis.Redis.from_url(broker_url, decode_responses=True)
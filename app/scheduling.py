@@ -0,0 +1,304 @@
+import os
+import json
+import math
+import time
+import logging
+
+import redis
+
+from app.redis_client import redis_client
+from celery_worker import INTERACTIVE_QUEUE, PRIORITY_STEPS, QUEUE_SEP, RENDER_QUEUE
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes: interactive previews jump ahead of bulk/nightly work
+LANES = {
+    "interactive": {"queue": INTERACTIVE_QUEUE, "priority": 0},
+    "bulk": {"queue": RENDER_QUEUE, "priority": 6},
+}
+DEFAULT_LANE = "bulk"
+
+# Render slots across all render workers (sum of their -c values)
+RENDER_SLOTS = int(os.getenv("RENDER_SLOTS", str(os.cpu_count() or 1)))
+
+# Jobs submitted without a tenant share this one
+DEFAULT_TENANT = "public"
+
+# Renders are handed out per lane by deficit round robin over the tenants
+# with queued work: each turn a tenant earns its weight in renders, so a
+# tenant flooding a lane gets its share and no more. Weights come from
+# TENANT_WEIGHTS, e.g. '{"big@customer.com": 3}' (default weight 1).
+TENANT_WEIGHTS = json.loads(os.getenv("TENANT_WEIGHTS", "{}"))
+# Per-tenant concurrent renders: TENANT_RENDER_CAP * weight. The default
+# tenant carries all anonymous traffic, so it may use every render slot.
+TENANT_RENDER_CAP = int(os.getenv("TENANT_RENDER_CAP", "2"))
+# Render workers that can't reach Redis retry after this many seconds
+TENANT_RETRY_DELAY = float(os.getenv("TENANT_RETRY_DELAY", "5"))
+# Slots of crashed workers expire after this long
+RENDER_SLOT_TTL = int(os.getenv("RENDER_SLOT_TTL", "3600"))
+
+# Admission control: refuse new work when the estimated wait exceeds these
+MAX_BACKLOG_SECONDS = {
+    "interactive": int(os.getenv("MAX_INTERACTIVE_BACKLOG_SECONDS", "120")),
+    "bulk": int(os.getenv("MAX_BULK_BACKLOG_SECONDS", str(4 * 3600))),
+}
+# Render-time history used for the ETA
+RENDER_HISTORY_KEY = "render:history"
+RENDER_HISTORY_SIZE = 200
+DEFAULT_RENDER_SECONDS = float(os.getenv("DEFAULT_RENDER_SECONDS", "30"))
+
+INFLIGHT_KEY = "render:slots"
+
+# Under peak load (bulk ETA above PEAK_BACKLOG_SECONDS) jobs without their own
+# budget are held to PEAK_RENDER_BUDGET estimated CPU seconds by swapping in
+# cheaper transitions (see transitions.get_template_within_budget)
+PEAK_RENDER_BUDGET = float(os.getenv("PEAK_RENDER_BUDGET", "0")) or None
+PEAK_BACKLOG_SECONDS = int(os.getenv("PEAK_BACKLOG_SECONDS", "600"))
+
+
+def tenant_weight(tenant):
+    return float(TENANT_WEIGHTS.get(tenant, 1))
+
+
+def tenant_cap(tenant):
+    if tenant == DEFAULT_TENANT:
+        return max(1, RENDER_SLOTS)
+    return max(1, round(TENANT_RENDER_CAP * tenant_weight(tenant)))
+
+
+def lane_options(lane):
+    """Queue and priority for a lane; unknown lanes fall back to bulk."""
+    return LANES.get(lane or DEFAULT_LANE, LANES[DEFAULT_LANE])
+
+
+def lane_name(lane):
+    return lane if lane in LANES else DEFAULT_LANE
+
+
+def _fair_prefix(lane):
+    return f"render:fair:{lane_name(lane)}"
+
+
+# Fair render queues, per lane, under render:fair:<lane>:
+#   q:<tenant>  that tenant's jobs waiting for a render, oldest first
+#   jobs        ids of the queued jobs, so a redelivered task can't queue one twice
+#   ring        tenants with waiting jobs, in round-robin order
+#   active      the same tenants as a set
+#   deficit     hash of renders each tenant may still take this turn
+#   running     hash of render token (task id) -> the job it is rendering
+#   parked      tokens that found every waiting tenant at its cap
+# Every queued job is matched by one render token: a Celery message on the
+# lane's queue, or a parked one that a finishing render sends again. Tenant
+# slots are sorted-set members scored by expiry, so a worker that dies
+# mid-render can't leak one. Scripts build tenant keys themselves, so this
+# needs a single Redis, not a cluster.
+_ENQUEUE = """
+local prefix = ARGV[1]
+if redis.call('SADD', prefix .. ':jobs', cjson.decode(ARGV[3]).job_id) == 0 then
+    return 0
+end
+redis.call('RPUSH', prefix .. ':q:' .. ARGV[2], ARGV[3])
+if redis.call('SADD', prefix .. ':active', ARGV[2]) == 1 then
+    redis.call('RPUSH', prefix .. ':ring', ARGV[2])
+end
+return 1
+"""
+
+_PICK = """
+local prefix, now, ttl, inflight, token = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4], ARGV[5]
+local config = cjson.decode(ARGV[6])
+local ring, active, deficits = prefix .. ':ring', prefix .. ':active', prefix .. ':deficit'
+
+local running = redis.call('HGET', prefix .. ':running', token)
+if running then
+    return running
+end
+
+local function drop(tenant)
+    redis.call('LPOP', ring)
+    redis.call('SREM', active, tenant)
+    redis.call('HDEL', deficits, tenant)
+end
+
+local function rotate(tenant, deficit)
+    redis.call('LMOVE', ring, ring, 'LEFT', 'RIGHT')
+    redis.call('HSET', deficits, tenant, deficit)
+end
+
+redis.call('ZREMRANGEBYSCORE', inflight, '-inf', now)
+for _ = 1, redis.call('LLEN', ring) * config.rounds do
+    local tenant = redis.call('LINDEX', ring, 0)
+    if not tenant then
+        break
+    end
+    local queue = prefix .. ':q:' .. tenant
+    local slots = 'render:slots:' .. tenant
+    redis.call('ZREMRANGEBYSCORE', slots, '-inf', now)
+    local deficit = tonumber(redis.call('HGET', deficits, tenant) or '0')
+    if redis.call('LLEN', queue) == 0 then
+        drop(tenant)
+    elseif redis.call('ZCARD', slots) >= (config.caps[tenant] or config.cap) then
+        -- At its cap: skipped without earning credit
+        rotate(tenant, deficit)
+    else
+        if deficit < 1 then
+            deficit = deficit + (config.weights[tenant] or 1)
+        end
+        if deficit < 1 then
+            rotate(tenant, deficit)
+        else
+            local payload = redis.call('LPOP', queue)
+            local job_id = cjson.decode(payload).job_id
+            redis.call('SREM', prefix .. ':jobs', job_id)
+            local expires = now + ttl
+            redis.call('ZADD', slots, expires, job_id)
+            redis.call('EXPIRE', slots, ttl)
+            redis.call('ZADD', inflight, expires, job_id)
+            redis.call('HSET', prefix .. ':running', token, payload)
+            deficit = deficit - 1
+            if redis.call('LLEN', queue) == 0 then
+                drop(tenant)
+            elseif deficit < 1 then
+                rotate(tenant, deficit)
+            else
+                redis.call('HSET', deficits, tenant, deficit)
+            end
+            return payload
+        end
+    end
+end
+-- Tenants are still waiting, all at their cap: park the token
+if redis.call('LLEN', ring) > 0 then
+    redis.call('INCR', prefix .. ':parked')
+end
+return false
+"""
+
+_RELEASE = """
+local tenant, job_id, inflight, token = ARGV[1], ARGV[2], ARGV[3], ARGV[4]
+redis.call('ZREM', 'render:slots:' .. tenant, job_id)
+redis.call('ZREM', inflight, job_id)
+local woken = {}
+for i = 5, #ARGV do
+    local prefix = ARGV[i]
+    redis.call('HDEL', prefix .. ':running', token)
+    if tonumber(redis.call('GET', prefix .. ':parked') or '0') > 0 then
+        redis.call('DECR', prefix .. ':parked')
+        table.insert(woken, prefix)
+    end
+end
+return woken
+"""
+
+
+def _fair_config():
+    weights = {tenant: float(weight) for tenant, weight in TENANT_WEIGHTS.items()}
+    caps = {tenant: tenant_cap(tenant) for tenant in [*weights, DEFAULT_TENANT]}
+    # Enough passes over the ring for the lightest tenant to earn one render
+    rounds = 1 + math.ceil(1 / min([1.0, *weights.values()]))
+    return json.dumps({"weights": weights, "caps": caps, "cap": max(1, TENANT_RENDER_CAP), "rounds": rounds})
+
+
+def enqueue_render(job):
+    """Queue a downloaded job for rendering in its lane, behind its tenant's earlier jobs.
+
+    The caller sends one render token for it (render_stage_task).
+    """
+    redis_client.eval(_ENQUEUE, 0, _fair_prefix(job["lane"]), job["tenant"], json.dumps(job))
+
+
+def next_render_job(lane, token):
+    """The job render token `token` should run, with its tenant's slot already held.
+
+    A token redelivered after its worker died gets the job it was running.
+    None means every waiting tenant is at its cap: the token is parked until
+    a render finishes.
+    """
+    payload = redis_client.eval(
+        _PICK, 0, _fair_prefix(lane), time.time(), RENDER_SLOT_TTL, INFLIGHT_KEY, token, _fair_config()
+    )
+    return json.loads(payload) if payload else None
+
+
+def rendering(lane, token):
+    """Whether render token `token` was mid-render (a redelivered task)."""
+    return bool(redis_client.hexists(f"{_fair_prefix(lane)}:running", token))
+
+
+def release_render_slot(tenant, job_id, token):
+    """Free the job's slot; returns the lanes whose parked tokens should be sent again."""
+    try:
+        woken = redis_client.eval(
+            _RELEASE, 0, tenant, job_id, INFLIGHT_KEY, token, *(_fair_prefix(lane) for lane in LANES)
+        )
+    except redis.RedisError:
+        logger.warning("Tenant slot release skipped, Redis unavailable", exc_info=True)
+        return []
+    prefixes = {_fair_prefix(lane): lane for lane in LANES}
+    return [prefixes[prefix.decode() if isinstance(prefix, bytes) else prefix] for prefix in woken]
+
+
+def parked_renders(lane):
+    return int(redis_client.get(f"{_fair_prefix(lane)}:parked") or 0)
+
+
+def record_render_time(seconds):
+    try:
+        pipe = redis_client.pipeline()
+        pipe.lpush(RENDER_HISTORY_KEY, round(seconds, 3))
+        pipe.ltrim(RENDER_HISTORY_KEY, 0, RENDER_HISTORY_SIZE - 1)
+        pipe.execute()
+    except redis.RedisError:
+        logger.warning("Render time not recorded, Redis unavailable", exc_info=True)
+
+
+def average_render_seconds():
+    history = [float(v) for v in redis_client.lrange(RENDER_HISTORY_KEY, 0, -1)]
+    return sum(history) / len(history) if history else DEFAULT_RENDER_SECONDS
+
+
+def queue_depth(queue):
+    """Messages waiting in a Redis-transport queue, across its priority lists."""
+    keys = [queue] + [f"{queue}{QUEUE_SEP}{step}" for step in PRIORITY_STEPS if step]
+    pipe = redis_client.pipeline()
+    for key in keys:
+        pipe.llen(key)
+    return sum(pipe.execute())
+
+
+def renders_in_flight():
+    return redis_client.zcount(INFLIGHT_KEY, time.time(), "+inf")
+
+
+def estimate_wait(lane, extra_jobs=0):
+    """Seconds until a new render in `lane` would start, from measured history.
+
+    Interactive work only queues behind other interactive work; bulk waits
+    for both lanes. Everything shares the running renders.
+    """
+    lanes = ["interactive"] if lane == "interactive" else list(LANES)
+    # Queued jobs are render tokens on the lane queues plus parked tokens
+    waiting = sum(queue_depth(LANES[name]["queue"]) + parked_renders(name) for name in lanes)
+    waiting += renders_in_flight() + extra_jobs
+    return waiting * average_render_seconds() / max(1, RENDER_SLOTS)
+
+
+def peak_render_budget():
+    """PEAK_RENDER_BUDGET while the render backlog is deep, else None."""
+    if PEAK_RENDER_BUDGET is None:
+        return None
+    try:
+        return PEAK_RENDER_BUDGET if estimate_wait("bulk") > PEAK_BACKLOG_SECONDS else None
+    except redis.RedisError:
+        return None
+
+
+def check_admission(lane, jobs=1):
+    """Return (admitted, eta_seconds). Fails open if Redis is unavailable."""
+    lane = lane if lane in LANES else DEFAULT_LANE
+    try:
+        eta = estimate_wait(lane, extra_jobs=jobs - 1)
+    except redis.RedisError:
+        logger.warning("Admission check skipped, Redis unavailable", exc_info=True)
+        return True, None
+    return eta <= MAX_BACKLOG_SECONDS[lane], round(eta, 1)
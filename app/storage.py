@@ -0,0 +1,134 @@
+import os
+import mimetypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Types the mimetypes table may not know (used by upload_files)
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("application/vnd.apple.mpegurl", ".m3u8")
+mimetypes.add_type("video/iso.segment", ".m4s")
+
+# Environment variables
+R2_BUCKET = os.getenv("R2_BUCKET")
+R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
+R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
+R2_ENDPOINT = os.getenv("R2_ENDPOINT")
+R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")  # Example: https://cdn.yourdomain.com
+
+# Multipart tuning; S3/R2 require parts of at least 5 MiB (except the last)
+MULTIPART_PART_SIZE = max(5 * 1024 * 1024, int(os.getenv("MULTIPART_PART_SIZE", str(8 * 1024 * 1024))))
+MULTIPART_CONCURRENCY = int(os.getenv("MULTIPART_CONCURRENCY", "4"))
+
+# Setup boto3 client for R2 (Cloudflare R2 or other S3-compatible storage)
+s3 = boto3.client(
+    "s3",
+    aws_access_key_id=R2_ACCESS_KEY,
+    aws_secret_access_key=R2_SECRET_KEY,
+    endpoint_url=R2_ENDPOINT,
+    config=Config(signature_version="s3v4", max_pool_connections=max(10, MULTIPART_CONCURRENCY * 2)),
+    region_name="auto"
+)
+
+
+def public_url(key):
+    return f"{R2_PUBLIC_URL}/{key}"
+
+
+def object_exists(key):
+    try:
+        s3.head_object(Bucket=R2_BUCKET, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
+def upload_file(path, key, content_type="video/mp4"):
+    with open(path, "rb") as f:
+        s3.upload_fileobj(f, R2_BUCKET, key, ExtraArgs={"ACL": "public-read", "ContentType": content_type})
+
+
+def upload_files(files, concurrency=MULTIPART_CONCURRENCY):
+    """Upload {key: path} in parallel; content types follow the file extensions."""
+    if not files:
+        return
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(files)))) as pool:
+        futures = [
+            pool.submit(upload_file, path, key, mimetypes.guess_type(path)[0] or "application/octet-stream")
+            for key, path in files.items()
+        ]
+        for future in futures:
+            future.result()
+
+
+class MultipartUpload:
+    """File-like sink that ships whatever is written to it as S3 multipart parts.
+
+    Parts upload on a small thread pool while the writer keeps producing;
+    at most `concurrency` parts are buffered or in flight at once, which
+    bounds memory to roughly part_size * (concurrency + 1).
+    """
+
+    def __init__(self, key, content_type="video/mp4", part_size=MULTIPART_PART_SIZE,
+                 concurrency=MULTIPART_CONCURRENCY, client=None, bucket=None):
+        self.key = key
+        self.client = client or s3
+        self.bucket = bucket or R2_BUCKET
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.futures = []
+        self.bytes_written = 0
+        self._slots = threading.Semaphore(concurrency)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency)
+        resp = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ACL="public-read", ContentType=content_type
+        )
+        self.upload_id = resp["UploadId"]
+
+    def _upload_part(self, number, data):
+        try:
+            resp = self.client.upload_part(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                PartNumber=number, Body=bytes(data)
+            )
+            return {"PartNumber": number, "ETag": resp["ETag"]}
+        finally:
+            self._slots.release()
+
+    def _submit(self, data):
+        self._slots.acquire()
+        number = len(self.futures) + 1
+        self.futures.append(self._pool.submit(self._upload_part, number, data))
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.bytes_written += len(data)
+        while len(self.buffer) >= self.part_size:
+            part = self.buffer[:self.part_size]
+            del self.buffer[:self.part_size]
+            self._submit(part)
+
+    def complete(self):
+        if self.buffer or not self.futures:
+            self._submit(self.buffer)
+            self.buffer = bytearray()
+        try:
+            parts = [f.result() for f in self.futures]
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self.upload_id,
+                MultipartUpload={"Parts": parts}
+            )
+        finally:
+            self._pool.shutdown(wait=True)
+
+    def abort(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except ClientError:
+            pass
@@ -1,6 +1,13 @@
 # supabase_client.py
 import os
+import asyncio
+import logging
+import functools
+import threading
+import time
 import bcrypt
+import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, List, Dict
 from supabase import create_client, Client
 from dotenv import load_dotenv
@@ -8,19 +15,80 @@ import re
 import requests
 from datetime import datetime
 
+from app.metrics import (
+    BCRYPT_QUEUE, BCRYPT_REJECTED, BCRYPT_SECONDS, BCRYPT_WAIT_SECONDS,
+    SUPABASE_CLIENTS_CREATED, SUPABASE_CLIENT_LOOKUPS, SUPABASE_TOKEN_CLIENTS,
+)
+from app.lookup_cache import LookupCache
+from app.ttl_cache import TTLCache
+
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _SUPA_URL = os.getenv("SUPABASE_URL")
 _SUPA_KEY = os.getenv("SUPABASE_KEY")
 _SUPA_SERVICE_ROLE = os.getenv("SUPABASE_SERVICE_ROLE")
 
-def get_supabase_client(token: Optional[str] = None) -> Client:
+# supabase-py is synchronous. Async routes hand its calls (and other blocking
+# work) to this pool instead of running them on the event loop; it is separate
+# from Starlette's threadpool so a slow Supabase can't starve sync routes.
+BLOCKING_WORKERS = int(os.getenv("SUPABASE_BLOCKING_WORKERS", "16"))
+_blocking_pool = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="supabase")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call on the bounded Supabase pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_pool, functools.partial(fn, *args, **kwargs))
+
+# Every client owns an httpx pool, so building one per call paid a fresh
+# TCP/TLS handshake per query. The service client is built once; per-token
+# clients are cached (LRU, expiring before typical JWTs do) and reused.
+POOL_CONNECTIONS = int(os.getenv("SUPABASE_POOL_CONNECTIONS", "32"))
+TOKEN_CLIENT_CACHE_SIZE = int(os.getenv("SUPABASE_TOKEN_CLIENTS", "256"))
+TOKEN_CLIENT_TTL = float(os.getenv("SUPABASE_TOKEN_CLIENT_TTL", "900"))
+
+
+def _close_client(token: str, client: Client) -> None:
+    """Close an evicted per-token client's connection pool."""
+    try:
+        client.postgrest.session.close()
+    except Exception:
+        logger.warning("Closing an evicted Supabase client failed", exc_info=True)
+
+
+_token_clients = TTLCache(maxsize=TOKEN_CLIENT_CACHE_SIZE, ttl=TOKEN_CLIENT_TTL, on_evict=_close_client)
+
+
+def _new_client(token: Optional[str] = None) -> Client:
     client = create_client(_SUPA_URL, _SUPA_SERVICE_ROLE)
+    session = client.postgrest.session
+    # Keep enough idle keep-alive connections for every blocking worker thread
+    client.postgrest.session = type(session)(
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        limits=httpx.Limits(max_connections=POOL_CONNECTIONS, max_keepalive_connections=POOL_CONNECTIONS),
+    )
+    session.close()
     if token:
-        client.auth.set_auth(token)
+        # Queries then run as the token's user, under its row-level security
+        client.postgrest.auth(token)
+    SUPABASE_CLIENTS_CREATED.labels("token" if token else "service").inc()
     return client
 
-supabase: Client = get_supabase_client()
+
+def get_supabase_client(token: Optional[str] = None) -> Client:
+    """The shared service-role client, or a cached client acting as `token`."""
+    if not token:
+        return supabase
+    client, created = _token_clients.get_or_create(token, lambda: _new_client(token))
+    SUPABASE_CLIENT_LOOKUPS.labels("miss" if created else "hit").inc()
+    SUPABASE_TOKEN_CLIENTS.set(len(_token_clients))
+    return client
+
+supabase: Client = _new_client()
 
 # Input sanitization
 def sanitize_input(value: str) -> str:
@@ -56,12 +124,69 @@ def verify_password(plain: str, hashed: bytes) -> bool:
 def hash_pw(plain: str) -> bytes:
     return bcrypt.hashpw(plain.encode('utf-8'), bcrypt.gensalt())
 
-def get_user_record(email: str) -> Optional[Dict]:
-    email = sanitize_input(email)
+# bcrypt costs 100+ ms of CPU per call. Async routes run it on this small pool
+# (bcrypt releases the GIL, so threads use real cores) and shed logins past
+# BCRYPT_MAX_QUEUE, so a login burst can't take every core or thread.
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+BCRYPT_MAX_QUEUE = int(os.getenv("BCRYPT_MAX_QUEUE", "64"))
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_bcrypt_waiting = 0
+_bcrypt_lock = threading.Lock()
+
+
+class PasswordQueueFull(RuntimeError):
+    """More password checks are queued than BCRYPT_MAX_QUEUE allows."""
+
+
+def _timed_bcrypt(op, fn, args, queued_at):
+    global _bcrypt_waiting
+    start = time.perf_counter()
+    with _bcrypt_lock:
+        _bcrypt_waiting -= 1
+    BCRYPT_QUEUE.dec()
+    BCRYPT_WAIT_SECONDS.observe(start - queued_at)
+    try:
+        return fn(*args)
+    finally:
+        BCRYPT_SECONDS.labels(op).observe(time.perf_counter() - start)
+
+
+async def _run_bcrypt(op, fn, *args):
+    global _bcrypt_waiting
+    with _bcrypt_lock:
+        if _bcrypt_waiting >= BCRYPT_MAX_QUEUE:
+            BCRYPT_REJECTED.inc()
+            raise PasswordQueueFull(f"{_bcrypt_waiting} password checks already queued")
+        _bcrypt_waiting += 1
+    BCRYPT_QUEUE.inc()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, _timed_bcrypt, op, fn, args, time.perf_counter())
+
+
+async def check_password(plain: str, hashed: bytes) -> bool:
+    """verify_password() on the bcrypt pool; raises PasswordQueueFull when saturated."""
+    return await _run_bcrypt("check", verify_password, plain, hashed)
+
+
+async def hash_password(plain: str) -> bytes:
+    """hash_pw() on the bcrypt pool; raises PasswordQueueFull when saturated."""
+    return await _run_bcrypt("hash", hash_pw, plain)
+
+# Read-through caches for the hot lookups (n8n hits the by-email route before
+# every post); the writers below invalidate them
+_user_records = LookupCache("user")
+_social_accounts = LookupCache("social")
+
+
+def _fetch_user_record(email: str) -> Optional[Dict]:
     resp = supabase.table("users_app").select("*").eq("email", email).execute()
     data = resp.data
     return data[0] if data else None
 
+def get_user_record(email: str) -> Optional[Dict]:
+    email = sanitize_input(email)
+    return _user_records.get(email, lambda: _fetch_user_record(email))
+
 def insert_user_record(
     uid: str,
     email: str,
@@ -99,8 +224,9 @@ def insert_user_record(
         }).execute()
     except Exception as e:
         raise ValueError(f"Failed to insert user record: {str(e)}")
+    _user_records.invalidate(email)
 
-def upsert_social_record(
+def social_record(
     user_id: str,
     provider: str,
     account_id: str,
@@ -108,29 +234,61 @@ def upsert_social_record(
     access_token: Optional[str] = None,
     refresh_token: Optional[str] = None,
     metadata: Optional[Dict] = None,
-    token: Optional[str] = None
-) -> None:
-    if metadata is None:
-        metadata = {}
-    client = get_supabase_client(token)
-    client.table("social_accounts").upsert({
+) -> Dict:
+    """A `social_accounts` row for upsert_social_records()."""
+    return {
         "user_id": user_id,
         "provider": provider,
         "account_id": account_id,
         "username": username,
         "access_token": access_token,
         "refresh_token": refresh_token,
-        "metadata": metadata,
+        "metadata": metadata or {},
         "created_at": None,
         "updated_at": None
-    }).execute()
+    }
 
-def get_social_accounts(user_id):
+def upsert_social_records(records: List[Dict], token: Optional[str] = None) -> None:
+    """Upsert several social_record() rows in one request."""
+    if not records:
+        return
+    client = get_supabase_client(token)
+    client.table("social_accounts").upsert(records).execute()
+    for user_id in {str(record["user_id"]) for record in records}:
+        _social_accounts.invalidate(user_id)
+
+def upsert_social_record(
+    user_id: str,
+    provider: str,
+    account_id: str,
+    username: Optional[str] = None,
+    access_token: Optional[str] = None,
+    refresh_token: Optional[str] = None,
+    metadata: Optional[Dict] = None,
+    token: Optional[str] = None
+) -> None:
+    upsert_social_records([
+        social_record(user_id, provider, account_id, username, access_token, refresh_token, metadata)
+    ], token=token)
+
+def _fetch_social_accounts(user_id) -> List[Dict]:
+    # postgrest raises APIError itself on failure
     response = supabase.table("social_accounts").select("*").eq("user_id", user_id).execute()
-    if response.error:
-        raise Exception(response.error.message)
     return response.data
 
+def get_social_accounts(user_id):
+    return _social_accounts.get(str(user_id), lambda: _fetch_social_accounts(user_id))
+
+def get_user_id_by_email(email: str) -> Optional[str]:
+    record = get_user_record(email)
+    return record["id"] if record else None
+
+def get_social_account_tokens(user_id) -> List[Dict]:
+    return [
+        {"provider": acc["provider"], "account_id": acc["account_id"], "access_token": acc.get("access_token")}
+        for acc in get_social_accounts(user_id)
+    ]
+
 def test_connection():
     resp = supabase.table("users_app").select("*").limit(1).execute()
-    print(f"Test query result: {resp.data}")
+    logger.info("Test query result: %s", resp.data)
@@ -1,65 +1,427 @@
 import os
 import uuid
 import shutil
-import boto3
-from botocore.config import Config
-from app.generate import download_images
-from app.video_utils import generate_cool_video
+import logging
+import redis
+from celery import maybe_signature, states
+from app.dedup import content_seed, job_fingerprint, release_inflight
+from app.generate import cached_input_hashes, download_images, link_cached_images
+from app.image_cache import get_image_cache
+from app.metrics import JOBS, STAGE_FAILURES
+from app.progress import JobProgress
+from app.scheduling import (
+    DEFAULT_TENANT, TENANT_RETRY_DELAY, enqueue_render, lane_name, lane_options, next_render_job, peak_render_budget,
+    record_render_time, release_render_slot, rendering
+)
+from app.storage import MultipartUpload, object_exists, public_url, upload_file, upload_files
+from app.webhooks import emit_job_event
+from app.video_utils import (
+    HLS_MASTER, MAX_SLIDES_PER_SEGMENT, POSTER_FORMAT, PREVIEW_PROFILE, generate_cool_video, get_encode_settings,
+    plan_timeline, rendition_path, stream_cool_video
+)
 from celery_worker import celery_app
+from transitions import get_template_within_budget
 
-# Environment variables
-R2_BUCKET = os.getenv("R2_BUCKET")
-R2_ACCESS_KEY = os.getenv("R2_ACCESS_KEY")
-R2_SECRET_KEY = os.getenv("R2_SECRET_KEY")
-R2_ENDPOINT = os.getenv("R2_ENDPOINT")
-R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL")  # Example: https://cdn.yourdomain.com
-
-# Setup boto3 client for R2 (Cloudflare R2 or other S3-compatible storage)
-s3 = boto3.client(
-    "s3",
-    aws_access_key_id=R2_ACCESS_KEY,
-    aws_secret_access_key=R2_SECRET_KEY,
-    endpoint_url=R2_ENDPOINT,
-    config=Config(signature_version="s3v4"),
-    region_name="auto"
-)
+logger = logging.getLogger(__name__)
 
-@celery_app.task(bind=True)
-def generate_video_task(self, image_urls: list):
-    job_id = str(uuid.uuid4())
-    tmp_dir = os.path.join("tmp", job_id)
-    output_filename = "output.mp4"
-    output_path = os.path.join(tmp_dir, output_filename)
+# Pipe ffmpeg's fragmented MP4 straight into an R2 multipart upload
+# instead of writing tmp/<job_id>/output.mp4 and uploading afterwards
+STREAM_UPLOAD = os.getenv("STREAM_UPLOAD", "false").lower() in ("1", "true", "yes")
+
+# Job working directories. With the staged pipeline the io and render
+# workers hand files to each other here, so it must be storage they share.
+JOB_DIR = os.getenv("JOB_DIR", "tmp")
+
+# "staged": download, render and upload as separate tasks on the io/render
+# queues; "single": download, render and upload inside render-queue tasks
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "staged")
+
+
+def render_and_upload(image_paths, key, transitions, settings, output_path, stream=None, progress=None):
+    progress = progress or JobProgress(None, None)
+    options = {
+        "transitions": transitions,
+        "profile": settings,
+        "durations": settings.get("durations"),
+        "transition_durations": settings.get("transition_durations"),
+        "on_progress": progress.update,
+    }
+    if stream is None:
+        stream = STREAM_UPLOAD
+    # Streaming can't be split into segments; long slideshows go through a file
+    if len(image_paths) > MAX_SLIDES_PER_SEGMENT:
+        stream = False
+
+    if stream:
+        # Upload overlaps encoding, so it is timed as part of the render stage
+        with progress.stage("render"):
+            upload = MultipartUpload(key)
+            try:
+                stream_cool_video(image_paths, upload, **options)
+                upload.complete()
+            except BaseException:
+                upload.abort()
+                raise
+        return
 
+    with progress.stage("render"):
+        generate_cool_video(image_paths, output=output_path, **options)
+    with progress.stage("upload"):
+        upload_file(output_path, key)
+
+
+###############################################################################
+# Stages
+#
+# Each stage takes and returns a JSON-serializable job dict, so the same code
+# runs back to back in one task or in separate Celery tasks. A failed stage
+# records "error" and later stages pass the job through, so the upload stage
+# always produces the final result and cleans up.
+#
+# Downloaded jobs wait for a render in their lane's fair queue (see
+# app.scheduling) and each is matched by a render token, a render_stage_task
+# message that renders whichever job the queue hands it next.
+###############################################################################
+
+def new_job(job_id, image_urls, dedup_key=None, profile=None, durations=None, transition_durations=None,
+            tenant=None, lane=None, input_hashes=None, renditions=None, extras=None, render_budget=None):
+    return {
+        "job_id": job_id,
+        "image_urls": image_urls,
+        "dedup_key": dedup_key,
+        "profile": profile,
+        "durations": durations,
+        "transition_durations": transition_durations,
+        "tenant": tenant or DEFAULT_TENANT,
+        "lane": lane,
+        # Cached images to render from instead of downloading (approved previews)
+        "input_hashes": input_hashes,
+        # Per-platform cuts of the same render (RENDITIONS names); None = one output
+        "renditions": renditions,
+        # Poster / teaser / HLS ladder from the same render pass (EXTRAS names)
+        "extras": extras,
+        # Estimated CPU seconds the render may take; None = unlimited
+        "render_budget": render_budget,
+        "timings": {},
+    }
+
+
+def _job_dir(job):
+    return os.path.join(JOB_DIR, job["job_id"])
+
+
+def _run_stage(job, progress, fn):
+    if job.get("error"):
+        return job
     try:
-        os.makedirs(tmp_dir, exist_ok=True)
+        fn(job, progress)
+    except Exception as e:
+        logger.exception("Job %s failed in %s", job["job_id"], progress.stage_name)
+        job["error"] = str(e)
+        job["failed_stage"] = progress.stage_name
+        STAGE_FAILURES.labels(progress.stage_name or fn.__name__.lstrip("_")).inc()
+    job["timings"] = progress.timings
+    return job
 
-        # 1. Download images
-        image_paths = download_images(image_urls, folder=tmp_dir)
 
-        # 2. Generate video
-        generate_cool_video(image_paths, output=output_path)
+def _download(job, progress):
+    tmp_dir = _job_dir(job)
+    os.makedirs(tmp_dir, exist_ok=True)
 
-        # 3. Upload video to R2
-        key = f"videos/{job_id}.mp4"
-        with open(output_path, "rb") as f:
-            s3.upload_fileobj(f, R2_BUCKET, key, ExtraArgs={"ACL": "public-read"})
+    # 1. Download images, or reuse the normalized ones an approved preview used
+    with progress.stage("download"):
+        image_paths = None
+        if job.get("input_hashes"):
+            image_paths = link_cached_images(job["input_hashes"], tmp_dir)
+        if image_paths is None:
+            image_paths = download_images(job["image_urls"], folder=tmp_dir)
+        if job["profile"] == PREVIEW_PROFILE:
+            job["input_hashes"] = cached_input_hashes(job["image_urls"])
 
-        # 4. Return video URL
-        video_url = f"{R2_PUBLIC_URL}/{key}"
+    # 2. Pick transitions deterministically from the image contents, within
+    #    the CPU budget, and reuse an identical render if one was already uploaded
+    settings = {
+        **get_encode_settings(job["profile"]),
+        "durations": job["durations"],
+        "transition_durations": job["transition_durations"]
+    }
+    holds, trans_frames = plan_timeline(len(image_paths), settings, job["durations"], job["transition_durations"])
+    transitions, template, estimate = get_template_within_budget(
+        seed=content_seed(image_paths), count=len(image_paths) - 1,
+        budget=job.get("render_budget") or peak_render_budget(),
+        transition_frames=trans_frames, hold_frames=sum(holds), pixels=settings["width"] * settings["height"]
+    )
+    for option in ("renditions", "extras"):
+        if job.get(option):
+            settings[option] = job[option]
+    key = f"videos/{job_fingerprint(image_paths, transitions, settings)}.mp4"
+    keys = _output_keys(job, key) + list(_extra_keys(job, key).values())
+    job.update({
+        "image_paths": image_paths,
+        "transitions": transitions,
+        "template": template,
+        "settings": settings,
+        "key": key,
+        "estimated_cpu": round(estimate, 2),
+        "reused": all(object_exists(k) for k in keys),
+        "uploaded": False,
+    })
 
-        return {
-            "status": "completed",
-            "video_url": video_url
+
+def _output_keys(job, key):
+    renditions = job.get("renditions")
+    return [rendition_path(key, name) for name in renditions] if renditions else [key]
+
+
+def _extra_keys(job, key):
+    base = key[:-len(".mp4")]
+    keys = {
+        "poster": f"{base}.poster.{POSTER_FORMAT}",
+        "teaser": f"{base}.teaser.mp4",
+        "hls": f"{base}/hls/{HLS_MASTER}",
+    }
+    return {name: keys[name] for name in job.get("extras") or []}
+
+
+def _render(job, progress):
+    if job["reused"]:
+        return
+    output_path = os.path.join(_job_dir(job), "output.mp4")
+    # Renditions and extras are several files from one ffmpeg, so they can't stream
+    if STREAM_UPLOAD and not job.get("renditions") and not job.get("extras"):
+        render_and_upload(job["image_paths"], job["key"], job["transitions"], job["settings"],
+                          output_path, stream=True, progress=progress)
+        job["uploaded"] = True
+    else:
+        extra_keys = _extra_keys(job, job["key"])
+        extras = {
+            "poster": os.path.join(_job_dir(job), f"poster.{POSTER_FORMAT}"),
+            "teaser": os.path.join(_job_dir(job), "teaser.mp4"),
+            "hls": os.path.join(_job_dir(job), "hls"),
         }
+        extras = {name: path for name, path in extras.items() if name in extra_keys}
+        with progress.stage("render"):
+            rendered = generate_cool_video(
+                job["image_paths"], output=output_path, transitions=job["transitions"], profile=job["settings"],
+                durations=job["durations"], transition_durations=job["transition_durations"],
+                on_progress=progress.update, renditions=job.get("renditions"), **extras
+            )
+        # Object key -> local file, uploaded in parallel by the upload stage
+        if rendered:
+            job["outputs"] = {rendition_path(job["key"], name): path for name, path in rendered.items()}
+        else:
+            job["outputs"] = {job["key"]: output_path}
+        for name, path in extras.items():
+            if name != "hls":
+                job["outputs"][extra_keys[name]] = path
+                continue
+            prefix = os.path.dirname(extra_keys["hls"])
+            for dirpath, _, filenames in os.walk(path):
+                for filename in filenames:
+                    file_path = os.path.join(dirpath, filename)
+                    job["outputs"][f"{prefix}/{os.path.relpath(file_path, path)}"] = file_path
+    # Feeds the ETA used for admission control
+    record_render_time(progress.timings["render"])
 
-    except Exception as e:
+
+def _upload(job, progress):
+    if job["reused"] or job["uploaded"]:
+        return
+    with progress.stage("upload"):
+        upload_files(job["outputs"])
+    job["uploaded"] = True
+
+
+def _finish(job):
+    # Clean up temporary files and let new submissions render again
+    tmp_dir = _job_dir(job)
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if job.get("dedup_key"):
+        release_inflight(job["dedup_key"], job["job_id"])
+
+    JOBS.labels("failed" if job.get("error") else "reused" if job.get("reused") else "completed").inc()
+    result = _result(job)
+    emit_job_event(job, result)
+    return result
+
+
+def _result(job):
+    if job.get("error"):
         return {
             "status": "failed",
-            "error": str(e)
+            "error": job["error"],
+            "stage": job.get("failed_stage"),
+            "timings": job["timings"]
         }
+    keys = _output_keys(job, job["key"])
+    result = {
+        "status": "completed",
+        "video_url": public_url(keys[0]),
+        "template_used": job["template"],
+        "reused": job["reused"],
+        "estimated_cpu": job.get("estimated_cpu"),
+        "timings": job["timings"]
+    }
+    if job.get("renditions"):
+        result["renditions"] = {name: public_url(key) for name, key in zip(job["renditions"], keys)}
+    for name, key in _extra_keys(job, job["key"]).items():
+        result[f"{name}_url"] = public_url(key)
+    if job["profile"] == PREVIEW_PROFILE:
+        result["input_hashes"] = job.get("input_hashes")
+    return result
+
+
+def _progress(task, job):
+    return JobProgress(task, job["job_id"], timings=job.get("timings"))
+
+
+def _needs_render(job):
+    return not job.get("error") and not job.get("reused")
+
 
+def _queue_render(job):
+    """Queue a downloaded job in its lane's fair queue and send a render token for it."""
+    lane = lane_name(job["lane"])
+    try:
+        enqueue_render(job)
+    except redis.RedisError:
+        logger.warning("Render queue unavailable, rendering job %s unscheduled", job["job_id"], exc_info=True)
+        return render_stage_task.apply_async((lane,), {"job": job}, **lane_options(lane))
+    return render_stage_task.apply_async((lane,), **lane_options(lane))
+
+
+def _render_next(task, lane):
+    """Render the next job `lane`'s fair queue hands this token, then complete it.
+
+    Returns None without rendering when every waiting tenant is at its cap;
+    the token is parked and sent again when a render finishes. The tenant
+    slot is released as soon as the render ends, never held while waiting.
+    """
+    job = next_render_job(lane, task.request.id)
+    if job is None:
+        return None
+    try:
+        job = _run_stage(job, _progress(task, job), _render)
+    finally:
+        for woken in release_render_slot(job["tenant"], job["job_id"], task.request.id):
+            render_stage_task.apply_async((woken,), **lane_options(woken))
+    return _complete(task, job)
+
+
+def _complete(task, job):
+    """Upload a rendered job and record its result under its job id."""
+    if PIPELINE_MODE != "single":
+        upload_stage_task.apply_async((job,), task_id=job["job_id"], priority=lane_options(job["lane"])["priority"])
+        return None
+    job = _run_stage(job, _progress(task, job), _upload)
+    result = _finish(job)
+    task.backend.store_result(job["job_id"], result, states.SUCCESS)
+    return result
+
+
+@celery_app.task(bind=True, ignore_result=True)
+def generate_video_task(self, image_urls: list, dedup_key: str = None, profile: str = None,
+                        durations: list = None, transition_durations: list = None,
+                        tenant: str = None, lane: str = None, input_hashes: list = None,
+                        renditions: list = None, extras: list = None, render_budget: float = None):
+    """Single mode: download this job, then render as its token.
+
+    The token renders whichever job the fair queue hands it, so results are
+    stored by _complete under each job's id, not returned.
+    """
+    job = new_job(self.request.id, image_urls, dedup_key, profile, durations, transition_durations, tenant, lane,
+                  input_hashes, renditions, extras, render_budget)
+    lane = lane_name(lane)
+    try:
+        # Redelivered mid-render: finish the job this token was rendering
+        if rendering(lane, self.request.id):
+            return _render_next(self, lane)
+    except redis.RedisError:
+        pass
+    job = _run_stage(job, _progress(self, job), _download)
+    if not _needs_render(job):
+        return _complete(self, job)
+    try:
+        enqueue_render(job)
+    except redis.RedisError:
+        logger.warning("Render queue unavailable, rendering job %s unscheduled", job["job_id"], exc_info=True)
+        return _complete(self, _run_stage(job, _progress(self, job), _render))
+    try:
+        return _render_next(self, lane)
+    except redis.RedisError:
+        # The job is queued; hand its token to a task that retries
+        render_stage_task.apply_async((lane,), **lane_options(lane))
+
+
+@celery_app.task(bind=True)
+def download_stage_task(self, job: dict):
+    job = _run_stage(job, _progress(self, job), _download)
+    if _needs_render(job):
+        _queue_render(job)
+    else:
+        _complete(self, job)
+
+
+@celery_app.task(bind=True, max_retries=None)
+def render_stage_task(self, lane: str, job: dict = None):
+    """Render token for `lane`; `job` is set only when it couldn't be queued fairly."""
+    if job is not None:
+        return _complete(self, _run_stage(job, _progress(self, job), _render))
+    try:
+        return _render_next(self, lane)
+    except redis.RedisError as e:
+        raise self.retry(exc=e, countdown=TENANT_RETRY_DELAY)
+
+
+@celery_app.task(bind=True)
+def upload_stage_task(self, job: dict):
+    job = _run_stage(job, _progress(self, job), _upload)
+    return _finish(job)
+
+
+def video_job_signature(job_id, image_urls, **options):
+    """Signature that renders one video and stores its result under job_id."""
+    # Render work goes to the job's priority lane; io stages share one queue
+    render_options = lane_options(options.get("lane"))
+    if PIPELINE_MODE == "single":
+        return generate_video_task.signature(
+            args=[image_urls], kwargs=options, task_id=job_id, immutable=True, **render_options
+        )
+    job = new_job(job_id, image_urls, **options)
+    # The download stage sends the render token, and the token sends the
+    # upload stage under the job id, so AsyncResult(job_id) is the job's
+    # result. Immutable, so a parent's result (e.g. a batch prefetch) is
+    # never prepended to its args.
+    return download_stage_task.signature(args=[job], priority=render_options["priority"], immutable=True)
+
+
+@celery_app.task
+def prefetch_images_task(image_urls: list, then=None):
+    """Warm the shared image cache with URLs used by several jobs in a batch.
+
+    `then` (the batch's render group) is applied once the cache is warm. It
+    is sent from here rather than chained after this task, so none of its
+    jobs gets this task's result as an argument. Never fails, so a bad URL
+    only fails the jobs that use it.
+    """
+    try:
+        return _prefetch(image_urls)
+    finally:
+        if then is not None:
+            maybe_signature(then, app=celery_app).apply_async()
+
+
+def _prefetch(image_urls):
+    if not image_urls or get_image_cache() is None:
+        return {"prefetched": 0}
+
+    tmp_dir = os.path.join(JOB_DIR, f"prefetch-{uuid.uuid4()}")
+    try:
+        download_images(image_urls, folder=tmp_dir)
+        return {"prefetched": len(image_urls)}
+    except Exception as e:
+        logger.warning("Batch prefetch failed: %s", e)
+        return {"prefetched": 0, "error": str(e)}
     finally:
-        # 5. Clean up temporary files
-        if os.path.exists(tmp_dir):
-            shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
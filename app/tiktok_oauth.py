@@ -1,20 +1,34 @@
 import os
-import requests
 import urllib.parse
 import uuid
 import json
+import logging
+import httpx
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse, HTMLResponse
 from dotenv import load_dotenv
-from app.supabase_client import upsert_social_record
+from app.http_client import get_http_client
+from app.supabase_client import run_blocking, upsert_social_record
 
 load_dotenv()
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 TIKTOK_CLIENT_KEY = os.getenv("TIKTOK_CLIENT_KEY")
 TIKTOK_CLIENT_SECRET = os.getenv("TIKTOK_CLIENT_SECRET")
 BASE_DOMAIN = os.getenv("BASE_DOMAIN")
 SCOPES = "user.info.basic,video.upload,video.publish"
+TIKTOK_API_URL = os.getenv("TIKTOK_API_URL", "https://open.tiktokapis.com/v2")
+
+def _state_user(state):
+    """The user a /tiktok/login state was issued for, or None if it doesn't parse."""
+    try:
+        # "<json>:<nonce>"; the JSON part contains colons too
+        state_data, _ = state.rsplit(':', 1)
+        user = json.loads(state_data)
+    except ValueError:
+        return None
+    return user if isinstance(user, dict) and "id" in user else None
 
 @router.get("/tiktok/login")
 def tiktok_login(request: Request):
@@ -36,35 +50,33 @@ def tiktok_login(request: Request):
     return RedirectResponse(url)
 
 @router.get("/tiktok/callback")
-def tiktok_callback(request: Request, code: str | None = None, state: str | None = None, error: str | None = None, error_description: str | None = None):
+async def tiktok_callback(request: Request, code: str | None = None, state: str | None = None, error: str | None = None, error_description: str | None = None):
     if error:
         return HTMLResponse(f"<h3 style='color:red;'>TikTok error: {error_description}</h3>")
 
-    if not state:
-        return RedirectResponse("/login")
-    try:
-        state_data, _ = state.split(':', 1)
-        user = json.loads(state_data)
-        if not user or "id" not in user:
-            raise ValueError("Invalid state data")
-    except (ValueError, json.JSONDecodeError):
+    user = _state_user(state) if state else None
+    if user is None:
         return RedirectResponse("/login")
 
     redirect_uri = f"https://{BASE_DOMAIN}/auth/callback"
 
     # Exchange code for token
-    response = requests.post(
-    "https://open.tiktokapis.com/v2/oauth/token/",
-    data={
-        "client_key": TIKTOK_CLIENT_KEY,
-        "client_secret": TIKTOK_CLIENT_SECRET,
-        "code": code,
-        "grant_type": "authorization_code",
-        "redirect_uri": redirect_uri
-    },
-    headers={"Content-Type": "application/x-www-form-urlencoded"}
-    )
-    if not response.ok:
+    try:
+        response = await get_http_client().post(
+            f"{TIKTOK_API_URL}/oauth/token/",
+            data={
+                "client_key": TIKTOK_CLIENT_KEY,
+                "client_secret": TIKTOK_CLIENT_SECRET,
+                "code": code,
+                "grant_type": "authorization_code",
+                "redirect_uri": redirect_uri
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"}
+        )
+    except httpx.HTTPError:
+        logger.exception("TikTok token exchange failed")
+        raise HTTPException(502, "TikTok is unavailable, try again")
+    if not response.is_success:
         raise HTTPException(400, "Failed to get TikTok access token")
     token_resp = response.json()
 
@@ -77,7 +89,8 @@ def tiktok_callback(request: Request, code: str | None = None, state: str | None
     open_id = data["open_id"]
 
     # Save TikTok account
-    upsert_social_record(
+    await run_blocking(
+        upsert_social_record,
         user_id=user["id"],
         provider="tiktok",
         account_id=open_id,
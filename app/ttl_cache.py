@@ -0,0 +1,87 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after being set.
+
+    Holds at most `maxsize` entries, dropping the least recently used first.
+    `hits` and `misses` count get() outcomes since creation. `on_evict(key,
+    value)` is called, outside the lock, for every value the cache drops on
+    its own (expired, least recently used, replaced or cleared), so values
+    holding resources can be closed; pop() hands the value to the caller instead.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300.0, clock=time.monotonic, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        evicted = []
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires, value = entry
+                if expires > self.clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                evicted.append((key, value))
+            self.misses += 1
+        self._evicted(evicted)
+        return default
+
+    def set(self, key, value, ttl=None):
+        evicted = []
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] is not value:
+                evicted.append((key, entry[1]))
+            self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                old_key, (_, old_value) = self._data.popitem(last=False)
+                evicted.append((old_key, old_value))
+        self._evicted(evicted)
+
+    def get_or_create(self, key, factory):
+        """Return the cached value for `key`, building and caching it on a miss.
+
+        Returns (value, created). `factory` runs outside the lock, so two
+        threads missing at once may both build; the last one set wins.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value, False
+        value = factory()
+        self.set(key, value)
+        return value, True
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+            return default if entry is _MISSING else entry[1]
+
+    def clear(self):
+        with self._lock:
+            evicted = [(key, value) for key, (_, value) in self._data.items()]
+            self._data.clear()
+        self._evicted(evicted)
+
+    def _evicted(self, entries):
+        if self.on_evict is not None:
+            for key, value in entries:
+                self.on_evict(key, value)
+
+    def __len__(self):
+        return len(self._data)
@@ -1,54 +1,732 @@
+import os
+import shutil
+import logging
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+from app.metrics import FFMPEG_RUNNING, observe_ffmpeg
 
-def generate_cool_video(image_paths, output='output.mp4', transitions=None):
-    if len(image_paths) != 10:
-        raise ValueError("You must provide exactly 10 images.")
+logger = logging.getLogger(__name__)
 
-    duration = 3
-    transition = 1
+# "still": decode + scale each image once, then repeat the prepared frame.
+# "loop":  the original graph (-loop 1 input, re-decoded every frame, yuva420p).
+RENDER_ENGINE = os.getenv("RENDER_ENGINE", "still")
+
+# Canvas, timing and codec shared by every profile (only "preview" shrinks the canvas)
+ENCODE_SETTINGS = {
+    "engine": RENDER_ENGINE,
+    "width": 1080,
+    "height": 1920,
+    "fps": 30,
+    "duration": 3,
+    "transition": 1,
+    "codec": "libx264",
+    "pix_fmt": "yuv420p",
+}
+
+# Named speed/size/quality trade-offs. `crf` or `bitrate` picks rate control;
+# threads=0 lets x264 choose, filter_threads=0 uses every core for the graph.
+ENCODE_PROFILES = {
+    "draft": {
+        "preset": "veryfast",
+        "crf": 28,
+        "tune": "stillimage",
+        "fps": 24,
+        "gop": 96,
+        "threads": 0,
+        "filter_threads": 0,
+    },
+    "standard": {
+        "preset": "medium",
+        "crf": 23,
+        "tune": "stillimage",
+        "fps": 30,
+        "gop": 60,
+        "threads": 0,
+        "filter_threads": 0,
+    },
+    "archival": {
+        "preset": "slow",
+        "crf": 18,
+        "tune": "stillimage",
+        "fps": 30,
+        "gop": 30,
+        "threads": 0,
+        "filter_threads": 0,
+    },
+    # Quarter-size, low frame rate check of slide order and transitions
+    "preview": {
+        "width": 360,
+        "height": 640,
+        "preset": "ultrafast",
+        "crf": 30,
+        "tune": "stillimage",
+        "fps": 12,
+        "gop": 48,
+        "threads": 0,
+        "filter_threads": 0,
+    },
+}
+DEFAULT_PROFILE = os.getenv("ENCODE_PROFILE", "standard")
+PREVIEW_PROFILE = "preview"
+
+# Per-platform renditions cut from the one rendered canvas. "crop" keeps the
+# centre at the target aspect; "pad" letterboxes the whole canvas. Sizes are
+# for the 1080x1920 canvas and shrink with it (e.g. for previews).
+RENDITIONS = {
+    "9x16": {"width": 1080, "height": 1920, "fit": "crop"},  # TikTok, Reels, Stories
+    "4x5": {"width": 1080, "height": 1350, "fit": "crop"},   # Instagram feed
+    "1x1": {"width": 1080, "height": 1080, "fit": "crop"},   # Facebook / Instagram square
+    "16x9": {"width": 1920, "height": 1080, "fit": "pad"},   # Facebook landscape
+}
+
+# Extras cut from the same render pass (see generate_cool_video)
+EXTRAS = ("poster", "teaser", "hls")
+FASTSTART = os.getenv("FASTSTART", "true").lower() in ("1", "true", "yes")
+POSTER_FORMAT = os.getenv("POSTER_FORMAT", "jpg")  # jpg | webp
+POSTER_QUALITY = int(os.getenv("POSTER_QUALITY", "85"))  # 0-100
+TEASER_SECONDS = float(os.getenv("TEASER_SECONDS", "4"))
+TEASER_FPS = 12
+TEASER_WIDTH = 270
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", "4"))
+HLS_MASTER = "master.m3u8"
+# Rungs for the 1080x1920 canvas. The bitrates are for the standard profile
+# (crf 23 at 30 fps); hls_ladder rescales them for each render's profile.
+HLS_LADDER = [
+    {"name": "1080p", "width": 1080, "height": 1920, "kbps": 5000},
+    {"name": "720p", "width": 720, "height": 1280, "kbps": 2800},
+    {"name": "480p", "width": 480, "height": 854, "kbps": 1200},
+]
+HLS_RUNGS = max(1, min(len(HLS_LADDER), int(os.getenv("HLS_RUNGS", "3"))))
+HLS_REFERENCE_CRF = 23
+HLS_REFERENCE_FPS = 30
+
+# Split the timeline into this many independently rendered segments
+RENDER_SEGMENTS = int(os.getenv("RENDER_SEGMENTS", "1"))
+# Upper bound on slides (= open inputs) per ffmpeg process; longer slideshows
+# are rendered in chunks so memory stays flat as the slide count grows
+MAX_SLIDES_PER_SEGMENT = max(2, int(os.getenv("MAX_SLIDES_PER_SEGMENT", "12")))
+# Concurrent segment renders; defaults to the core count
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "0"))
+
+
+def get_encode_settings(profile=None):
+    """Merge a profile (name or dict) over ENCODE_SETTINGS.
+
+    The result describes everything that changes the rendered bytes, so it
+    also feeds the job fingerprint.
+    """
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    if isinstance(profile, str):
+        if profile not in ENCODE_PROFILES:
+            raise ValueError(f"Unknown encode profile: {profile}")
+        settings = {**ENCODE_SETTINGS, **ENCODE_PROFILES[profile], "profile": profile}
+    else:
+        settings = {**ENCODE_SETTINGS, **profile}
+    return settings
+
+
+def _encoder_args(settings):
+    args = ["-c:v", settings["codec"], "-preset", settings["preset"]]
+    if settings.get("bitrate"):
+        args.extend(["-b:v", settings["bitrate"]])
+        if settings.get("maxrate"):
+            args.extend(["-maxrate", settings["maxrate"], "-bufsize", settings.get("bufsize", settings["maxrate"])])
+    else:
+        args.extend(["-crf", str(settings["crf"])])
+    if settings.get("tune"):
+        args.extend(["-tune", settings["tune"]])
+    if settings.get("gop"):
+        args.extend(["-g", str(settings["gop"])])
+    args.extend(["-threads", str(settings.get("threads", 0))])
+    return args
+
+
+def _input_args(image_paths, lengths, fps, engine):
     input_args = []
+    for img, frames in zip(image_paths, lengths):
+        if engine == "loop":
+            input_args.extend(["-loop", "1", "-t", _seconds(frames, fps), "-i", img])
+        else:
+            # A single frame per image; the loop filter repeats it after scaling
+            input_args.extend(["-framerate", str(fps), "-i", img])
+    return input_args
+
+
+def _seconds(frames, fps):
+    return f"{frames / fps:.6f}".rstrip("0").rstrip(".")
+
+
+def _slide_filter(i, width, height, frames, fps, engine):
+    fit = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=black"
+    )
+    if engine == "loop":
+        return f"[{i}:v]{fit},format=yuva420p,setsar=1[v{i}]"
+    # Slides are opaque and xfade blends planar YUV directly, so stay in
+    # yuv420p instead of paying for an alpha plane on every frame
+    return (
+        f"[{i}:v]{fit},setsar=1,format=yuv420p,"
+        # setpts alone leaves the frame rate unset (1/0), which xfade rejects
+        f"loop=loop={frames - 1}:size=1:start=0,setpts=N/{fps}/TB,fps={fps}[v{i}]"
+    )
+
+
+def _timeline(count, settings, durations=None, transition_durations=None):
+    """Per-slide hold frames and per-transition frames for the whole video.
+
+    durations[i] is how long slide i is on screen, including the
+    transitions it takes part in; transition_durations[i] is the crossfade
+    from slide i to i+1. Either defaults to the settings. Slide i is on
+    screen alone for holds[i] frames, then crossfades into slide i+1 over
+    transitions[i] frames.
+    """
+    fps = settings["fps"]
+    if durations is None:
+        durations = [settings["duration"]] * count
+    if transition_durations is None:
+        transition_durations = [settings["transition"]] * (count - 1)
+    if len(durations) != count:
+        raise ValueError(f"Expected {count} slide durations, got {len(durations)}.")
+    if len(transition_durations) != count - 1:
+        raise ValueError(f"Expected {count - 1} transition durations, got {len(transition_durations)}.")
+
+    slide_frames = [round(d * fps) for d in durations]
+    trans_frames = [round(t * fps) for t in transition_durations]
+    # A zero-frame slide would become loop=-1 (loop forever) in its filter
+    if any(f <= 0 for f in slide_frames):
+        raise ValueError("Slide durations must be at least one frame.")
+    if any(t <= 0 for t in trans_frames):
+        raise ValueError("Transition durations must be at least one frame.")
+
+    holds = []
+    for i, frames in enumerate(slide_frames):
+        incoming = trans_frames[i - 1] if i > 0 else 0
+        outgoing = trans_frames[i] if i < count - 1 else 0
+        hold = frames - incoming - outgoing
+        if hold < 0:
+            raise ValueError(f"Slide {i + 1} is shorter than its transitions.")
+        holds.append(hold)
+    return holds, trans_frames
+
+
+def validate_renditions(renditions):
+    unknown = [name for name in renditions or [] if name not in RENDITIONS]
+    if unknown:
+        raise ValueError(f"Unknown renditions: {', '.join(unknown)} (expected {', '.join(RENDITIONS)})")
+    if renditions is not None and len(set(renditions)) != len(renditions):
+        raise ValueError("Renditions must not repeat.")
+
+
+def validate_extras(extras):
+    unknown = [name for name in extras or [] if name not in EXTRAS]
+    if unknown:
+        raise ValueError(f"Unknown extras: {', '.join(unknown)} (expected {', '.join(EXTRAS)})")
+
+
+def rendition_path(output, name):
+    """output.mp4 -> output.<name>.mp4"""
+    root, ext = os.path.splitext(output)
+    return f"{root}.{name}{ext or '.mp4'}"
 
-    for img in image_paths:
-        input_args.extend(["-loop", "1", "-t", str(duration), "-i", img])
+
+def _even(value):
+    return max(2, int(round(value / 2)) * 2)
+
+
+def _scaled(width, height, settings):
+    """A size given for the 1080x1920 canvas, scaled to this render's canvas."""
+    scale = settings["width"] / ENCODE_SETTINGS["width"]
+    return _even(width * scale), _even(height * scale)
+
+
+def hls_ladder(settings):
+    """HLS_RUNGS rungs of HLS_LADDER sized to this canvas, at bitrates for its profile.
+
+    Rates scale with pixel count and frame rate and halve for every 6 CRF
+    above the reference, so a draft ladder is lighter than an archival one;
+    rungs are named after their scaled width.
+    """
+    scale = settings["width"] / ENCODE_SETTINGS["width"]
+    quality = 2 ** ((HLS_REFERENCE_CRF - settings.get("crf", HLS_REFERENCE_CRF)) / 6)
+    factor = scale ** 2 * settings["fps"] / HLS_REFERENCE_FPS * quality
+    ladder = []
+    for rung in HLS_LADDER[:HLS_RUNGS]:
+        width, height = _scaled(rung["width"], rung["height"], settings)
+        ladder.append({"name": f"{width}p", "width": width, "height": height,
+                       "kbps": max(1, round(rung["kbps"] * factor))})
+    return ladder
+
+
+def _rendition_fit(name, settings):
+    spec = RENDITIONS[name]
+    width, height = _scaled(spec["width"], spec["height"], settings)
+    if (width, height) == (settings["width"], settings["height"]):
+        return "null"
+    if spec["fit"] == "crop":
+        return (
+            f"crop='min(iw,ih*{width}/{height})':'min(ih,iw*{height}/{width})',"
+            f"scale={width}:{height},setsar=1"
+        )
+    return (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:color=black,setsar=1"
+    )
+
+
+def plan_timeline(count, profile=None, durations=None, transition_durations=None):
+    """(holds, transition frames) a render of `count` slides will use."""
+    return _timeline(count, get_encode_settings(profile), durations, transition_durations)
+
+
+def validate_timing(count, durations=None, transition_durations=None, profile=None):
+    """Raise ValueError if the per-slide/per-transition timing can't be rendered."""
+    if count < 1:
+        raise ValueError("You must provide at least one image.")
+    _timeline(count, get_encode_settings(profile), durations, transition_durations)
+
+
+def plan_segments(holds, transitions, segments):
+    """Split slides into `segments` independent renders.
+
+    Cuts fall at the start of a slide's hold, after its incoming transition
+    has finished, so every transition lives entirely inside one segment.
+    Returns a list of (first_slide, last_slide) pairs; adjacent segments
+    share the slide at the cut.
+    """
+    count = len(holds)
+    segments = max(1, min(segments, count - 1))
+    cuts = sorted({round(p * (count - 1) / segments) for p in range(segments + 1)})
+    return list(zip(cuts, cuts[1:])) or [(0, 0)]
+
+
+def _segment_lengths(holds, transitions, first, last):
+    """Input length in frames of each slide in the segment first..last."""
+    lengths = []
+    for i in range(first, last + 1):
+        frames = transitions[i - 1] if i > first else 0
+        if i < last or last == len(holds) - 1:
+            frames += holds[i]
+        if i < last:
+            frames += transitions[i]
+        lengths.append(frames)
+    return lengths
+
+
+def _build_graph(lengths, names, trans_frames, settings, engine):
+    """xfade chain over slides with the given input lengths; returns (graph, frames)."""
+    width = settings["width"]
+    height = settings["height"]
+    fps = settings["fps"]
 
     filters = []
-    for i in range(len(image_paths)):
+    for i, frames in enumerate(lengths):
+        filters.append(_slide_filter(i, width, height, frames, fps, engine))
+
+    last = "[v0]"
+    total = lengths[0]
+    for i, (name, frames) in enumerate(zip(names, trans_frames)):
+        offset = total - frames
         filters.append(
-            f"[{i}:v]scale=1080:1920:force_original_aspect_ratio=decrease,"\
-            f"pad=1080:1920:(ow-iw)/2:(oh-ih)/2:color=black,format=yuva420p,setsar=1[v{i}]"
+            f"{last}[v{i+1}]xfade=transition={name}:duration={_seconds(frames, fps)}"
+            f":offset={_seconds(offset, fps)}[x{i}]"
         )
+        last = f"[x{i}]"
+        total = offset + lengths[i + 1]
 
-    if transitions is None:
-        transitions = ["fade"] * (len(image_paths) - 1)
+    return ";".join(filters) + f";{last}format=yuv420p[v]", total
+
+
+def _video_output_args(label, total_frames, settings):
+    return [
+        "-map", label,
+        "-frames:v", str(total_frames),
+        "-r", str(settings["fps"]),
+        "-pix_fmt", settings["pix_fmt"],
+        *_encoder_args(settings),
+    ]
+
+
+def _mp4_args(path, faststart):
+    if path.startswith("pipe:"):
+        # No seeking back to write the moov atom on a pipe
+        return ["-f", "mp4", "-movflags", "frag_keyframe+empty_moov+default_base_moof"]
+    if faststart and path.endswith(".mp4"):
+        # Move the moov atom to the front so playback starts before the download ends
+        return ["-movflags", "+faststart"]
+    return []
 
-    for i in range(len(image_paths) - 1):
-        trans = transitions[i % len(transitions)]
-        offset = (duration - transition) * i + duration - transition
-        if i == 0:
-            filters.append(f"[v0][v1]xfade=transition={trans}:duration={transition}:offset={offset}[x0]")
-        else:
-            filters.append(f"[x{i-1}][v{i+1}]xfade=transition={trans}:duration={transition}:offset={offset}[x{i}]")
 
-    last_output = f"[x{len(image_paths) - 2}]"
-    filter_chain = ";".join(filters) + f";{last_output}format=yuv420p[v]"
+def _poster_args(label, path):
+    if path.endswith(".webp"):
+        codec = ["-c:v", "libwebp", "-quality", str(POSTER_QUALITY)]
+    else:
+        # JPEG qscale: 2 (best) .. 31
+        codec = ["-q:v", str(max(2, round(31 - POSTER_QUALITY * 29 / 100))), "-update", "1"]
+    return ["-map", label, "-frames:v", "1", *codec, path]
 
-    total_duration = duration + (duration - transition) * (len(image_paths) - 2)
 
-    cmd = [
+def _teaser_args(label, path, faststart):
+    if path.endswith(".webp"):
+        codec = ["-c:v", "libwebp_anim", "-loop", "0", "-quality", "60"]
+    else:
+        codec = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "30", "-pix_fmt", "yuv420p"]
+    return ["-map", label, *codec, *_mp4_args(path, faststart), path]
+
+
+def _hls_args(labels, ladder, total_frames, settings, directory):
+    """One HLS/CMAF output carrying every rung of `ladder`, with aligned keyframes."""
+    fps = settings["fps"]
+    gop = fps * HLS_SEGMENT_SECONDS
+    args = []
+    for label in labels:
+        args.extend(["-map", label])
+    args.extend([
+        "-frames:v", str(total_frames),
+        "-r", str(fps),
+        "-pix_fmt", settings["pix_fmt"],
+        "-c:v", settings["codec"],
+        "-preset", settings["preset"],
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+    ])
+    if settings.get("tune"):
+        args.extend(["-tune", settings["tune"]])
+    for i, rung in enumerate(ladder):
+        rate = rung["kbps"]
+        args.extend([f"-b:v:{i}", f"{rate}k", f"-maxrate:v:{i}", f"{rate}k", f"-bufsize:v:{i}", f"{rate * 2}k"])
+    stream_map = " ".join(f"v:{i},name:{rung['name']}" for i, rung in enumerate(ladder))
+    args.extend([
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_type", "fmp4",
+        "-hls_flags", "independent_segments",
+        "-master_pl_name", HLS_MASTER,
+        "-hls_segment_filename", os.path.join(directory, "%v", "segment%03d.m4s"),
+        "-var_stream_map", stream_map,
+        os.path.join(directory, "%v", "index.m3u8"),
+    ])
+    return args
+
+
+def _canvas_outputs(source, output, total_frames, settings, poster_frame=0, poster=None, teaser=None,
+                    hls=None, faststart=FASTSTART):
+    """Fan the finished canvas out to every requested encode.
+
+    Returns (filter graph splitting `source`, output argv). `output` is a
+    path, {rendition: path} or None; poster, teaser and hls are paths (a
+    directory for hls) of extras cut from the same frames.
+    """
+    fits = []
+    args = []
+
+    def tap(fit):
+        fits.append(fit)
+        return f"[o{len(fits) - 1}]"
+
+    if isinstance(output, dict):
+        for name, path in output.items():
+            args.extend(_video_output_args(tap(_rendition_fit(name, settings)), total_frames, settings))
+            args.extend([*_mp4_args(path, faststart), path])
+    elif output:
+        args.extend([*_video_output_args(tap("null"), total_frames, settings), *_mp4_args(output, faststart), output])
+
+    if poster:
+        label = tap(f"trim=start_frame={poster_frame}:end_frame={poster_frame + 1},setpts=PTS-STARTPTS")
+        args.extend(_poster_args(label, poster))
+    if teaser:
+        fps = settings["fps"]
+        width, _ = _scaled(TEASER_WIDTH, 0, settings)
+        label = tap(
+            f"trim=end_frame={min(total_frames, round(TEASER_SECONDS * fps))},setpts=PTS-STARTPTS,"
+            f"fps={min(fps, TEASER_FPS)},scale={width}:-2,setsar=1"
+        )
+        args.extend(_teaser_args(label, teaser, faststart))
+    if hls:
+        ladder = hls_ladder(settings)
+        labels = [tap(
+            f"scale={rung['width']}:{rung['height']}:force_original_aspect_ratio=decrease,"
+            f"pad={rung['width']}:{rung['height']}:(ow-iw)/2:(oh-ih)/2:color=black,setsar=1"
+        ) for rung in ladder]
+        args.extend(_hls_args(labels, ladder, total_frames, settings, hls))
+
+    if len(fits) == 1:
+        return f"{source}{fits[0]}[o0]", args
+    labels = "".join(f"[s{i}]" for i in range(len(fits)))
+    graph = [f"{source}split={len(fits)}{labels}"]
+    graph.extend(f"[s{i}]{fit}[o{i}]" for i, fit in enumerate(fits))
+    return ";".join(graph), args
+
+
+def _build_command(image_paths, lengths, names, trans_frames, output, settings, engine, faststart=FASTSTART,
+                   **extras):
+    """ffmpeg argv for one render. `output` is a path, or {rendition: path}
+    to encode several renditions from the same decode and xfade chain;
+    `extras` are _canvas_outputs' poster/teaser/hls."""
+    fps = settings["fps"]
+    filter_chain, total_frames = _build_graph(lengths, names, trans_frames, settings, engine)
+    filter_threads = settings.get("filter_threads") or os.cpu_count() or 1
+    # Poster: the middle of the first slide, before anything crossfades in
+    poster_frame = (lengths[0] - (trans_frames[0] if trans_frames else 0)) // 2
+    fan_out, output_args = _canvas_outputs(
+        "[v]", output, total_frames, settings, poster_frame=poster_frame, faststart=faststart, **extras
+    )
+
+    return [
         "ffmpeg",
         "-y",
-        *input_args,
-        "-filter_complex", filter_chain,
-        "-map", "[v]",
-        "-t", str(total_duration),
-        "-r", "30",
-        "-pix_fmt", "yuv420p",
-        "-c:v", "libx264",
-        output
+        "-filter_complex_threads", str(filter_threads),
+        *_input_args(image_paths, lengths, fps, engine),
+        "-filter_complex", f"{filter_chain};{fan_out}",
+        *output_args,
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(result.stderr)
+
+def package_hls(source, directory, profile=None):
+    """Encode the HLS ladder from an already rendered MP4 (segmented renders)."""
+    settings = get_encode_settings(profile)
+    total_frames = int(round(_probe_duration(source) * settings["fps"]))
+    fan_out, output_args = _canvas_outputs("[0:v]", None, total_frames, settings, hls=directory)
+    _run_ffmpeg(["ffmpeg", "-y", "-i", source, "-filter_complex", fan_out, *output_args], kind="hls")
+
+
+def _probe_duration(path):
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+
+def _prepare(image_paths, transitions, engine, profile, durations=None, transition_durations=None):
+    if not image_paths:
+        raise ValueError("You must provide at least one image.")
+
+    settings = get_encode_settings(profile)
+    engine = engine or settings["engine"]
+    if engine not in ("still", "loop"):
+        raise ValueError(f"Unknown render engine: {engine}")
+
+    if not transitions:
+        transitions = ["fade"]
+    names = [transitions[i % len(transitions)] for i in range(len(image_paths) - 1)]
+    holds, trans_frames = _timeline(len(image_paths), settings, durations, transition_durations)
+    return settings, engine, names, holds, trans_frames
+
+
+def build_video_command(image_paths, output='output.mp4', transitions=None, engine=None, profile=None,
+                        durations=None, transition_durations=None):
+    """Build the ffmpeg argv for a slideshow rendered in a single process.
+
+    output="pipe:1" writes fragmented MP4 to stdout so it can be consumed
+    while encoding is still running.
+    """
+    settings, engine, names, holds, trans_frames = _prepare(
+        image_paths, transitions, engine, profile, durations, transition_durations
+    )
+    lengths = _segment_lengths(holds, trans_frames, 0, len(image_paths) - 1)
+    return _build_command(image_paths, lengths, names, trans_frames, output, settings, engine)
+
+
+def _wait(proc, kind):
+    """Reap ffmpeg with wait4 so its CPU time and peak RSS are recorded."""
+    try:
+        _, status, rusage = os.wait4(proc.pid, 0)
+    except ChildProcessError:
+        # Already reaped elsewhere (e.g. gevent's child watcher); no usage to record
+        proc.wait()
+        return
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    observe_ffmpeg(kind, rusage)
+
+
+def _run_ffmpeg(cmd, on_progress=None, sink=None, chunk_size=1024 * 1024, kind="render"):
+    """Run ffmpeg, parsing its -progress stream as it arrives.
+
+    on_progress(frame) is called after every progress block with the number
+    of frames written so far. When `sink` is given, stdout is streamed into
+    sink.write in chunks. `kind` labels the process in the ffmpeg metrics.
+    """
+    cmd = [cmd[0], "-nostats", "-progress", "pipe:2", *cmd[1:]]
+    proc = subprocess.Popen(
+        cmd,
+        stdout=subprocess.PIPE if sink is not None else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    FFMPEG_RUNNING.labels(kind).inc()
+
+    # Progress and log lines share stderr; drain it on the side so a chatty
+    # ffmpeg can't block on a full pipe while we read stdout
+    log_lines = []
+
+    def read_stderr():
+        frame = 0
+        for raw in proc.stderr:
+            line = raw.decode(errors="replace").rstrip()
+            key, sep, value = line.partition("=")
+            if sep and key.replace("_", "").isalnum() and " " not in key:
+                if key == "frame" and value.isdigit():
+                    frame = int(value)
+                elif key == "progress" and on_progress:
+                    on_progress(frame)
+            elif line:
+                log_lines.append(line)
+
+    stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+    stderr_thread.start()
+
+    try:
+        if sink is not None:
+            for chunk in iter(lambda: proc.stdout.read(chunk_size), b""):
+                sink.write(chunk)
+    except BaseException:
+        proc.kill()
+        raise
+    finally:
+        if sink is not None:
+            proc.stdout.close()
+        # stderr closes as ffmpeg exits, so wait4 below hardly blocks
+        stderr_thread.join()
+        _wait(proc, kind)
+        FFMPEG_RUNNING.labels(kind).dec()
+
+    if proc.returncode != 0:
+        logger.error("FFmpeg %s failed with exit code %s:\n%s", kind, proc.returncode, "\n".join(log_lines))
         raise RuntimeError("FFmpeg failed")
+
+
+def concat_segments(segment_paths, output, faststart=FASTSTART):
+    """Join same-encoder segments with the concat demuxer, without re-encoding."""
+    list_path = output + ".concat.txt"
+    with open(list_path, "w") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    try:
+        _run_ffmpeg([
+            "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+            "-c", "copy", *_mp4_args(output, faststart), output
+        ], kind="concat")
+    finally:
+        os.remove(list_path)
+
+
+def _progress_tracker(holds, trans_frames, on_progress):
+    """Combine per-segment frame counts into one on_progress(done, total) call."""
+    total = sum(holds) + sum(trans_frames)
+    done = {}
+    lock = threading.Lock()
+
+    def report(segment, frame):
+        if on_progress is None:
+            return
+        with lock:
+            done[segment] = frame
+            frames = sum(done.values())
+        on_progress(min(frames, total), total)
+
+    return report
+
+
+def generate_cool_video(image_paths, output='output.mp4', transitions=None, engine=None, profile=None,
+                        segments=None, workers=None, durations=None, transition_durations=None,
+                        on_progress=None, renditions=None, poster=None, teaser=None, hls=None):
+    """Render the slideshow to `output`.
+
+    With renditions (names from RENDITIONS) the slideshow is decoded and
+    crossfaded once, then split into one encode per rendition, written to
+    rendition_path(output, name) instead of `output`; returns
+    {name: path}.
+
+    poster (.jpg/.webp), teaser (a short low-res .mp4/.webp) and hls (a
+    directory that receives master.m3u8 plus one CMAF rendition per
+    hls_ladder rung) are cut from the same frames in the same ffmpeg
+    process. MP4 files get +faststart unless FASTSTART is off.
+
+    With segments > 1 the timeline is cut at slide holds into independent
+    renders that run in parallel (`workers` at a time, cores split between
+    them) and are stream-copied together; the frame count and timing match
+    the single-process render. Slideshows longer than
+    MAX_SLIDES_PER_SEGMENT are always split so no ffmpeg process opens
+    more inputs than that.
+
+    on_progress(done_frames, total_frames) is called as ffmpeg reports
+    progress, summed across segments.
+    """
+    settings, engine, names, holds, trans_frames = _prepare(
+        image_paths, transitions, engine, profile, durations, transition_durations
+    )
+    validate_renditions(renditions)
+    min_segments = -(-(len(image_paths) - 1) // (MAX_SLIDES_PER_SEGMENT - 1))
+    plan = plan_segments(holds, trans_frames, max(segments or RENDER_SEGMENTS, min_segments))
+    report = _progress_tracker(holds, trans_frames, on_progress)
+
+    def outputs_for(base):
+        if not renditions:
+            return base
+        return {name: rendition_path(base, name) for name in renditions}
+
+    if hls:
+        os.makedirs(hls, exist_ok=True)
+
+    if len(plan) == 1:
+        lengths = _segment_lengths(holds, trans_frames, 0, len(image_paths) - 1)
+        _run_ffmpeg(_build_command(image_paths, lengths, names, trans_frames, outputs_for(output), settings, engine,
+                                   poster=poster, teaser=teaser, hls=hls),
+                    on_progress=lambda frame: report(0, frame))
+        return outputs_for(output) if renditions else None
+
+    cpus = os.cpu_count() or 1
+    workers = max(1, min(workers or RENDER_WORKERS or cpus, len(plan)))
+    cores = max(1, cpus // workers)
+    segment_settings = {**settings, "threads": cores, "filter_threads": cores}
+    segment_dir = output + ".segments"
+    os.makedirs(segment_dir, exist_ok=True)
+
+    def render_segment(index, first, last):
+        path = outputs_for(os.path.join(segment_dir, f"segment{index:03d}.mp4"))
+        lengths = _segment_lengths(holds, trans_frames, first, last)
+        # The poster and teaser come from the start of the timeline
+        extras = {"poster": poster, "teaser": teaser} if index == 0 else {}
+        _run_ffmpeg(_build_command(
+            image_paths[first:last + 1], lengths, names[first:last], trans_frames[first:last],
+            path, segment_settings, engine, faststart=False, **extras
+        ), on_progress=lambda frame: report(index, frame))
+        return path
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(render_segment, i, first, last) for i, (first, last) in enumerate(plan)]
+            segment_paths = [f.result() for f in futures]
+        if not renditions:
+            concat_segments(segment_paths, output)
+            main = output
+        else:
+            for name, path in outputs_for(output).items():
+                concat_segments([segment[name] for segment in segment_paths], path)
+            main = rendition_path(output, "9x16" if "9x16" in renditions else renditions[0])
+        if hls:
+            # HLS can't be stitched from per-segment ladders; encode it from the
+            # joined video, which still skips the image decode and xfade work
+            package_hls(main, hls, settings)
+        return outputs_for(output) if renditions else None
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+
+def stream_cool_video(image_paths, sink, transitions=None, engine=None, profile=None, chunk_size=1024 * 1024,
+                      durations=None, transition_durations=None, on_progress=None):
+    """Render to fragmented MP4 and hand each chunk to `sink.write` as it is produced.
+
+    Always a single ffmpeg process, so callers render slideshows longer than
+    MAX_SLIDES_PER_SEGMENT with generate_cool_video instead.
+    """
+    settings, engine, names, holds, trans_frames = _prepare(
+        image_paths, transitions, engine, profile, durations, transition_durations
+    )
+    lengths = _segment_lengths(holds, trans_frames, 0, len(image_paths) - 1)
+    cmd = _build_command(image_paths, lengths, names, trans_frames, "pipe:1", settings, engine)
+    report = _progress_tracker(holds, trans_frames, on_progress)
+    _run_ffmpeg(cmd, on_progress=lambda frame: report(0, frame), sink=sink, chunk_size=chunk_size)
@@ -0,0 +1,180 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import redis
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.client_config import get_completion_webhook
+from app.dedup import close_joined
+from app.metrics import WEBHOOK_DEAD_LETTERS, WEBHOOK_DELIVERIES, WEBHOOK_EVENTS
+from app.redis_client import redis_client
+from celery_worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+# Completion events are buffered in Redis and flushed by one task per window,
+# so a burst of finished jobs becomes one POST per webhook URL
+WEBHOOK_BATCH_WINDOW = float(os.getenv("WEBHOOK_BATCH_WINDOW", "2"))
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "16"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+# Failed batches are retried with exponential backoff (base * 2**attempt, plus
+# jitter), then moved to the dead-letter list
+WEBHOOK_MAX_RETRIES = int(os.getenv("WEBHOOK_MAX_RETRIES", "6"))
+WEBHOOK_RETRY_BASE = float(os.getenv("WEBHOOK_RETRY_BASE", "5"))
+WEBHOOK_DEAD_LETTER_MAX = int(os.getenv("WEBHOOK_DEAD_LETTER_MAX", "10000"))
+# With a secret set, every POST carries X-Webhook-Signature: sha256=<hmac of the body>
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+
+BUFFER_KEY = "webhooks:buffer"
+FLUSH_SCHEDULED_KEY = "webhooks:flush_scheduled"
+DEAD_LETTER_KEY = "webhooks:dead"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_webhook_session():
+    """Shared keep-alive session for every delivery in this process."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            adapter = HTTPAdapter(pool_connections=WEBHOOK_CONCURRENCY, pool_maxsize=WEBHOOK_CONCURRENCY)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+
+def completion_event(job, result, tenant=None):
+    return {
+        "event": "video.failed" if result.get("status") == "failed" else "video.completed",
+        "job_id": job["job_id"],
+        "tenant": tenant or job.get("tenant"),
+        "result": result,
+        "finished_at": time.time(),
+    }
+
+
+def emit_job_event(job, result):
+    """Queue a completion event for every tenant waiting on the job.
+
+    That is the job's own tenant plus each tenant whose identical submission
+    joined it through dedup; each gets the event at its own webhook, if it
+    has one. Never raises: a webhook problem must not fail the job it
+    reports on.
+    """
+    try:
+        tenants = dict.fromkeys([job.get("tenant"), *close_joined(job["job_id"])])
+        entries = []
+        for tenant in tenants:
+            url = get_completion_webhook(tenant)
+            if url:
+                entries.append((url, completion_event(job, result, tenant)))
+        if not entries:
+            return
+        WEBHOOK_EVENTS.inc(len(entries))
+        try:
+            redis_client.rpush(BUFFER_KEY, *(json.dumps({"url": url, "event": event}) for url, event in entries))
+            # The first event of a window schedules the flush for its end
+            if redis_client.set(FLUSH_SCHEDULED_KEY, "1", nx=True, px=int(WEBHOOK_BATCH_WINDOW * 1000)):
+                flush_webhooks_task.apply_async(countdown=WEBHOOK_BATCH_WINDOW)
+        except redis.RedisError:
+            logger.warning("Webhook buffer unavailable, sending events for %s on their own", job["job_id"],
+                           exc_info=True)
+            for url, event in entries:
+                deliver_webhook_batch_task.apply_async((url, [event]))
+    except Exception:
+        logger.exception("Could not queue completion webhook for job %s", job.get("job_id"))
+
+
+def _pop_buffer(count):
+    with redis_client.pipeline() as pipe:
+        pipe.lrange(BUFFER_KEY, 0, count - 1)
+        pipe.ltrim(BUFFER_KEY, count, -1)
+        entries, _ = pipe.execute()
+    return [json.loads(entry) for entry in entries]
+
+
+def post_batch(url, events, session=None):
+    """POST `events` to `url` as {"events": [...]}; raises on failure."""
+    session = session or get_webhook_session()
+    body = json.dumps({"events": events}).encode()
+    headers = {"Content-Type": "application/json"}
+    if WEBHOOK_SECRET:
+        signature = hmac.new(WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+        headers["X-Webhook-Signature"] = f"sha256={signature}"
+    resp = session.post(url, data=body, headers=headers, timeout=WEBHOOK_TIMEOUT)
+    resp.raise_for_status()
+
+
+def _deliver(url, events):
+    try:
+        post_batch(url, events)
+    except requests.RequestException as e:
+        WEBHOOK_DELIVERIES.labels("retry").inc()
+        logger.warning("Webhook %s failed (%s), retrying %d events", url, e, len(events))
+        deliver_webhook_batch_task.apply_async((url, events), countdown=_backoff(0))
+        return False
+    WEBHOOK_DELIVERIES.labels("delivered").inc()
+    return True
+
+
+def _backoff(attempt):
+    delay = WEBHOOK_RETRY_BASE * 2 ** attempt
+    return delay + random.uniform(0, delay / 2)
+
+
+def dead_letters(limit=100):
+    """The most recent undeliverable batches, newest first."""
+    return [json.loads(entry) for entry in redis_client.lrange(DEAD_LETTER_KEY, 0, limit - 1)]
+
+
+@celery_app.task
+def flush_webhooks_task():
+    """Send everything buffered so far, one POST per webhook URL, concurrently."""
+    # Events queued from here on schedule the next flush
+    redis_client.delete(FLUSH_SCHEDULED_KEY)
+    delivered = failed = 0
+    while True:
+        entries = _pop_buffer(WEBHOOK_BATCH_SIZE)
+        if not entries:
+            break
+        batches = defaultdict(list)
+        for entry in entries:
+            batches[entry["url"]].append(entry["event"])
+        with ThreadPoolExecutor(min(WEBHOOK_CONCURRENCY, len(batches))) as pool:
+            for ok in pool.map(_deliver, batches.keys(), batches.values()):
+                delivered += ok
+                failed += not ok
+    return {"delivered": delivered, "failed": failed}
+
+
+@celery_app.task(bind=True, max_retries=WEBHOOK_MAX_RETRIES)
+def deliver_webhook_batch_task(self, url, events):
+    """Retry one failed batch; after WEBHOOK_MAX_RETRIES it goes to the dead-letter list."""
+    try:
+        post_batch(url, events)
+    except requests.RequestException as e:
+        if self.request.retries >= self.max_retries:
+            WEBHOOK_DELIVERIES.labels("dead").inc()
+            WEBHOOK_DEAD_LETTERS.inc(len(events))
+            logger.error("Webhook %s gave up after %d retries: %s", url, self.request.retries, e)
+            redis_client.lpush(DEAD_LETTER_KEY, json.dumps({
+                "url": url, "events": events, "error": str(e), "failed_at": time.time(),
+            }))
+            redis_client.ltrim(DEAD_LETTER_KEY, 0, WEBHOOK_DEAD_LETTER_MAX - 1)
+            return {"delivered": False}
+        raise self.retry(countdown=_backoff(self.request.retries + 1))
+    WEBHOOK_DELIVERIES.labels("delivered").inc()
+    return {"delivered": True}
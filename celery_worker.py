@@ -1,4 +1,7 @@
+import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
+from kombu import Queue
 
 
 # Use environment variables or config file to avoid hardcoding sensitive info
@@ -13,5 +16,72 @@ celery_app = Celery(
 
 celery_app.conf.task_track_started = True
 
+# Network-bound stages (download, upload, prefetch) and CPU-bound rendering run
+# on separate queues so each can use the pool that suits it:
+#   celery -A celery_worker worker -Q io -P gevent -c 100
+#   celery -A celery_worker worker -Q render_interactive,render -P prefork -c <cores>
+# A worker started without -Q consumes all of them, which still works on one box.
+# Interactive previews get their own render lane; list it first so render
+# workers always drain it before touching bulk work.
+IO_QUEUE = os.getenv("IO_QUEUE", "io")
+RENDER_QUEUE = os.getenv("RENDER_QUEUE", "render")
+INTERACTIVE_QUEUE = os.getenv("INTERACTIVE_QUEUE", "render_interactive")
+
+celery_app.conf.task_queues = (
+    Queue(INTERACTIVE_QUEUE),
+    Queue(IO_QUEUE),
+    Queue(RENDER_QUEUE),
+)
+
+# Redis has no native priorities; kombu emulates them with one list per step.
+# "priority" ordering makes workers poll queues in the order listed above
+# instead of round-robin, so the interactive lane never waits behind bulk.
+PRIORITY_STEPS = [0, 3, 6, 9]
+QUEUE_SEP = ":"
+celery_app.conf.broker_transport_options = {
+    "priority_steps": PRIORITY_STEPS,
+    "sep": QUEUE_SEP,
+    "queue_order_strategy": "priority",
+    # Unacked renders are redelivered after this; keep it above the longest render
+    "visibility_timeout": int(os.getenv("BROKER_VISIBILITY_TIMEOUT", str(2 * 3600))),
+}
+
+# Renders run for minutes: reserve one task per process at a time and ack
+# only once it finishes, so idle workers pick up queued renders instead of a
+# busy one hoarding them, and a crashed worker's render is redelivered.
+celery_app.conf.worker_prefetch_multiplier = 1
+celery_app.conf.task_acks_late = True
+celery_app.conf.task_reject_on_worker_lost = True
+celery_app.conf.task_default_queue = RENDER_QUEUE
+celery_app.conf.task_routes = {
+    "app.tasks.download_stage_task": {"queue": IO_QUEUE},
+    "app.tasks.upload_stage_task": {"queue": IO_QUEUE},
+    "app.tasks.prefetch_images_task": {"queue": IO_QUEUE},
+    "app.tasks.render_stage_task": {"queue": RENDER_QUEUE},
+    "app.tasks.generate_video_task": {"queue": RENDER_QUEUE},
+    "app.webhooks.flush_webhooks_task": {"queue": IO_QUEUE},
+    "app.webhooks.deliver_webhook_batch_task": {"queue": IO_QUEUE},
+}
+
+# Metrics: with PROMETHEUS_MULTIPROC_DIR shared with the API on one host, the
+# API's /metrics already includes worker metrics. Workers on other hosts can
+# serve their own by setting WORKER_METRICS_PORT (needs the multiprocess dir
+# too, since prefork children record the metrics).
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "0"))
+
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs):
+    if WORKER_METRICS_PORT:
+        from app.metrics import start_metrics_server
+        start_metrics_server(WORKER_METRICS_PORT)
+
+
+@worker_process_shutdown.connect
+def mark_metrics_process_dead(pid=None, **kwargs):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(pid or os.getpid())
+
 # This import registers your tasks with Celery
-celery_app.autodiscover_tasks(["app"])
\ No newline at end of file
+celery_app.autodiscover_tasks(["app"])
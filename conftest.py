@@ -0,0 +1,7 @@
+"""Placeholder Supabase credentials, so app.main imports without a .env.
+Nothing in the tests talks to Supabase or Redis."""
+import os
+
+os.environ.setdefault("SUPABASE_URL", "http://supabase.test")
+os.environ.setdefault("SUPABASE_KEY", "test.anon-key")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE", "test.service-role")
@@ -0,0 +1,81 @@
+"""Password hashing runs before any Supabase user is created, and verified
+token claims are cached without outliving the token."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import api, auth
+from app.supabase_client import PasswordQueueFull
+
+
+@pytest.fixture
+def client(monkeypatch):
+    created = []
+
+    async def queue_full(password):
+        raise PasswordQueueFull("queue full")
+
+    for module in (api, auth):
+        monkeypatch.setattr(module, "get_user_record", lambda email: None)
+        monkeypatch.setattr(module, "create_supabase_user", lambda *args: created.append(args) or "uid")
+        monkeypatch.setattr(module, "hash_password", queue_full)
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.include_router(api.router)
+    app.dependency_overrides[auth.verify_admin_token] = lambda: {"role": "admin"}
+    test_client = TestClient(app)
+    test_client.created = created
+    return test_client
+
+
+@pytest.mark.parametrize("path", ["/register", "/api/signup"])
+def test_full_password_queue_creates_no_user(client, path):
+    user = {"email": "a@example.com", "password": "secret123", "full_name": "A", "company_name": "B"}
+    response = client.post(path, json=user)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert client.created == []
+
+
+@pytest.fixture
+def token_cache(monkeypatch):
+    from app.ttl_cache import TTLCache
+
+    cache = TTLCache(maxsize=16, ttl=auth.TOKEN_CACHE_TTL)
+    monkeypatch.setattr(auth, "_verified_tokens", cache)
+    return cache
+
+
+def test_verified_claims_are_cached(token_cache, monkeypatch):
+    token = auth.create_access_token({"sub": "a@example.com"})
+    assert auth.decode_token(token)["sub"] == "a@example.com"
+
+    def no_verify(*args, **kwargs):
+        raise AssertionError("signature checked again")
+
+    monkeypatch.setattr(auth.jwt, "decode", no_verify)
+    claims = auth.decode_token(token)
+    assert claims["sub"] == "a@example.com"
+    # Callers get a copy; editing it doesn't change the cached claims
+    claims["role"] = "admin"
+    assert "role" not in auth.decode_token(token)
+
+
+def test_cached_claims_never_outlive_the_token(token_cache, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(token_cache, "clock", lambda: now[0])
+    monkeypatch.setattr(auth.time, "time", lambda: now[0])
+    token = auth.jwt.encode({"sub": "a@example.com", "exp": 1010}, auth.SECRET_KEY, algorithm=auth.ALGORITHM)
+    monkeypatch.setattr(auth.jwt, "decode", lambda *args, **kwargs: {"sub": "a@example.com", "exp": 1010})
+    auth.decode_token(token)
+    assert token_cache.get(token) is not None
+
+    now[0] = 1011
+    assert token_cache.get(token) is None
+
+
+def test_invalid_tokens_are_rejected_and_not_cached(token_cache):
+    with pytest.raises(auth.HTTPException) as error:
+        auth.decode_token("not-a-token")
+    assert error.value.status_code == 401
+    assert len(token_cache) == 0
@@ -0,0 +1,66 @@
+"""Client configs are indexed by email and tenant and reloaded from Supabase."""
+import pytest
+
+from app import client_config, supabase_client
+
+ROWS = [
+    {"email": "a@example.com", "tenant": "acme", "completion_webhook": "https://acme.example/hook"},
+    {"email": "b@example.com", "n8n_webhook": "https://b.example/n8n"},
+]
+
+
+class Table:
+    def __init__(self, rows):
+        self.rows = rows
+        self.reads = 0
+
+    def select(self, columns):
+        return self
+
+    def execute(self):
+        self.reads += 1
+        if isinstance(self.rows, Exception):
+            raise self.rows
+        return type("Response", (), {"data": self.rows})()
+
+
+@pytest.fixture
+def table(monkeypatch):
+    table = Table(ROWS)
+    monkeypatch.setattr(supabase_client, "supabase", type("Client", (), {"table": lambda self, name: table})())
+    return table
+
+
+def test_lookups_by_email_and_tenant(table, monkeypatch):
+    registry = client_config.ClientRegistry([], refresh=60)
+    monkeypatch.setattr(client_config, "registry", registry)
+    assert client_config.get_tenant("a@example.com") == "acme"
+    assert client_config.get_tenant("b@example.com") == "b@example.com"
+    assert client_config.get_tenant("unknown@example.com") == "unknown@example.com"
+    assert client_config.get_completion_webhook("acme") == "https://acme.example/hook"
+    assert client_config.get_completion_webhook("b@example.com") is None
+    assert client_config.get_n8n_webhook_by_email("b@example.com") == "https://b.example/n8n"
+    assert table.reads == 1
+
+
+def test_reloads_after_refresh_and_keeps_entries_on_failure(table, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(client_config.time, "monotonic", lambda: now[0])
+    registry = client_config.ClientRegistry([{"email": "old@example.com"}], refresh=60)
+
+    assert registry.by_email("a@example.com")["tenant"] == "acme"
+    assert registry.by_email("old@example.com") is None
+    now[0] += 30
+    registry.by_email("a@example.com")
+    assert table.reads == 1
+
+    table.rows = RuntimeError("Supabase down")
+    now[0] += 60
+    assert registry.by_tenant("acme")["email"] == "a@example.com"
+    assert table.reads == 2
+
+
+def test_refresh_zero_uses_only_the_built_in_list(table):
+    registry = client_config.ClientRegistry([{"email": "c@example.com"}], refresh=0)
+    assert registry.by_tenant("c@example.com") == {"email": "c@example.com"}
+    assert table.reads == 0
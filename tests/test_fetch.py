@@ -0,0 +1,55 @@
+"""Downloads land whole or not at all."""
+import os
+
+import pytest
+import requests
+
+from app import generate
+
+
+class Response:
+    status_code = 200
+    headers = {"ETag": '"v1"'}
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class Session:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def get(self, url, **kwargs):
+        return Response(self.chunks)
+
+
+def test_complete_download_replaces_the_file(tmp_path):
+    filename = str(tmp_path / "image1.jpg")
+    meta = generate.fetch_to_file("https://example.com/a.jpg", filename, session=Session([b"ab", b"cd"]))
+    with open(filename, "rb") as f:
+        assert f.read() == b"abcd"
+    assert meta["etag"] == '"v1"' and len(meta["content_hash"]) == 64
+    assert os.listdir(tmp_path) == ["image1.jpg"]
+
+
+def test_interrupted_download_leaves_no_part_file(tmp_path):
+    filename = str(tmp_path / "image1.jpg")
+    session = Session([b"ab", requests.exceptions.ChunkedEncodingError("connection broken")])
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        generate.fetch_to_file("https://example.com/a.jpg", filename, session=session)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,81 @@
+"""Cache hits whose blob is evicted before it is linked fall back to a fetch;
+normalizing ffmpeg runs are bounded per process."""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import generate
+from app.image_cache import ImageCache, url_key
+
+URL = "https://example.com/a.jpg"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ImageCache(str(tmp_path / "cache"))
+    blob = tmp_path / "blob"
+    blob.write_bytes(b"normalized")
+    cache.put_blob("h1", str(blob))
+    cache.put_url(URL, "h1", etag='"v1"')
+    return cache
+
+
+def evict_before_link(cache, monkeypatch):
+    link = cache.link
+
+    def evicting_link(content_hash, dest):
+        os.remove(cache.blob_path(content_hash))
+        return link(content_hash, dest)
+    monkeypatch.setattr(cache, "link", evicting_link)
+
+
+def fake_fetch(calls, status=200):
+    def fetch(url, filename, session=None, headers=None):
+        calls.append(headers)
+        if headers and status == 304:
+            return {"status": 304, "etag": '"v1"', "last_modified": None}
+        with open(filename, "wb") as f:
+            f.write(b"source")
+        return {"status": 200, "etag": '"v2"', "last_modified": None, "content_hash": "h2"}
+    return fetch
+
+
+@pytest.mark.parametrize("fresh", [True, False])
+def test_evicted_blob_is_fetched_again(cache, tmp_path, monkeypatch, fresh):
+    if not fresh:
+        monkeypatch.setattr(cache, "ttl", 0)
+    evict_before_link(cache, monkeypatch)
+    calls = []
+    monkeypatch.setattr(generate, "fetch_to_file", fake_fetch(calls, status=304))
+
+    outcome, meta = generate._resolve_cached(cache, URL, str(tmp_path / "image1.jpg"), session=None)
+
+    assert outcome == "misses"
+    assert meta["content_hash"] == "h2"
+    # The last fetch is unconditional, so it returns the full body
+    assert not calls[-1]
+    assert not os.path.exists(os.path.join(cache.urls_dir, f"{url_key(URL)}.json"))
+
+
+def test_normalize_runs_are_bounded(tmp_path, monkeypatch):
+    running, peak, lock = [0], [0], threading.Lock()
+
+    def slow_ffmpeg(cmd, kind=None):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        open(cmd[-1], "wb").close()  # the .norm.jpg output
+
+    monkeypatch.setattr(generate, "_normalize_slots", threading.BoundedSemaphore(2))
+    monkeypatch.setattr(generate, "needs_normalize", lambda path, w, h: True)
+    monkeypatch.setattr(generate, "_run_ffmpeg", slow_ffmpeg)
+    paths = [str(tmp_path / f"image{i}.jpg") for i in range(8)]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda path: generate.normalize_images([path]), paths))
+    assert peak[0] == 2
@@ -0,0 +1,89 @@
+"""Supabase lookups are served from cache until a write through the app invalidates them."""
+import fakeredis
+import pytest
+import redis
+
+from app import supabase_client
+from app.lookup_cache import LookupCache
+
+
+class Loader:
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+
+def test_lookups_are_loaded_once_including_not_found():
+    cache = LookupCache("test", shared=False)
+    found, missing = Loader({"id": "u1"}), Loader(None)
+    for _ in range(3):
+        assert cache.get("a@example.com", found) == {"id": "u1"}
+        assert cache.get("b@example.com", missing) is None
+    assert (found.calls, missing.calls) == (1, 1)
+
+
+def test_invalidate_reloads():
+    cache = LookupCache("test", shared=False)
+    loader = Loader("v1")
+    cache.get("k", loader)
+    cache.invalidate("k")
+    loader.value = "v2"
+    assert cache.get("k", loader) == "v2"
+
+
+@pytest.fixture
+def shared_redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(LookupCache, "_redis", lambda self: client)
+    return client
+
+
+def test_redis_tier_is_shared_between_workers(shared_redis):
+    first, second = LookupCache("test", shared=True), LookupCache("test", shared=True)
+    loader = Loader({"id": "u1"})
+    first.get("k", loader)
+    assert second.get("k", loader) == {"id": "u1"}
+    assert loader.calls == 1
+
+    first.invalidate("k")
+    second.local.clear()
+    loader.value = {"id": "u2"}
+    assert second.get("k", loader) == {"id": "u2"}
+
+
+def test_redis_outage_falls_through_to_the_loader(monkeypatch):
+    class Down:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise redis.ConnectionError("down")
+            return fail
+
+    monkeypatch.setattr(LookupCache, "_redis", lambda self: Down())
+    cache = LookupCache("test", shared=True)
+    assert cache.get("k", Loader("v")) == "v"
+    cache.invalidate("k")
+
+
+def test_social_account_writes_invalidate_the_lookup(monkeypatch):
+    monkeypatch.setattr(supabase_client, "_social_accounts", LookupCache("social", shared=False))
+    rows = {"u1": [{"provider": "tiktok"}]}
+    monkeypatch.setattr(supabase_client, "_fetch_social_accounts", lambda user_id: list(rows[str(user_id)]))
+
+    class Table:
+        def upsert(self, records):
+            rows["u1"].extend({"provider": r["provider"]} for r in records)
+            return self
+
+        def execute(self):
+            pass
+
+    client = type("Client", (), {"table": lambda self, name: Table()})()
+    monkeypatch.setattr(supabase_client, "get_supabase_client", lambda token=None: client)
+
+    assert len(supabase_client.get_social_accounts("u1")) == 1
+    supabase_client.upsert_social_record("u1", "facebook", "page1")
+    assert [a["provider"] for a in supabase_client.get_social_accounts("u1")] == ["tiktok", "facebook"]
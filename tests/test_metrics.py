@@ -0,0 +1,65 @@
+"""Stage spans, ffmpeg resource usage and queue gauges reach /metrics."""
+import shutil
+
+import fakeredis
+import pytest
+from prometheus_client import REGISTRY
+
+from app import metrics, scheduling, tasks
+from app.progress import JobProgress
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_span_observes_the_stage_and_logs_it(caplog):
+    before = sample("video_stage_seconds_count", stage="test_span")
+    with caplog.at_level("INFO", logger="app.metrics"):
+        with metrics.span("test_span", images=3):
+            pass
+    assert sample("video_stage_seconds_count", stage="test_span") == before + 1
+    assert "span stage=test_span" in caplog.text and "images=3" in caplog.text
+
+
+def test_failed_stage_is_counted_and_recorded_on_the_job():
+    before = sample("video_stage_failures_total", stage="download")
+
+    def broken(job, progress):
+        with progress.stage("download"):
+            raise RuntimeError("404")
+
+    job = tasks._run_stage({"job_id": "job1"}, JobProgress(None, "job1"), broken)
+    assert (job["error"], job["failed_stage"]) == ("404", "download")
+    assert "download" in job["timings"]
+    assert sample("video_stage_failures_total", stage="download") == before + 1
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+def test_ffmpeg_cpu_and_memory_are_recorded():
+    from app.video_utils import _run_ffmpeg
+
+    before = sample("ffmpeg_cpu_seconds_count", kind="test")
+    _run_ffmpeg(["ffmpeg", "-f", "lavfi", "-i", "testsrc2=size=320x240:rate=10", "-frames:v", "10",
+                 "-f", "null", "-"], kind="test")
+    assert sample("ffmpeg_cpu_seconds_count", kind="test") == before + 1
+    assert sample("ffmpeg_max_rss_bytes_sum", kind="test") > 0
+    assert sample("ffmpeg_processes_running", kind="test") == 0
+
+
+def test_metrics_endpoint_reports_queue_depth(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(scheduling, "redis_client", client)
+    client.rpush(scheduling.LANES["bulk"]["queue"], "a", "b")
+    client.rpush(f"{scheduling.LANES['bulk']['queue']}:9", "c")
+    client.set("render:fair:interactive:parked", 2)
+
+    response = TestClient(main.app).get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert f'celery_queue_depth{{queue="{scheduling.LANES["bulk"]["queue"]}"}} 3.0' in body
+    assert 'renders_parked{lane="interactive"} 2.0' in body
+    assert "renders_in_flight 0.0" in body
@@ -0,0 +1,104 @@
+"""OAuth callbacks: state parsing, and how Graph/TikTok failures reach the client."""
+import json
+import socket
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import fb_oauth, tiktok_oauth
+
+
+def test_tiktok_state_round_trips():
+    # Built the way /tiktok/login builds it
+    state = f"{json.dumps({'id': 'user-1'})}:{uuid.uuid4()}"
+    assert tiktok_oauth._state_user(state) == {"id": "user-1"}
+
+
+def test_tiktok_state_without_user_is_rejected():
+    assert tiktok_oauth._state_user(f"{json.dumps({'name': 'x'})}:nonce") is None
+    assert tiktok_oauth._state_user("not-json") is None
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(fb_oauth.router)
+    app.include_router(tiktok_oauth.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def api_error():
+    """Local API stand-in that answers every request with a 400."""
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body = json.dumps({"error": {"message": "Invalid verification code"}}).encode()
+            self.send_response(400)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = _reply
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "http://%s:%d" % server.server_address
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def api_down():
+    """Base URL of a local port nothing listens on."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}"
+
+
+def fb_callback(client):
+    state = json.dumps({"user_id": "user-1", "nonce": "n"})
+    return client.get("/api/fb/callback", params={"code": "c", "state": state})
+
+
+def tiktok_callback(client):
+    state = f"{json.dumps({'id': 'user-1'})}:{uuid.uuid4()}"
+    return client.get("/tiktok/callback", params={"code": "c", "state": state}, follow_redirects=False)
+
+
+def test_graph_unreachable_is_a_502(client, monkeypatch, api_down):
+    monkeypatch.setattr(fb_oauth, "GRAPH_API_URL", api_down)
+    response = fb_callback(client)
+    assert response.status_code == 502
+    assert response.json() == {"error": "Facebook is unavailable, try again"}
+
+
+def test_graph_token_refusal_is_a_400(client, monkeypatch, api_error):
+    monkeypatch.setattr(fb_oauth, "GRAPH_API_URL", api_error)
+    response = fb_callback(client)
+    assert response.status_code == 400
+    assert response.json() == {"error": "Failed to get short-lived token"}
+
+
+def test_tiktok_unreachable_is_a_502(client, monkeypatch, api_down):
+    monkeypatch.setattr(tiktok_oauth, "TIKTOK_API_URL", api_down)
+    response = tiktok_callback(client)
+    assert response.status_code == 502
+    assert response.json() == {"detail": "TikTok is unavailable, try again"}
+
+
+def test_tiktok_token_refusal_is_a_400(client, monkeypatch, api_error):
+    monkeypatch.setattr(tiktok_oauth, "TIKTOK_API_URL", api_error)
+    response = tiktok_callback(client)
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Failed to get TikTok access token"}
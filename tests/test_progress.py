@@ -0,0 +1,98 @@
+"""Live job progress: throttled state writes, status lookups and the SSE stream."""
+import json
+
+from fastapi.testclient import TestClient
+
+from app import jobs
+from app.progress import JobProgress
+
+
+class FakeTask:
+    def __init__(self):
+        self.states = []
+
+    def update_state(self, task_id, state, meta):
+        self.states.append((task_id, state, meta))
+
+
+def test_progress_is_throttled_except_at_stage_boundaries():
+    task = FakeTask()
+    progress = JobProgress(task, "job1", interval=3600)
+    with progress.stage("render"):
+        for done in range(1, 11):
+            progress.update(done, 10)
+    with progress.stage("upload"):
+        pass
+
+    assert [(task_id, meta["stage"], meta["stage_progress"]) for task_id, _, meta in task.states] == [
+        ("job1", "render", 0.0), ("job1", "upload", 0.0),
+    ]
+    assert {state for _, state, _ in task.states} == {"PROGRESS"}
+    assert set(progress.timings) == {"render", "upload"}
+    assert task.states[1][2]["timings"].keys() == {"render"}
+
+
+def test_every_update_is_published_without_throttle():
+    task = FakeTask()
+    progress = JobProgress(task, "job1", interval=0)
+    with progress.stage("render"):
+        progress.update(5, 10)
+        progress.update(20, 10)
+    assert [meta["stage_progress"] for _, _, meta in task.states] == [0.0, 0.5, 1.0]
+
+
+def test_without_a_task_only_timings_are_kept():
+    progress = JobProgress(None, None, timings={"download": 1.5})
+    with progress.stage("render"):
+        progress.update(1, 2)
+    assert set(progress.timings) == {"download", "render"}
+
+
+def test_bulk_status_reads_every_job_at_once(monkeypatch):
+    stored = {
+        "celery-task-meta-a": {"status": "SUCCESS", "result": {"status": "completed"}},
+        "celery-task-meta-b": {"status": "PROGRESS", "result": {"stage": "render"}},
+    }
+
+    class Backend:
+        reads = 0
+
+        def get_key_for_task(self, task_id):
+            return f"celery-task-meta-{task_id}"
+
+        def mget(self, keys):
+            self.reads += 1
+            return [stored.get(key) for key in keys]
+
+        def decode_result(self, value):
+            return value
+
+    backend = Backend()
+    monkeypatch.setattr(type(jobs.celery_app), "backend", backend)
+    assert jobs.bulk_job_status(["a", "b", "c"]) == [
+        {"task_id": "a", "state": "SUCCESS", "result": {"status": "completed"}},
+        {"task_id": "b", "state": "PROGRESS", "progress": {"stage": "render"}},
+        {"task_id": "c", "state": "PENDING"},
+    ]
+    assert backend.reads == 1
+
+
+def test_event_stream_sends_changes_and_ends_with_the_job(monkeypatch):
+    from app import main
+
+    statuses = iter([
+        {"task_id": "job1", "state": "PENDING"},
+        {"task_id": "job1", "state": "PROGRESS", "progress": {"stage": "render"}},
+        {"task_id": "job1", "state": "PROGRESS", "progress": {"stage": "render"}},
+        {"task_id": "job1", "state": "SUCCESS", "result": {"status": "completed"}},
+    ])
+    monkeypatch.setattr(main, "job_status", lambda task_id: next(statuses))
+    monkeypatch.setattr(main, "SSE_POLL_INTERVAL", 0)
+
+    response = TestClient(main.app).get("/jobs/job1/events")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == ["event: status"] * 3 + ["event: end"]
+    assert [json.loads(lines[1][len("data: "):])["state"] for lines in events[:3]] == [
+        "PENDING", "PROGRESS", "SUCCESS",
+    ]
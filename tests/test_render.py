@@ -0,0 +1,79 @@
+"""Renders a few synthetic slides with the real ffmpeg, so a filter graph
+that ffmpeg rejects fails here instead of in production. Skipped without ffmpeg."""
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from app.video_utils import HLS_MASTER, generate_cool_video, get_encode_settings, hls_ladder
+
+pytestmark = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg not installed")
+
+PROFILE = "preview"
+
+
+def make_slides(folder, sizes):
+    paths = []
+    for i, (width, height) in enumerate(sizes):
+        path = str(folder / f"slide{i}.jpg")
+        subprocess.run([
+            "ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi",
+            "-i", f"testsrc2=size={width}x{height}:rate=1", "-frames:v", "1", path,
+        ], check=True)
+        paths.append(path)
+    return paths
+
+
+def frame_count(path):
+    # Decode the whole file; the last progress line carries the frame total
+    proc = subprocess.run(["ffmpeg", "-i", path, "-map", "0:v", "-f", "null", "-"],
+                          capture_output=True, text=True, check=True)
+    return int(re.findall(r"frame=\s*(\d+)", proc.stderr)[-1])
+
+
+def expected_frames(count):
+    settings = get_encode_settings(PROFILE)
+    return round((count * settings["duration"] - (count - 1) * settings["transition"]) * settings["fps"])
+
+
+@pytest.fixture
+def slides(tmp_path):
+    return make_slides(tmp_path, [(640, 480), (480, 640), (800, 800)])
+
+
+@pytest.mark.parametrize("engine", ["still", "loop"])
+def test_single_process_render(tmp_path, slides, engine):
+    output = str(tmp_path / "out.mp4")
+    generate_cool_video(slides, output, transitions=["fade", "slideleft"], engine=engine, profile=PROFILE)
+    assert frame_count(output) == expected_frames(len(slides))
+
+
+def test_segmented_render_matches_frame_count(tmp_path, slides):
+    output = str(tmp_path / "out.mp4")
+    generate_cool_video(slides, output, transitions=["fade", "fade"], profile=PROFILE, segments=2)
+    assert frame_count(output) == expected_frames(len(slides))
+
+
+def test_every_segment_boundary_keeps_the_frame_count(tmp_path):
+    slides = make_slides(tmp_path, [(640, 480), (480, 640), (800, 800), (640, 360)])
+    output = str(tmp_path / "out.mp4")
+    generate_cool_video(slides, output, transitions=["fade", "slideleft", "circlecrop"], profile=PROFILE,
+                        segments=3, workers=3)
+    assert frame_count(output) == expected_frames(len(slides))
+    assert not os.path.exists(output + ".segments")
+
+
+def test_hls_ladder_follows_profile(tmp_path, slides):
+    hls = str(tmp_path / "hls")
+    generate_cool_video(slides, str(tmp_path / "out.mp4"), profile=PROFILE, hls=hls)
+    with open(os.path.join(hls, HLS_MASTER)) as f:
+        master = f.read()
+    ladder = hls_ladder(get_encode_settings(PROFILE))
+    for rung in ladder:
+        assert f"RESOLUTION={rung['width']}x{rung['height']}" in master
+        assert f"{rung['name']}/index.m3u8" in master
+    # Lighter profiles get lighter ladders
+    assert ladder[0]["kbps"] < hls_ladder(get_encode_settings("draft"))[0]["kbps"] \
+        < hls_ladder(get_encode_settings("archival"))[0]["kbps"]
@@ -0,0 +1,141 @@
+"""Renders are handed out fairly across tenants, a tenant at its cap waits in
+the queue instead of holding a worker, and saturated lanes refuse new work."""
+import fakeredis
+import pytest
+
+from app import scheduling
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    client = fakeredis.FakeRedis()
+    monkeypatch.setattr(scheduling, "redis_client", client)
+    monkeypatch.setattr(scheduling, "TENANT_WEIGHTS", {})
+    monkeypatch.setattr(scheduling, "TENANT_RENDER_CAP", 100)
+    return client
+
+
+def queue(tenant, count, lane="bulk"):
+    for i in range(count):
+        scheduling.enqueue_render({"job_id": f"{tenant}-{i}", "tenant": tenant, "lane": lane})
+
+
+def drain(lane="bulk"):
+    """Pick and immediately finish jobs until the lane is empty."""
+    picked = []
+    while True:
+        job = scheduling.next_render_job(lane, "token")
+        if job is None:
+            return picked
+        picked.append(job["tenant"])
+        scheduling.release_render_slot(job["tenant"], job["job_id"], "token")
+
+
+def test_tenants_take_turns():
+    queue("flood", 4)
+    queue("small", 2)
+    assert drain() == ["flood", "small", "flood", "small", "flood", "flood"]
+
+
+def test_weights_set_each_tenants_share(monkeypatch):
+    monkeypatch.setattr(scheduling, "TENANT_WEIGHTS", {"big": 2, "slow": 0.5})
+    queue("big", 6)
+    queue("one", 3)
+    queue("slow", 2)
+    assert drain()[:7] == ["big", "big", "one", "big", "big", "one", "slow"]
+
+
+def test_capped_tenant_parks_the_token_until_a_render_finishes(monkeypatch):
+    monkeypatch.setattr(scheduling, "TENANT_RENDER_CAP", 1)
+    queue("t1", 2)
+    first = scheduling.next_render_job("bulk", "a")
+    assert first["job_id"] == "t1-0"
+    assert scheduling.next_render_job("bulk", "b") is None
+    assert scheduling.parked_renders("bulk") == 1
+
+    assert scheduling.release_render_slot("t1", "t1-0", "a") == ["bulk"]
+    assert scheduling.parked_renders("bulk") == 0
+    assert scheduling.next_render_job("bulk", "b")["job_id"] == "t1-1"
+
+
+def test_other_tenants_run_past_a_capped_one(monkeypatch):
+    monkeypatch.setattr(scheduling, "TENANT_RENDER_CAP", 1)
+    queue("t1", 2)
+    scheduling.next_render_job("bulk", "a")
+    queue("t2", 1)
+    assert scheduling.next_render_job("bulk", "b")["tenant"] == "t2"
+
+
+def test_default_tenant_may_use_every_slot(monkeypatch):
+    monkeypatch.setattr(scheduling, "TENANT_RENDER_CAP", 1)
+    monkeypatch.setattr(scheduling, "RENDER_SLOTS", 3)
+    queue(scheduling.DEFAULT_TENANT, 4)
+    picked = [scheduling.next_render_job("bulk", f"token{i}") for i in range(4)]
+    assert [job is not None for job in picked] == [True, True, True, False]
+
+
+def test_redelivered_token_resumes_its_job():
+    queue("t1", 2)
+    job = scheduling.next_render_job("bulk", "a")
+    assert scheduling.rendering("bulk", "a")
+    assert scheduling.next_render_job("bulk", "a") == job
+    scheduling.release_render_slot("t1", job["job_id"], "a")
+    assert not scheduling.rendering("bulk", "a")
+
+
+def test_a_job_is_queued_once():
+    queue("t1", 1)
+    queue("t1", 1)
+    assert drain() == ["t1"]
+
+
+def test_lanes_are_separate():
+    queue("t1", 1, lane="interactive")
+    assert scheduling.next_render_job("bulk", "a") is None
+    assert scheduling.parked_renders("bulk") == 0
+    assert scheduling.next_render_job("interactive", "a")["job_id"] == "t1-0"
+
+
+def test_eta_counts_queued_parked_and_running_renders(fake_redis, monkeypatch):
+    monkeypatch.setattr(scheduling, "RENDER_SLOTS", 2)
+    for seconds in (10, 30):
+        scheduling.record_render_time(seconds)
+    # Two tokens on the bulk queue, one on the interactive queue at priority step 3
+    fake_redis.rpush(scheduling.LANES["bulk"]["queue"], "t1", "t2")
+    fake_redis.rpush(f"{scheduling.LANES['interactive']['queue']}:3", "t3")
+    fake_redis.set("render:fair:bulk:parked", 1)
+    queue("t1", 1)
+    scheduling.next_render_job("bulk", "running")
+
+    # interactive: 1 queued + 1 running; bulk: 4 queued + 1 running; 20 s each over 2 slots
+    assert scheduling.estimate_wait("interactive") == 20
+    assert scheduling.estimate_wait("bulk") == 50
+    assert scheduling.estimate_wait("bulk", extra_jobs=2) == 70
+
+
+def test_admission_refuses_a_saturated_lane(monkeypatch):
+    monkeypatch.setattr(scheduling, "estimate_wait", lambda lane, extra_jobs=0: 100.0 + extra_jobs)
+    monkeypatch.setitem(scheduling.MAX_BACKLOG_SECONDS, "interactive", 120)
+    assert scheduling.check_admission("interactive") == (True, 100.0)
+    assert scheduling.check_admission("interactive", jobs=30) == (False, 129.0)
+
+
+def test_admission_fails_open_without_redis(monkeypatch):
+    def down(lane, extra_jobs=0):
+        raise scheduling.redis.ConnectionError("down")
+
+    monkeypatch.setattr(scheduling, "estimate_wait", down)
+    assert scheduling.check_admission("bulk") == (True, None)
+
+
+def test_saturated_lane_answers_429_with_retry_after(monkeypatch):
+    import asyncio
+    from app import main
+
+    monkeypatch.setattr(main, "check_admission", lambda lane, jobs: (False, 150.0))
+    monkeypatch.setitem(main.MAX_BACKLOG_SECONDS, "interactive", 120)
+    with pytest.raises(main.HTTPException) as error:
+        asyncio.run(main.admit("interactive"))
+    assert error.value.status_code == 429
+    assert error.value.headers == {"Retry-After": "30"}
+    assert error.value.detail["eta_seconds"] == 150.0
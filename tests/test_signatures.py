@@ -0,0 +1,93 @@
+"""A batch's jobs are sent after the image prefetch; none of them may
+receive the prefetch result as an extra argument."""
+import json
+
+import pytest
+from celery import group
+
+from app import tasks
+
+
+def first_task(signature):
+    return signature.tasks[0] if hasattr(signature, "tasks") else signature
+
+
+@pytest.mark.parametrize("mode", ["single", "staged"])
+def test_prefetch_sends_batch_without_its_result(monkeypatch, mode):
+    monkeypatch.setattr(tasks, "PIPELINE_MODE", mode)
+    monkeypatch.setattr(tasks, "get_image_cache", lambda: None)
+    members = group(tasks.video_job_signature(f"job{i}", ["https://example.com/a.jpg"], profile="preview")
+                    for i in range(2))
+    expected = [first_task(member).args for member in members.tasks]
+    sent = []
+    monkeypatch.setattr(group, "apply_async", lambda self, *a, **kw: sent.append(self))
+
+    # `then` arrives the way the broker delivers it
+    then = json.loads(json.dumps(members))
+    assert tasks.prefetch_images_task.run(["https://example.com/a.jpg"], then=then) == {"prefetched": 0}
+
+    (batch,) = sent
+    prepared = [task for task, _, _ in batch._prepared(batch.tasks, (), "gid", "rid", tasks.celery_app)]
+    assert [first_task(task).args for task in prepared] == expected
+
+
+def test_download_stage_is_the_entry_task(monkeypatch):
+    monkeypatch.setattr(tasks, "PIPELINE_MODE", "staged")
+    signature = tasks.video_job_signature("job1", ["https://example.com/a.jpg"], profile="preview")
+    assert signature.task == tasks.download_stage_task.name
+    assert signature.immutable
+    assert signature.args[0]["job_id"] == "job1"
+
+
+def test_single_mode_accepts_every_submission_option(monkeypatch):
+    import fakeredis
+    from app import main, scheduling
+
+    monkeypatch.setattr(scheduling, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(tasks, "PIPELINE_MODE", "single")
+    monkeypatch.setattr(main, "claim_inflight", lambda key, job_id: None)
+    monkeypatch.setattr(main, "save_preview", lambda job_id, spec: None)
+    monkeypatch.setattr(tasks, "_progress", lambda task, job: None)
+    monkeypatch.setattr(tasks, "_run_stage", lambda job, progress, stage: job)
+    monkeypatch.setattr(tasks, "_complete", lambda task, job: job)
+
+    request = main.VideoRequest(
+        image_urls=["https://example.com/a.jpg", "https://example.com/b.jpg"],
+        profile="preview", durations=[2, 2], transition_durations=[1], renditions=["9x16"],
+        extras=["poster"], render_budget=30,
+    )
+    job_id, signature = main.plan_submission(request, main.validate_submission(request), "t1",
+                                             input_hashes=["h1", "h2"])
+    job = signature.apply().get()
+
+    assert job["job_id"] == job_id
+    assert job["tenant"] == "t1"
+    assert job["input_hashes"] == ["h1", "h2"]
+    assert (job["renditions"], job["extras"], job["render_budget"]) == (["9x16"], ["poster"], 30)
+    assert not scheduling.rendering("interactive", job_id)
+
+
+def test_staged_job_goes_through_a_render_token(monkeypatch):
+    import fakeredis
+    from app import scheduling
+
+    monkeypatch.setattr(scheduling, "redis_client", fakeredis.FakeRedis())
+    monkeypatch.setattr(tasks, "PIPELINE_MODE", "staged")
+    monkeypatch.setattr(tasks, "_progress", lambda task, job: None)
+    monkeypatch.setattr(tasks, "_run_stage", lambda job, progress, stage: {**job, "rendered": stage is tasks._render})
+    sent = []
+    for task in (tasks.render_stage_task, tasks.upload_stage_task):
+        monkeypatch.setattr(task, "apply_async", lambda *a, _task=task, **kw: sent.append((_task, a, kw)))
+
+    job = tasks.new_job("job1", ["https://example.com/a.jpg"], tenant="t1", lane="interactive")
+    tasks.download_stage_task.apply((job,))
+    (token, args, options), = sent
+    assert token is tasks.render_stage_task and args == (("interactive",),)
+    assert options["queue"] == tasks.lane_options("interactive")["queue"]
+
+    sent.clear()
+    tasks.render_stage_task.apply(("interactive",), task_id="token1")
+    (upload, (upload_args,), options), = sent
+    assert upload is tasks.upload_stage_task
+    assert options["task_id"] == "job1" and upload_args[0]["rendered"]
+    assert not scheduling.rendering("interactive", "token1")
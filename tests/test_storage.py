@@ -0,0 +1,62 @@
+"""MultipartUpload ships writes as ordered parts and cleans up after a failure."""
+import threading
+
+import pytest
+
+from app.storage import MultipartUpload
+
+
+class FakeS3:
+    def __init__(self, fail_part=None):
+        self.fail_part = fail_part
+        self.parts = {}
+        self.completed = None
+        self.aborted = False
+        self._lock = threading.Lock()
+
+    def create_multipart_upload(self, **kwargs):
+        return {"UploadId": "upload-1"}
+
+    def upload_part(self, PartNumber, Body, **kwargs):
+        if PartNumber == self.fail_part:
+            raise OSError("connection reset")
+        with self._lock:
+            self.parts[PartNumber] = Body
+        return {"ETag": f"etag-{PartNumber}"}
+
+    def complete_multipart_upload(self, MultipartUpload, **kwargs):
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, **kwargs):
+        self.aborted = True
+
+
+def test_writes_become_ordered_parts():
+    s3 = FakeS3()
+    upload = MultipartUpload("videos/a.mp4", part_size=4, concurrency=2, client=s3, bucket="b")
+    for chunk in (b"abc", b"defgh", b"ij", b"klm"):
+        upload.write(chunk)
+    upload.complete()
+
+    assert s3.completed == [{"PartNumber": n, "ETag": f"etag-{n}"} for n in (1, 2, 3, 4)]
+    assert b"".join(s3.parts[n] for n in sorted(s3.parts)) == b"abcdefghijklm"
+    assert [len(s3.parts[n]) for n in (1, 2, 3)] == [4, 4, 4]
+    assert upload.bytes_written == 13
+
+
+def test_empty_upload_still_sends_one_part():
+    s3 = FakeS3()
+    upload = MultipartUpload("videos/a.mp4", part_size=4, client=s3, bucket="b")
+    upload.complete()
+    assert s3.completed == [{"PartNumber": 1, "ETag": "etag-1"}]
+
+
+def test_failed_part_fails_complete_and_abort_discards_the_upload():
+    s3 = FakeS3(fail_part=2)
+    upload = MultipartUpload("videos/a.mp4", part_size=4, concurrency=2, client=s3, bucket="b")
+    upload.write(b"x" * 10)
+    with pytest.raises(OSError):
+        upload.complete()
+    upload.abort()
+    assert s3.completed is None
+    assert s3.aborted
@@ -0,0 +1,49 @@
+"""Timing validation, segment planning and the streaming/segmented render choice."""
+import pytest
+
+from app import tasks
+from app.video_utils import (
+    MAX_SLIDES_PER_SEGMENT, _segment_lengths, get_encode_settings, plan_segments, validate_timing
+)
+
+
+def test_rejects_slides_shorter_than_a_frame():
+    fps = get_encode_settings("preview")["fps"]
+    with pytest.raises(ValueError, match="at least one frame"):
+        validate_timing(1, durations=[0.4 / fps], profile="preview")
+
+
+@pytest.mark.parametrize("count, streamed", [(MAX_SLIDES_PER_SEGMENT, True), (MAX_SLIDES_PER_SEGMENT + 1, False)])
+def test_long_slideshows_are_not_streamed(monkeypatch, count, streamed):
+    calls = []
+    monkeypatch.setattr(tasks, "stream_cool_video", lambda paths, sink, **kw: calls.append("stream"))
+    monkeypatch.setattr(tasks, "generate_cool_video", lambda paths, output, **kw: calls.append("file"))
+    monkeypatch.setattr(tasks, "upload_file", lambda path, key: None)
+    monkeypatch.setattr(tasks, "MultipartUpload", lambda key: type("Upload", (), {"complete": lambda self: None})())
+
+    paths = [f"image{i}.jpg" for i in range(count)]
+    tasks.render_and_upload(paths, "key", None, {"profile": "preview"}, "out.mp4", stream=True)
+    assert calls == ["stream" if streamed else "file"]
+
+
+@pytest.mark.parametrize("segments", [1, 2, 3, 5, 20])
+def test_segments_cover_the_timeline_exactly(segments):
+    holds = [40, 10, 25, 30, 5, 60]
+    transitions = [12, 8, 15, 20, 9]
+    plan = plan_segments(holds, transitions, segments)
+
+    assert len(plan) == min(segments, len(holds) - 1)
+    # Contiguous: adjacent segments share the slide at the cut
+    assert plan[0][0] == 0 and plan[-1][1] == len(holds) - 1
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(plan, plan[1:]))
+
+    # Each segment's xfade chain outputs its inputs minus its own overlaps;
+    # joined, they add up to the single-process frame count
+    frames = sum(sum(_segment_lengths(holds, transitions, first, last)) - sum(transitions[first:last])
+                 for first, last in plan)
+    assert frames == sum(holds) + sum(transitions)
+
+
+def test_single_slide_is_one_segment():
+    assert plan_segments([30], [], 4) == [(0, 0)]
+    assert _segment_lengths([30], [], 0, 0) == [30]
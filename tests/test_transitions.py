@@ -0,0 +1,26 @@
+"""Render budgets use the committed cost table, and say so when there is none."""
+import logging
+
+import transitions
+
+
+def test_committed_cost_table_covers_every_transition():
+    costs = transitions.load_transition_costs(transitions.TRANSITION_COSTS_PATH)
+    assert set(costs["transitions"]) == set(transitions.TRANSITIONS)
+    assert all(cost > 0 for cost in costs["transitions"].values())
+
+
+def test_budget_swaps_in_cheaper_transitions():
+    costs = transitions.load_transition_costs(transitions.TRANSITION_COSTS_PATH)
+    _, _, full = transitions.get_template_within_budget(seed="job", costs=costs)
+    _, template, cost = transitions.get_template_within_budget(seed="job", budget=full * 0.8, costs=costs)
+    assert cost < full
+    assert template.endswith("-budget")
+
+
+def test_budget_without_cost_table_is_logged(tmp_path, caplog):
+    costs = transitions.load_transition_costs(str(tmp_path / "missing.json"))
+    with caplog.at_level(logging.WARNING, logger="transitions"):
+        _, template, _ = transitions.get_template_within_budget(seed="job", budget=1, costs=costs)
+    assert not template.endswith("-budget")
+    assert "render_budget 1 ignored" in caplog.text
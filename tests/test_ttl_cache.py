@@ -0,0 +1,77 @@
+"""TTLCache: LRU bound, expiry, and closing what it drops."""
+import httpx
+
+from app import supabase_client
+from app.ttl_cache import TTLCache
+
+
+class Clock:
+    now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire_after_their_ttl():
+    clock = Clock()
+    cache = TTLCache(maxsize=4, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    clock.now = 20
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_is_dropped_first():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_get_or_create_builds_once():
+    cache = TTLCache()
+    built = []
+    assert cache.get_or_create("k", lambda: built.append(1) or "v") == ("v", True)
+    assert cache.get_or_create("k", lambda: built.append(1) or "v") == ("v", False)
+    assert built == [1]
+
+
+def test_every_dropped_value_is_evicted_but_not_popped_ones():
+    clock = Clock()
+    evicted = []
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.set("c", 3)             # LRU overflow drops a
+    cache.set("b", 4)             # replaced
+    clock.now = 20
+    cache.get("c")                # expired
+    cache.set("d", 5)
+    cache.pop("d")                # handed to the caller
+    cache.set("e", 6)
+    cache.clear()
+    assert evicted == ["a", "b", "c", "b", "e"]
+
+
+def test_evicted_token_clients_close_their_session(monkeypatch):
+    sessions = []
+
+    class Client:
+        def __init__(self):
+            self.postgrest = type("Postgrest", (), {})()
+            self.postgrest.session = httpx.Client()
+            sessions.append(self.postgrest.session)
+
+    cache = TTLCache(maxsize=1, on_evict=supabase_client._close_client)
+    monkeypatch.setattr(supabase_client, "_token_clients", cache)
+    monkeypatch.setattr(supabase_client, "_new_client", lambda token: Client())
+
+    first = supabase_client.get_supabase_client("token-1")
+    assert supabase_client.get_supabase_client("token-1") is first
+    supabase_client.get_supabase_client("token-2")
+    assert [session.is_closed for session in sessions] == [True, False]
@@ -0,0 +1,118 @@
+"""Completion webhooks: dedup joiners are notified, batches are signed, retried and dead-lettered."""
+import json
+
+import fakeredis
+import pytest
+
+from app import dedup, webhooks
+
+WEBHOOKS = {"owner": "https://owner.example/hook", "joiner": "https://joiner.example/hook"}
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    client = fakeredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(dedup, "redis_client", client)
+    monkeypatch.setattr(webhooks, "redis_client", client)
+    monkeypatch.setattr(webhooks, "get_completion_webhook", WEBHOOKS.get)
+    monkeypatch.setattr(webhooks.flush_webhooks_task, "apply_async", lambda **options: None)
+    return client
+
+
+def buffered(redis):
+    return [json.loads(entry) for entry in redis.lrange(webhooks.BUFFER_KEY, 0, -1)]
+
+
+def test_joined_tenants_are_notified(redis):
+    assert dedup.join_inflight("job1", "joiner")
+    assert dedup.join_inflight("job1", "owner")  # an owner retry is not notified twice
+    assert dedup.join_inflight("job1", "no-webhook")
+
+    webhooks.emit_job_event({"job_id": "job1", "tenant": "owner"}, {"status": "completed"})
+
+    assert [(entry["url"], entry["event"]["tenant"]) for entry in buffered(redis)] == [
+        (WEBHOOKS["owner"], "owner"), (WEBHOOKS["joiner"], "joiner"),
+    ]
+
+
+def test_late_joiners_are_refused(redis):
+    webhooks.emit_job_event({"job_id": "job1", "tenant": "owner"}, {"status": "completed"})
+    assert not dedup.join_inflight("job1", "joiner")
+    assert len(buffered(redis)) == 1
+
+
+@pytest.fixture
+def hook_server():
+    """Local webhook receiver; answers with `status` and records every POST."""
+    import hashlib
+    import hmac
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Receiver(ThreadingHTTPServer):
+        status = 200
+        posts = []
+
+        def url(self, path):
+            return "http://%s:%d/%s" % (*self.server_address, path)
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            self.server.posts.append((self.path, json.loads(body), self.headers.get("X-Webhook-Signature"),
+                                      "sha256=" + hmac.new(b"secret", body, hashlib.sha256).hexdigest()))
+            self.send_response(self.server.status)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = Receiver(("127.0.0.1", 0), Handler)
+    server.posts = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_flush_sends_one_signed_post_per_url(redis, hook_server, monkeypatch):
+    monkeypatch.setattr(webhooks, "WEBHOOK_SECRET", "secret")
+    for i, path in enumerate(["a", "b", "a"]):
+        redis.rpush(webhooks.BUFFER_KEY, json.dumps({"url": hook_server.url(path), "event": {"job_id": f"job{i}"}}))
+
+    assert webhooks.flush_webhooks_task.run() == {"delivered": 2, "failed": 0}
+
+    posts = sorted(hook_server.posts)
+    assert [(path, [e["job_id"] for e in body["events"]]) for path, body, _, _ in posts] == [
+        ("/a", ["job0", "job2"]), ("/b", ["job1"]),
+    ]
+    assert all(signature == expected for _, _, signature, expected in posts)
+    assert redis.llen(webhooks.BUFFER_KEY) == 0
+
+
+def test_failed_batch_is_retried_with_backoff(redis, hook_server, monkeypatch):
+    hook_server.status = 500
+    retries = []
+    monkeypatch.setattr(webhooks.deliver_webhook_batch_task, "apply_async",
+                        lambda args, countdown: retries.append((args, countdown)))
+    redis.rpush(webhooks.BUFFER_KEY, json.dumps({"url": hook_server.url("a"), "event": {"job_id": "job1"}}))
+
+    assert webhooks.flush_webhooks_task.run() == {"delivered": 0, "failed": 1}
+    ((url, events), countdown), = retries
+    assert (url, events) == (hook_server.url("a"), [{"job_id": "job1"}])
+    assert webhooks.WEBHOOK_RETRY_BASE <= countdown <= webhooks.WEBHOOK_RETRY_BASE * 1.5
+
+
+def test_batch_is_dead_lettered_after_its_last_retry(redis, hook_server, monkeypatch):
+    hook_server.status = 503
+    monkeypatch.setattr(webhooks, "_backoff", lambda attempt: 0)
+    task = webhooks.deliver_webhook_batch_task
+
+    result = task.apply((hook_server.url("a"), [{"job_id": "job1"}])).get()
+
+    assert result == {"delivered": False}
+    assert len(hook_server.posts) == task.max_retries + 1
+    (dead,) = webhooks.dead_letters()
+    assert dead["url"] == hook_server.url("a") and dead["events"] == [{"job_id": "job1"}]
+    assert "503" in dead["error"]
@@ -0,0 +1,128 @@
+"""Latency of the async Supabase-backed routes under concurrency.
+
+Serves the auth and api routers in-process against a local PostgREST stand-in
+that adds `--latency` per query, fires `--concurrency` clients at
+/api/social-accounts-by-email and /api/login, and meanwhile probes a no-op
+route. With `--inline` the blocking calls run on the event loop (the old
+behaviour), so the probe shows how long the loop stalls. bcrypt is CPU-bound:
+on few cores logins dominate, so `--login-every 0` isolates the Supabase path.
+Needs `httpx`.
+
+Usage: python tools/bench_async_api.py [--concurrency 50] [--requests 500] [--latency 0.05] [--inline] [--no-cache]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import bcrypt
+
+from bench_common import PostgrestServer, percentile
+
+PASSWORD = "bench-password!"
+
+
+def make_tables(users):
+    password_hash = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt()).decode()
+    tables = {"users_app": [], "social_accounts": []}
+    for i in range(users):
+        tables["users_app"].append({
+            "id": str(i), "email": f"user{i}@example.com", "password_hash": password_hash, "role": "client",
+        })
+        tables["social_accounts"].append({
+            "user_id": str(i), "provider": "facebook", "account_id": f"page{i}", "access_token": "token",
+        })
+    return tables
+
+
+def build_app(inline):
+    from fastapi import FastAPI
+
+    import app.api
+    import app.auth
+
+    if inline:
+        async def run_inline(fn, *args, **kwargs):
+            return fn(*args, **kwargs)
+
+        app.api.run_blocking = app.auth.run_blocking = run_inline
+
+    api = FastAPI()
+    api.include_router(app.auth.router)
+    api.include_router(app.api.router)
+
+    @api.get("/ping")
+    async def ping():
+        return {}
+
+    return api
+
+
+async def load(api, args):
+    import httpx
+
+    latencies = {"by-email": [], "login": [], "ping": []}
+    errors = 0
+    remaining = iter(range(args.requests))
+    done = asyncio.Event()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://bench") as client:
+        async def worker():
+            nonlocal errors
+            for i in remaining:
+                user = i % args.users
+                start = time.perf_counter()
+                if args.login_every and i % args.login_every == 0:
+                    kind = "login"
+                    resp = await client.post("/api/login", json={"email": f"user{user}@example.com", "password": PASSWORD})
+                else:
+                    kind = "by-email"
+                    resp = await client.get("/api/social-accounts-by-email", params={"email": f"user{user}@example.com"})
+                latencies[kind].append(time.perf_counter() - start)
+                errors += resp.status_code != 200
+
+        async def probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/ping")
+                latencies["ping"].append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        prober = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        wall = time.perf_counter() - start
+        done.set()
+        await prober
+    return latencies, errors, wall
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--login-every", type=int, default=5, help="every Nth request is a bcrypt login (0 = none)")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every PostgREST query")
+    parser.add_argument("--inline", action="store_true", help="run Supabase calls on the event loop")
+    parser.add_argument("--no-cache", action="store_true", help="bypass the lookup cache")
+    args = parser.parse_args()
+    if args.no_cache:
+        os.environ["LOOKUP_CACHE_TTL"] = "0"
+
+    with PostgrestServer(make_tables(args.users), latency=args.latency) as server:
+        server.configure_env()
+        api = build_app(args.inline)
+        latencies, errors, wall = asyncio.run(load(api, args))
+
+    mode = "inline" if args.inline else "executor"
+    print(f"mode={mode} concurrency={args.concurrency} requests={args.requests} latency={args.latency}s")
+    print(f"throughput: {args.requests / wall:.1f} req/s  errors={errors}  queries={server.requests}")
+    for kind, samples in latencies.items():
+        if samples:
+            print(f"{kind:<9} p50={percentile(samples, 50) * 1000:8.1f}ms  "
+                  f"p99={percentile(samples, 99) * 1000:8.1f}ms  n={len(samples)}")
+
+
+if __name__ == "__main__":
+    main()
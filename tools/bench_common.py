@@ -0,0 +1,407 @@
+"""Shared helpers for the benchmark scripts in tools/ (local stand-ins only)."""
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Ensure the app directory is in the Python path
+script_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(script_dir, ".."))
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+
+class ImageServer:
+    """Local HTTP stand-in for a slow CDN.
+
+    Serves `payloads[name]` at `/<name>` after sleeping `latency` seconds,
+    trickling the body out at roughly `bandwidth` bytes/sec when set. Query
+    strings are ignored, so callers can vary them to make URLs unique.
+    """
+
+    def __init__(self, payloads, latency=0.2, bandwidth=None):
+        self.payloads = payloads
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                server.requests += 1
+                body = server.payloads.get(urlsplit(self.path).path.lstrip("/"))
+                time.sleep(server.latency)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                step = 64 * 1024
+                for i in range(0, len(body), step):
+                    self.wfile.write(body[i:i + step])
+                    if server.bandwidth:
+                        time.sleep(step / server.bandwidth)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def url(self, name):
+        return f"{self.base_url}/{name}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def make_synthetic_images(folder, sizes, ext="jpg", source="testsrc2"):
+    """Render one still per (width, height) with ffmpeg's lavfi sources."""
+    import subprocess
+
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i, (width, height) in enumerate(sizes):
+        path = os.path.join(folder, f"synthetic{i + 1}_{width}x{height}.{ext}")
+        cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "lavfi", "-i", f"{source}=size={width}x{height}:rate=1",
+            "-frames:v", "1", path,
+        ]
+        subprocess.run(cmd, check=True)
+        paths.append(path)
+    return paths
+
+
+def child_cpu_seconds():
+    """User+system CPU consumed so far by reaped child processes."""
+    import resource
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def process_cpu_seconds():
+    """User+system CPU of this process and its reaped children."""
+    import resource
+
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    return own.ru_utime + own.ru_stime + child_cpu_seconds()
+
+
+class PeakRSS:
+    """Context manager sampling RSS of this process plus all its children.
+
+    `peak_bytes` holds the highest combined RSS seen while the block ran,
+    so ffmpeg's memory counts too. Requires `pip install psutil`.
+    """
+
+    def __init__(self, interval=0.05):
+        import psutil
+
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _rss(self):
+        import psutil
+
+        total = self.process.memory_info().rss
+        for child in self.process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _sample(self):
+        while True:
+            self.peak_bytes = max(self.peak_bytes, self._rss())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+
+def start_s3_stand_in(bucket="bench-videos"):
+    """Start moto's S3 server locally and point the R2 env vars at it.
+
+    Must run before `app.storage` is imported. Returns the server; call
+    .stop() when done. Requires `pip install "moto[server]"`.
+    """
+    import boto3
+    from moto.server import ThreadedMotoServer
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    endpoint = f"http://{host}:{port}"
+    os.environ.update({
+        "R2_BUCKET": bucket,
+        "R2_ACCESS_KEY": "testing",
+        "R2_SECRET_KEY": "testing",
+        "R2_ENDPOINT": endpoint,
+        "R2_PUBLIC_URL": f"{endpoint}/{bucket}",
+    })
+    boto3.client(
+        "s3", endpoint_url=endpoint, region_name="us-east-1",
+        aws_access_key_id="testing", aws_secret_access_key="testing",
+    ).create_bucket(Bucket=bucket)
+    return server
+
+
+class JSONServer:
+    """Local stand-in for a JSON API (Graph, TikTok).
+
+    `routes(method, path, params)` returns (status, payload) for each request;
+    every request sleeps `latency` seconds first.
+    """
+
+    def __init__(self, routes, latency=0.1):
+        import json
+        from urllib.parse import parse_qsl
+
+        self.routes = routes
+        self.latency = latency
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _handle(self, method):
+                server.requests += 1
+                parts = urlsplit(self.path)
+                params = dict(parse_qsl(parts.query))
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    params.update(parse_qsl(self.rfile.read(length).decode()))
+                time.sleep(server.latency)
+                status, payload = server.routes(method, parts.path, params)
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class PostgrestServer:
+    """Local stand-in for Supabase's PostgREST (`/rest/v1/<table>`).
+
+    `tables` maps a table name to a list of row dicts. GET filters rows on
+    `col=eq.value` query parameters and projects `select`; POST inserts (or,
+    with `Prefer: resolution=merge-duplicates`, upserts on `on_conflict`) and
+    echoes the rows. Every request sleeps `latency` seconds first; `connections`
+    counts accepted connections. With `tls=True` it serves HTTPS on a throwaway
+    self-signed certificate (needs `openssl`). Point the Supabase env vars at it
+    with `configure_env()` before `app.supabase_client` is imported.
+    """
+
+    def __init__(self, tables, latency=0.05, tls=False):
+        import json
+        from urllib.parse import parse_qsl
+
+        self.tables = tables
+        self.latency = latency
+        self.requests = 0
+        self.connections = 0
+        self._certdir = None
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; don't let Nagle hold the body
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                with server._lock:
+                    server.connections += 1
+                super().setup()
+
+            def _body(self):
+                # postgrest-py sends a JSON body even on GET, in a second write that
+                # Nagle holds until our delayed ACK; ACK now, then drain it for keep-alive
+                if hasattr(socket, "TCP_QUICKACK"):
+                    self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                return json.loads(raw) if raw else None
+
+            def _table(self):
+                parts = urlsplit(self.path)
+                name = parts.path.rsplit("/", 1)[-1]
+                return server.tables.setdefault(name, []), dict(parse_qsl(parts.query))
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                self._body()
+                time.sleep(server.latency)
+                rows, params = self._table()
+                columns = params.pop("select", "*")
+                filters = {k: v[3:] for k, v in params.items() if v.startswith("eq.")}
+                matched = [r for r in rows if all(str(r.get(k)) == v for k, v in filters.items())]
+                if columns != "*":
+                    names = [c.strip() for c in columns.split(",")]
+                    matched = [{c: r.get(c) for c in names} for r in matched]
+                self._reply(200, matched)
+
+            def do_POST(self):
+                with server._lock:
+                    server.requests += 1
+                time.sleep(server.latency)
+                rows, params = self._table()
+                payload = self._body() or []
+                payload = payload if isinstance(payload, list) else [payload]
+                keys = [k for k in params.get("on_conflict", "").split(",") if k]
+                merge = "merge-duplicates" in self.headers.get("Prefer", "")
+                with server._lock:
+                    for row in payload:
+                        existing = next((r for r in rows if keys and all(r.get(k) == row.get(k) for k in keys)), None)
+                        if merge and existing is not None:
+                            existing.update(row)
+                        else:
+                            rows.append(dict(row))
+                self._reply(201, payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        if tls:
+            self._wrap_tls()
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def _wrap_tls(self):
+        # Self-signed certificate for 127.0.0.1, trusted via SSL_CERT_FILE
+        import ssl
+        import subprocess
+        import tempfile
+
+        self._certdir = tempfile.mkdtemp(prefix="postgrest_tls_")
+        cert, key = os.path.join(self._certdir, "cert.pem"), os.path.join(self._certdir, "key.pem")
+        subprocess.run([
+            "openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+            "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=IP:127.0.0.1",
+            "-keyout", key, "-out", cert,
+        ], check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        self.httpd.socket = context.wrap_socket(self.httpd.socket, server_side=True)
+        # Clients should still load a full CA bundle, as they do in production
+        self.cert_file = os.path.join(self._certdir, "bundle.pem")
+        with open(self.cert_file, "w") as bundle:
+            try:
+                import certifi
+
+                with open(certifi.where()) as cas:
+                    bundle.write(cas.read())
+            except ImportError:
+                pass
+            with open(cert) as own:
+                bundle.write(own.read())
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        scheme = "https" if self._certdir else "http"
+        return f"{scheme}://{host}:{port}"
+
+    def configure_env(self):
+        if self._certdir:
+            os.environ["SSL_CERT_FILE"] = self.cert_file
+        os.environ.update({
+            "SUPABASE_URL": self.base_url,
+            "SUPABASE_KEY": "bench.anon-key",
+            "SUPABASE_SERVICE_ROLE": "bench.service-role",
+        })
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._certdir:
+            import shutil
+
+            shutil.rmtree(self._certdir, ignore_errors=True)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
@@ -0,0 +1,55 @@
+"""Compare the serial fetch loop with the concurrent, streaming fetch stage.
+
+Usage: python tools/bench_download.py [--images 10] [--size-kb 800] [--latency 0.3]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+import requests
+
+from bench_common import ImageServer, timed
+from app.generate import fetch_images
+
+
+def serial_fetch(urls, folder):
+    # The original download loop: one bare requests.get per URL, whole body in memory
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i, url in enumerate(urls):
+        filename = os.path.join(folder, f'image{i+1}.jpg')
+        resp = requests.get(url)
+        resp.raise_for_status()
+        with open(filename, 'wb') as f:
+            f.write(resp.content)
+        paths.append(filename)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--size-kb", type=int, default=800)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--bandwidth-kb", type=int, default=4096, help="per-connection KB/s (0 = unlimited)")
+    args = parser.parse_args()
+
+    payloads = {f"img{i}.jpg": os.urandom(args.size_kb * 1024) for i in range(args.images)}
+    bandwidth = args.bandwidth_kb * 1024 or None
+    workdir = tempfile.mkdtemp(prefix="bench_download_")
+    try:
+        with ImageServer(payloads, latency=args.latency, bandwidth=bandwidth) as server:
+            urls = [server.url(name) for name in payloads]
+            serial_s, _ = timed(serial_fetch, urls, os.path.join(workdir, "serial"))
+            concurrent_s, _ = timed(fetch_images, urls, os.path.join(workdir, "concurrent"))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"images={args.images} size={args.size_kb}KB latency={args.latency}s")
+    print(f"serial:     {serial_s:.3f}s")
+    print(f"concurrent: {concurrent_s:.3f}s  ({serial_s / concurrent_s:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Compare the old per-image ffmpeg resize with the batched normalize stage.
+
+Usage: python tools/bench_normalize.py [--images 10]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from bench_common import child_cpu_seconds, make_synthetic_images
+from app.generate import needs_normalize, normalize_images
+
+
+def per_image_resize(paths):
+    # The original download path: one ffmpeg process per image
+    for filename in paths:
+        resize_cmd = [
+            "ffmpeg", "-y", "-loglevel", "error",
+            "-i", filename,
+            "-vf", "scale='min(720,iw)':'min(1280,ih)':force_original_aspect_ratio=decrease",
+            filename + ".resized.jpg",
+        ]
+        subprocess.run(resize_cmd, check=True)
+        os.replace(filename + ".resized.jpg", filename)
+    return len(paths)
+
+
+def batched_normalize(paths):
+    processes = 1 if any(needs_normalize(p) for p in paths) else 0
+    normalize_images(paths)
+    return processes
+
+
+def measure(label, fn, paths):
+    cpu_before = child_cpu_seconds()
+    start = time.perf_counter()
+    processes = fn(paths)
+    wall = time.perf_counter() - start
+    cpu = child_cpu_seconds() - cpu_before
+    print(f"{label:<22} processes={processes:<3} wall={wall:.3f}s child_cpu={cpu:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=10)
+    args = parser.parse_args()
+
+    # Typical listing mix: phone photos that fit the canvas plus some large camera shots
+    sizes = [(1080, 1440), (4032, 3024), (800, 600), (3000, 4000), (1080, 1920)]
+    sizes = [sizes[i % len(sizes)] for i in range(args.images)]
+
+    workdir = tempfile.mkdtemp(prefix="bench_normalize_")
+    try:
+        source = make_synthetic_images(os.path.join(workdir, "src"), sizes)
+        for label, fn in (("per-image resize", per_image_resize), ("batched normalize", batched_normalize)):
+            folder = os.path.join(workdir, label.replace(" ", "_"))
+            shutil.copytree(os.path.join(workdir, "src"), folder)
+            paths = [os.path.join(folder, os.path.basename(p)) for p in source]
+            measure(label, fn, paths)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Compare the old blocking OAuth callbacks with the async, pooled ones.
+
+Runs the Facebook and TikTok callbacks against local mock Graph/TikTok servers
+and a PostgREST stand-in, each adding `--latency` per request. The sequential
+baseline replays the old flow with `requests`: every hop in turn, one IG lookup
+per page and one upsert per record.
+
+Usage: python tools/bench_oauth.py [--pages 5] [--latency 0.1] [--runs 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+import urllib.parse
+
+import requests
+
+from bench_common import JSONServer, PostgrestServer
+
+
+def graph_routes(pages):
+    def routes(method, path, params):
+        if path == "/oauth/access_token":
+            return 200, {"access_token": "long" if params.get("grant_type") == "fb_exchange_token" else "short"}
+        if path == "/me/accounts":
+            return 200, {"data": [{"id": f"page{i}", "access_token": f"pt{i}", "name": f"Page {i}"}
+                                  for i in range(pages)]}
+        if path.startswith("/page"):
+            return 200, {"id": path[1:], "instagram_business_account": {"id": f"ig{path[5:]}"}}
+        return 404, {"error": {"message": "unknown path"}}
+    return routes
+
+
+def tiktok_routes(method, path, params):
+    if method == "POST" and path == "/oauth/token/":
+        return 200, {"data": {"access_token": "tt", "refresh_token": "rt", "open_id": "open1"}}
+    return 404, {}
+
+
+def sequential_fb(graph_url, user_id):
+    # The original callback's hops, in order, applied to every page
+    from app.supabase_client import upsert_social_record
+
+    short = requests.get(f"{graph_url}/oauth/access_token", params={"code": "c"}).json()["access_token"]
+    long = requests.get(f"{graph_url}/oauth/access_token",
+                        params={"grant_type": "fb_exchange_token", "fb_exchange_token": short}).json()["access_token"]
+    pages = requests.get(f"{graph_url}/me/accounts", params={"access_token": long}).json()["data"]
+    for page in pages:
+        ig = requests.get(f"{graph_url}/{page['id']}",
+                          params={"fields": "instagram_business_account", "access_token": page["access_token"]})
+        ig_id = ig.json().get("instagram_business_account", {}).get("id")
+        upsert_social_record(user_id=user_id, provider="facebook", account_id=page["id"],
+                             access_token=page["access_token"], metadata={"page": page})
+        if ig_id:
+            upsert_social_record(user_id=user_id, provider="instagram", account_id=ig_id,
+                                 access_token=page["access_token"], metadata={"linked_fb_page_id": page["id"]})
+
+
+def sequential_tiktok(tiktok_url, user_id):
+    from app.supabase_client import upsert_social_record
+
+    data = requests.post(f"{tiktok_url}/oauth/token/", data={"code": "c"}).json()["data"]
+    upsert_social_record(user_id=user_id, provider="tiktok", account_id=data["open_id"],
+                         access_token=data["access_token"], refresh_token=data.get("refresh_token"), metadata=data)
+
+
+class FakeRequest:
+    session = {}
+
+
+async def async_runs(runs, pages):
+    from app.fb_oauth import fb_callback
+    from app.http_client import close_http_client
+    from app.tiktok_oauth import tiktok_callback
+
+    fb, tiktok = [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        resp = await fb_callback(code="c", state=urllib.parse.quote(json.dumps({"user_id": "u1"})))
+        fb.append(time.perf_counter() - start)
+        assert len(json.loads(resp.body)["pages"]) == pages
+        start = time.perf_counter()
+        resp = await tiktok_callback(FakeRequest(), code="c", state=json.dumps({"id": "u1"}) + ":nonce")
+        tiktok.append(time.perf_counter() - start)
+        assert b"open1" in resp.body
+    await close_http_client()
+    return fb, tiktok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=5, help="Facebook pages on the account")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds added to every API request")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with JSONServer(graph_routes(args.pages), latency=args.latency) as graph, \
+            JSONServer(tiktok_routes, latency=args.latency) as tiktok, \
+            PostgrestServer({"social_accounts": []}, latency=args.latency) as postgrest:
+        postgrest.configure_env()
+        os.environ.update({"GRAPH_API_URL": graph.base_url, "TIKTOK_API_URL": tiktok.base_url})
+
+        seq_fb, seq_tiktok = [], []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            sequential_fb(graph.base_url, "u1")
+            seq_fb.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            sequential_tiktok(tiktok.base_url, "u1")
+            seq_tiktok.append(time.perf_counter() - start)
+
+        async_fb, async_tiktok = asyncio.run(async_runs(args.runs, args.pages))
+
+    print(f"pages={args.pages} latency={args.latency}s runs={args.runs} (median per callback)")
+    for name, old, new in (("facebook", seq_fb, async_fb), ("tiktok", seq_tiktok, async_tiktok)):
+        old, new = statistics.median(old), statistics.median(new)
+        print(f"{name:<9} sequential {old * 1000:7.1f}ms  async {new * 1000:7.1f}ms  ({old / new:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""Jobs per minute: monolithic job slots vs. pipelined io/render pools.
+
+Models the two Celery layouts in-process with local stand-ins (a slow HTTP
+image server and moto's S3): "monolithic" gives each of <cores> slots whole
+jobs; "pipelined" runs download/upload on a wide io pool and rendering on
+<cores> render slots, the way the io (gevent) and render (prefork) queues do.
+Usage: python tools/bench_pipeline.py [--jobs 12] [--latency 0.5]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_common import ImageServer, make_synthetic_images, start_s3_stand_in
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.5, help="per-image server latency (s)")
+    parser.add_argument("--io-workers", type=int, default=32)
+    parser.add_argument("--render-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--profile", default="draft")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_pipeline_")
+    # Every job downloads for real; no shared cache between runs
+    os.environ["IMAGE_CACHE_DIR"] = ""
+    os.environ["JOB_DIR"] = os.path.join(workdir, "jobs")
+    s3_server = start_s3_stand_in()
+    from app.progress import JobProgress
+    from app import tasks
+
+    # Keep benchmark renders out of the shared render-time history (admission ETA)
+    tasks.record_render_time = lambda seconds: None
+
+    def run_stage(job, stage):
+        job = tasks._run_stage(job, JobProgress(None, None, timings=job["timings"]), stage)
+        if stage is tasks._download and not job.get("error"):
+            # Output keys are content fingerprints; a fresh key per job keeps
+            # the second layout from reusing the first one's uploads
+            job["key"] = f"bench/{job['job_id']}.mp4"
+            job["reused"] = False
+        return job
+
+    try:
+        sources = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440)] * 10)
+        payloads = {}
+        for i, path in enumerate(sources):
+            with open(path, "rb") as f:
+                payloads[f"img{i}.jpg"] = f.read()
+
+        with ImageServer(payloads, latency=args.latency) as server:
+            def make_jobs():
+                # Unique URLs per job (the image server ignores the query)
+                return [
+                    tasks.new_job(str(uuid.uuid4()), [f"{server.url(name)}?job={j}" for name in payloads],
+                                  profile=args.profile)
+                    for j in range(args.jobs)
+                ]
+
+            def monolithic(jobs):
+                def whole(job):
+                    for stage in (tasks._download, tasks._render, tasks._upload):
+                        job = run_stage(job, stage)
+                    return tasks._finish(job)
+                with ThreadPoolExecutor(max_workers=args.render_workers) as slots:
+                    return list(slots.map(whole, jobs))
+
+            def pipelined(jobs):
+                results, done = [], threading.Semaphore(0)
+                io_pool = ThreadPoolExecutor(max_workers=args.io_workers)
+                render_pool = ThreadPoolExecutor(max_workers=args.render_workers)
+
+                def after_upload(future):
+                    results.append(tasks._finish(future.result()))
+                    done.release()
+
+                def after_render(future):
+                    io_pool.submit(run_stage, future.result(), tasks._upload).add_done_callback(after_upload)
+
+                def after_download(future):
+                    render_pool.submit(run_stage, future.result(), tasks._render).add_done_callback(after_render)
+
+                for job in jobs:
+                    io_pool.submit(run_stage, job, tasks._download).add_done_callback(after_download)
+                for _ in jobs:
+                    done.acquire()
+                io_pool.shutdown()
+                render_pool.shutdown()
+                return results
+
+            print(f"jobs={args.jobs} io_workers={args.io_workers} render_workers={args.render_workers} "
+                  f"latency={args.latency}s profile={args.profile}")
+            for label, layout in (("monolithic", monolithic), ("pipelined", pipelined)):
+                start = time.perf_counter()
+                results = layout(make_jobs())
+                wall = time.perf_counter() - start
+                failed = [r for r in results if r["status"] != "completed"]
+                print(f"{label:<11} wall={wall:.1f}s jobs/min={args.jobs / wall * 60:.1f} failed={len(failed)}")
+                # Throughput of failed jobs means nothing; stop instead
+                if failed:
+                    raise SystemExit(f"{label}: {failed[0]['stage']} failed: {failed[0]['error']}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        s3_server.stop()
+
+
+if __name__ == "__main__":
+    main()
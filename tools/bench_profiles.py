@@ -0,0 +1,66 @@
+"""Benchmark matrix for the encode profiles: time, size and PSNR/SSIM.
+
+Each profile is compared against a lossless (crf 0) render of the same
+slideshow. Usage: python tools/bench_profiles.py [--profiles preview,draft,standard,archival]
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from bench_common import child_cpu_seconds, make_synthetic_images
+from app.video_utils import ENCODE_PROFILES, ENCODE_SETTINGS, generate_cool_video
+from transitions import get_random_template
+
+REFERENCE_PROFILE = {**ENCODE_PROFILES["standard"], "preset": "ultrafast", "crf": 0, "profile": "reference"}
+
+
+def quality(distorted, reference, fps):
+    # Resample to the reference rate and size so lower-fps and preview
+    # profiles line up frame by frame
+    graph = (
+        f"[0:v]fps={fps},scale={ENCODE_SETTINGS['width']}:{ENCODE_SETTINGS['height']},"
+        f"setpts=PTS-STARTPTS,split[d1][d2];"
+        f"[1:v]setpts=PTS-STARTPTS,split[r1][r2];"
+        f"[d1][r1]psnr;[d2][r2]ssim"
+    )
+    cmd = ["ffmpeg", "-i", distorted, "-i", reference, "-lavfi", graph, "-f", "null", "-"]
+    stderr = subprocess.run(cmd, capture_output=True, text=True).stderr
+    psnr = re.search(r"PSNR .*average:([\d.]+|inf)", stderr)
+    ssim = re.search(r"SSIM .*All:([\d.]+)", stderr)
+    return (float(psnr.group(1)) if psnr else None, float(ssim.group(1)) if ssim else None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profiles", default=",".join(ENCODE_PROFILES))
+    args = parser.parse_args()
+
+    transitions, template = get_random_template(seed="bench")
+    workdir = tempfile.mkdtemp(prefix="bench_profiles_")
+    try:
+        images = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440)] * 10)
+        reference = os.path.join(workdir, "reference.mp4")
+        generate_cool_video(images, output=reference, transitions=transitions, profile=REFERENCE_PROFILE)
+
+        print(f"template={template}")
+        print(f"{'profile':<10} {'wall_s':>7} {'cpu_s':>7} {'size_MB':>8} {'psnr_dB':>8} {'ssim':>7}")
+        for name in args.profiles.split(","):
+            output = os.path.join(workdir, f"{name}.mp4")
+            cpu_before = child_cpu_seconds()
+            start = time.perf_counter()
+            generate_cool_video(images, output=output, transitions=transitions, profile=name)
+            wall = time.perf_counter() - start
+            cpu = child_cpu_seconds() - cpu_before
+            psnr, ssim = quality(output, reference, REFERENCE_PROFILE["fps"])
+            print(f"{name:<10} {wall:>7.2f} {cpu:>7.2f} {os.path.getsize(output) / 1e6:>8.2f} "
+                  f"{psnr or 0:>8.2f} {ssim or 0:>7.4f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Per-job render benchmark: still-image engine vs. the original looped-input graph.
+
+Usage: python tools/bench_render.py [--runs 2] [--size 3024x4032]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from bench_common import child_cpu_seconds, make_synthetic_images
+from app.video_utils import generate_cool_video
+from transitions import get_random_template
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=2)
+    parser.add_argument("--size", default="1080x1440", help="source image size WxH")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    transitions, template = get_random_template(seed="bench")
+    workdir = tempfile.mkdtemp(prefix="bench_render_")
+    try:
+        images = make_synthetic_images(os.path.join(workdir, "src"), [(width, height)] * 10)
+        print(f"template={template} source={args.size} runs={args.runs}")
+        for engine in ("loop", "still"):
+            walls, cpus = [], []
+            for run in range(args.runs):
+                output = os.path.join(workdir, f"{engine}{run}.mp4")
+                cpu_before = child_cpu_seconds()
+                start = time.perf_counter()
+                generate_cool_video(images, output=output, transitions=transitions, engine=engine)
+                walls.append(time.perf_counter() - start)
+                cpus.append(child_cpu_seconds() - cpu_before)
+            print(f"{engine:<6} wall={min(walls):.2f}s cpu={min(cpus):.2f}s size={os.path.getsize(output) / 1e6:.2f}MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""Multi-aspect output: one shared render pass vs one render per rendition.
+
+Usage: python tools/bench_renditions.py [--renditions 9x16,4x5,1x1,16x9] [--profile draft]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+
+from bench_common import child_cpu_seconds, make_synthetic_images, timed
+from app.video_utils import RENDITIONS, generate_cool_video
+from transitions import get_random_template
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--renditions", default=",".join(RENDITIONS))
+    parser.add_argument("--profile", default="standard")
+    parser.add_argument("--images", type=int, default=10)
+    args = parser.parse_args()
+    renditions = args.renditions.split(",")
+
+    transitions, template = get_random_template(seed="bench")
+    workdir = tempfile.mkdtemp(prefix="bench_renditions_")
+    try:
+        images = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440)] * args.images)
+        print(f"template={template} images={args.images} renditions={','.join(renditions)}")
+
+        # Separate renders: every image is decoded and crossfaded once per rendition
+        cpu = child_cpu_seconds()
+        separate = 0.0
+        for name in renditions:
+            wall, _ = timed(generate_cool_video, images, output=os.path.join(workdir, "separate.mp4"),
+                            transitions=transitions, profile=args.profile, renditions=[name])
+            separate += wall
+        separate_cpu = child_cpu_seconds() - cpu
+        print(f"{'separate':<9} wall={separate:7.2f}s cpu={separate_cpu:7.2f}s")
+
+        cpu = child_cpu_seconds()
+        shared, outputs = timed(generate_cool_video, images, output=os.path.join(workdir, "shared.mp4"),
+                                transitions=transitions, profile=args.profile, renditions=renditions)
+        shared_cpu = child_cpu_seconds() - cpu
+        print(f"{'shared':<9} wall={shared:7.2f}s cpu={shared_cpu:7.2f}s speedup={separate / shared:.2f}x")
+        for name, path in outputs.items():
+            print(f"  {name:<5} {os.path.getsize(path) / 1e6:6.2f} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Segment-parallel rendering: scaling with worker count and frame accuracy.
+
+Usage: python tools/bench_segments.py [--segments 4] [--max-workers N]
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from bench_common import make_synthetic_images
+from app.video_utils import generate_cool_video
+from transitions import get_random_template
+
+
+def frame_count(path):
+    cmd = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0", "-count_frames",
+        "-show_entries", "stream=nb_read_frames", "-of", "csv=p=0", path,
+    ]
+    return int(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--segments", type=int, default=4)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--profile", default="standard")
+    args = parser.parse_args()
+
+    transitions, template = get_random_template(seed="bench")
+    workdir = tempfile.mkdtemp(prefix="bench_segments_")
+    try:
+        images = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440)] * 10)
+
+        baseline = os.path.join(workdir, "single.mp4")
+        start = time.perf_counter()
+        generate_cool_video(images, output=baseline, transitions=transitions, profile=args.profile, segments=1)
+        single = time.perf_counter() - start
+        expected = frame_count(baseline)
+        print(f"template={template} cpus={os.cpu_count()} frames={expected}")
+        print(f"single-process          wall={single:.2f}s")
+
+        workers = 1
+        while workers <= args.max_workers:
+            output = os.path.join(workdir, f"segmented{workers}.mp4")
+            start = time.perf_counter()
+            generate_cool_video(images, output=output, transitions=transitions, profile=args.profile,
+                                segments=args.segments, workers=workers)
+            wall = time.perf_counter() - start
+            frames = frame_count(output)
+            status = "ok" if frames == expected else f"MISMATCH ({frames} frames)"
+            print(f"segments={args.segments} workers={workers:<3} wall={wall:.2f}s speedup={single / wall:.2f}x {status}")
+            workers *= 2
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Slide-count scaling: wall time, open inputs and peak ffmpeg RSS for N images.
+
+Each N runs in a fresh interpreter so the children's peak RSS is isolated.
+Usage: python tools/bench_slides.py [--counts 10,50,200]
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_common import make_synthetic_images
+from app import video_utils
+from transitions import get_random_template
+
+
+def run_one(count, workdir):
+    # A handful of distinct sources reused across slides keeps setup fast
+    sources = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440), (1440, 1080), (800, 1200)])
+    images = [sources[i % len(sources)] for i in range(count)]
+    transitions, _ = get_random_template(seed="bench", count=count - 1)
+
+    start = time.perf_counter()
+    video_utils.generate_cool_video(images, output=os.path.join(workdir, "out.mp4"), transitions=transitions)
+    wall = time.perf_counter() - start
+
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    segments = -(-(count - 1) // (video_utils.MAX_SLIDES_PER_SEGMENT - 1))
+    return {
+        "images": count,
+        "wall_s": round(wall, 2),
+        "segments": max(1, segments),
+        "max_inputs_per_process": min(count, video_utils.MAX_SLIDES_PER_SEGMENT),
+        "peak_child_rss_mb": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--counts", default="10,50,200")
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        workdir = tempfile.mkdtemp(prefix="bench_slides_")
+        try:
+            print(json.dumps(run_one(args.single, workdir)))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return
+
+    for count in (int(c) for c in args.counts.split(",")):
+        out = subprocess.run([sys.executable, __file__, "--single", str(count)],
+                             capture_output=True, text=True, check=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(" ".join(f"{k}={v}" for k, v in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""Render-then-upload vs. streaming ffmpeg output into an S3 multipart upload.
+
+Runs against moto's local S3 server (pip install "moto[server]").
+Usage: python tools/bench_stream_upload.py [--profile standard]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from bench_common import make_synthetic_images, start_s3_stand_in
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="standard")
+    args = parser.parse_args()
+
+    server = start_s3_stand_in()
+    # Imported after the stand-in sets the R2 env vars
+    from app.storage import R2_BUCKET, s3
+    from app.tasks import render_and_upload
+    from app.video_utils import get_encode_settings
+    from transitions import get_random_template
+
+    transitions, template = get_random_template(seed="bench")
+    settings = get_encode_settings(args.profile)
+    workdir = tempfile.mkdtemp(prefix="bench_stream_")
+    try:
+        images = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440)] * 10)
+        print(f"template={template} profile={args.profile}")
+        for label, stream in (("file+upload", False), ("streaming", True)):
+            job_dir = os.path.join(workdir, label)
+            os.makedirs(job_dir)
+            key = f"videos/bench-{label}.mp4"
+            start = time.perf_counter()
+            render_and_upload(images, key, transitions, settings, os.path.join(job_dir, "output.mp4"), stream=stream)
+            wall = time.perf_counter() - start
+            local = sum(os.path.getsize(os.path.join(job_dir, f)) for f in os.listdir(job_dir))
+            remote = s3.head_object(Bucket=R2_BUCKET, Key=key)["ContentLength"]
+            print(f"{label:<12} wall={wall:.2f}s local_output={local / 1e6:.2f}MB uploaded={remote / 1e6:.2f}MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
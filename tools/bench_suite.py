@@ -0,0 +1,168 @@
+"""End-to-end job benchmark: every stage, template and image size, as JSON.
+
+Synthetic stills (ffmpeg lavfi) in each size and format are served from a
+local HTTP server and every job is uploaded to moto's S3, so the numbers only
+depend on this machine and the code under test. For each size x format x
+template one job runs download -> render -> upload through app.tasks, and
+each stage records wall time, CPU time (this process plus ffmpeg), peak RSS
+(process tree) and bytes produced.
+
+Usage:
+  python tools/bench_suite.py --output bench.json
+  python tools/bench_suite.py --output new.json --compare bench.json
+
+Requires ffmpeg, `pip install "moto[server]" psutil`.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+import uuid
+
+from bench_common import ImageServer, PeakRSS, make_synthetic_images, process_cpu_seconds, start_s3_stand_in
+from transitions import TEMPLATE_NAMES, get_random_template
+
+METRICS = ("wall_s", "cpu_s", "peak_rss_mb", "bytes")
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(fn):
+    """Run fn() and return (result, wall_s, cpu_s, peak_rss_mb)."""
+    cpu = process_cpu_seconds()
+    start = time.perf_counter()
+    with PeakRSS() as rss:
+        result = fn()
+    return result, time.perf_counter() - start, process_cpu_seconds() - cpu, rss.peak_bytes / 1024 ** 2
+
+
+def file_bytes(paths):
+    return sum(os.path.getsize(p) for p in paths if os.path.exists(p))
+
+
+def run_job(tasks, urls, template, profile):
+    """One job through the three stages; returns a list of stage records."""
+    from app.progress import JobProgress
+
+    job = tasks.new_job(str(uuid.uuid4()), urls, profile=profile)
+    progress = JobProgress(None, None)
+    records = []
+
+    def stage(name, fn, produced):
+        nonlocal job
+        job, wall, cpu, rss = measure(lambda: tasks._run_stage(job, progress, fn))
+        if job.get("error"):
+            raise RuntimeError(f"{name} failed: {job['error']}")
+        records.append({"stage": name, "wall_s": round(wall, 3), "cpu_s": round(cpu, 3),
+                        "peak_rss_mb": round(rss, 1), "bytes": produced()})
+
+    stage("download", tasks._download, lambda: file_bytes(job["image_paths"]))
+    # Force the template under test and a fresh key so nothing is reused
+    job["transitions"], job["template"] = get_random_template(count=len(urls) - 1, template=template)
+    job["key"] = f"bench/{job['job_id']}.mp4"
+    job["reused"] = False
+    stage("render", tasks._render, lambda: file_bytes(job.get("outputs", {}).values()))
+    stage("upload", tasks._upload, lambda: file_bytes(job["outputs"].values()))
+    tasks._finish(job)
+    return records
+
+
+def compare(results, baseline_path, threshold):
+    """Print per-case changes against an earlier run; returns the regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    key = lambda r: (r["size"], r["format"], r["template"], r["stage"])
+    before = {key(r): r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} (commit {baseline.get('commit')}):")
+    regressions = []
+    for r in results:
+        old = before.get(key(r))
+        if not old:
+            continue
+        changes = []
+        for metric in METRICS:
+            if old[metric]:
+                delta = (r[metric] - old[metric]) / old[metric]
+                changes.append(f"{metric}={delta:+.0%}")
+                if metric in ("wall_s", "cpu_s") and delta > threshold:
+                    regressions.append((key(r), metric, delta))
+        print(f"  {'/'.join(map(str, key(r))):<40} " + " ".join(changes))
+    for case, metric, delta in regressions:
+        print(f"REGRESSION {'/'.join(map(str, case))} {metric} {delta:+.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="640x480,1080x1440,4000x3000")
+    parser.add_argument("--formats", default="jpg,png,webp")
+    parser.add_argument("--templates", default=",".join(TEMPLATE_NAMES))
+    parser.add_argument("--images", type=int, default=10)
+    parser.add_argument("--profile", default="draft")
+    parser.add_argument("--latency", type=float, default=0.05, help="per-image server latency (s)")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--compare", help="earlier JSON output to diff against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="wall/CPU increase reported as a regression")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    # Measure real downloads and normalization, not cache hits
+    os.environ["IMAGE_CACHE_DIR"] = ""
+    os.environ["JOB_DIR"] = os.path.join(workdir, "jobs")
+    os.environ["STREAM_UPLOAD"] = "false"
+    s3_server = start_s3_stand_in()
+    from app import tasks
+
+    # Keep benchmark renders out of the shared render-time history (admission ETA)
+    tasks.record_render_time = lambda seconds: None
+
+    results = []
+    try:
+        for size in args.sizes.split(","):
+            width, height = map(int, size.split("x"))
+            for fmt in args.formats.split(","):
+                sources = make_synthetic_images(os.path.join(workdir, f"src_{size}_{fmt}"),
+                                                [(width, height)] * args.images, ext=fmt)
+                payloads = {}
+                for i, path in enumerate(sources):
+                    with open(path, "rb") as f:
+                        payloads[f"img{i}.{fmt}"] = f.read()
+
+                with ImageServer(payloads, latency=args.latency) as server:
+                    for template in args.templates.split(","):
+                        urls = [f"{server.url(name)}?run={uuid.uuid4()}" for name in payloads]
+                        for record in run_job(tasks, urls, template, args.profile):
+                            record = {"size": size, "format": fmt, "template": template, **record}
+                            results.append(record)
+                            print(" ".join(f"{k}={v}" for k, v in record.items()))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        s3_server.stop()
+
+    report = {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": {"platform": platform.platform(), "python": platform.python_version(), "cpus": os.cpu_count()},
+        "config": vars(args),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {len(results)} results to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Compare building a Supabase client per call with the client registry.
+
+Runs `--queries` token-scoped lookups against a local PostgREST stand-in
+(HTTPS unless --plain) from `--threads` threads, once building a new client
+per call as upsert_social_record used to, and once through
+get_supabase_client(token). Reports wall time per query and how many
+connections (TCP + TLS handshakes) the stand-in accepted.
+
+Usage: python tools/bench_supabase_clients.py [--queries 200] [--threads 8] [--tokens 4] [--plain]
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_common import PostgrestServer, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=4, help="distinct user tokens in the mix")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--plain", action="store_true", help="plain HTTP instead of HTTPS")
+    args = parser.parse_args()
+
+    tables = {"social_accounts": [{"user_id": "1", "provider": "facebook", "account_id": "page1"}]}
+    with PostgrestServer(tables, latency=args.latency, tls=not args.plain) as server:
+        server.configure_env()
+        from supabase import create_client
+
+        from app import supabase_client
+        tokens = [f"user{i}.token.sig" for i in range(args.tokens)]
+
+        def per_call(i):
+            client = create_client(supabase_client._SUPA_URL, supabase_client._SUPA_SERVICE_ROLE)
+            client.postgrest.auth(tokens[i % len(tokens)])
+            return client.table("social_accounts").select("*").eq("user_id", "1").execute()
+
+        def registry(i):
+            client = supabase_client.get_supabase_client(tokens[i % len(tokens)])
+            return client.table("social_accounts").select("*").eq("user_id", "1").execute()
+
+        results = {}
+        for name, fn in (("per-call", per_call), ("registry", registry)):
+            before = server.connections
+            with ThreadPoolExecutor(args.threads) as pool:
+                seconds, _ = timed(lambda: list(pool.map(fn, range(args.queries))))
+            results[name] = (seconds, server.connections - before)
+
+    scheme = "http" if args.plain else "https"
+    print(f"queries={args.queries} threads={args.threads} tokens={args.tokens} {scheme}")
+    for name, (seconds, connections) in results.items():
+        print(f"{name:<9} {seconds * 1000 / args.queries:7.2f} ms/query  connections={connections}")
+    print(f"registry is {results['per-call'][0] / results['registry'][0]:.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
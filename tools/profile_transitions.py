@@ -0,0 +1,80 @@
+"""Measure the CPU cost of every xfade transition and write transition_costs.json.
+
+Renders a held slide and then each transition on its own at the chosen
+profile's canvas, and records the CPU seconds (ffmpeg user+system) per output
+frame. transitions.get_template_within_budget reads the table to keep jobs
+inside a CPU budget. Run it on the render hosts and commit or deploy the result.
+
+Usage: python tools/profile_transitions.py [--profile standard] [--seconds 2] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from bench_common import child_cpu_seconds, make_synthetic_images
+from app.video_utils import _run_ffmpeg, build_video_command, get_encode_settings
+from transitions import TRANSITION_COSTS_PATH, TRANSITIONS
+
+
+def cpu_per_frame(cmd, frames, repeat):
+    samples = []
+    for _ in range(repeat):
+        cpu = child_cpu_seconds()
+        _run_ffmpeg(cmd)
+        samples.append((child_cpu_seconds() - cpu) / frames)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="standard")
+    parser.add_argument("--seconds", type=float, default=2.0, help="length of each measured transition")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=TRANSITION_COSTS_PATH)
+    args = parser.parse_args()
+
+    settings = get_encode_settings(args.profile)
+    frames = round(args.seconds * settings["fps"])
+    workdir = tempfile.mkdtemp(prefix="profile_transitions_")
+    try:
+        images = make_synthetic_images(os.path.join(workdir, "src"), [(1080, 1440), (1440, 1080)])
+        output = os.path.join(workdir, "out.mp4")
+
+        # A held slide: what every frame costs without a transition
+        hold = cpu_per_frame(
+            build_video_command(images[:1], output, profile=args.profile, durations=[args.seconds]),
+            frames, args.repeat
+        )
+        print(f"{'hold':<12} {hold * 1000:7.2f} ms/frame")
+
+        costs = {}
+        for name in TRANSITIONS:
+            # Two slides that are on screen only for the crossfade between them
+            cmd = build_video_command(images, output, transitions=[name], profile=args.profile,
+                                      durations=[args.seconds] * 2, transition_durations=[args.seconds])
+            costs[name] = cpu_per_frame(cmd, frames, args.repeat)
+            print(f"{name:<12} {costs[name] * 1000:7.2f} ms/frame  ({costs[name] / hold:.2f}x hold)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    version = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True).stdout.split("\n")[0]
+    with open(args.output, "w") as f:
+        json.dump({
+            "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "ffmpeg": version,
+            "profile": args.profile,
+            "cpus": os.cpu_count(),
+            "pixels": settings["width"] * settings["height"],
+            "hold": hold,
+            "transitions": costs,
+        }, f, indent=2)
+    print(f"wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,104 @@
 # app/transitions.py
+import json
+import logging
+import os
 import random
 
-def get_random_template():
+logger = logging.getLogger(__name__)
+
+TEMPLATE_NAMES = ["classic", "slide", "mix", "random"]
+
+# Every xfade transition the templates can use
+TRANSITIONS = [
+    "fade", "slideleft", "slideright", "slideup", "slidedown", "circlecrop",
+    "rectcrop", "distance", "smoothleft"
+]
+
+# Measured CPU cost per frame, written by `python tools/profile_transitions.py`
+TRANSITION_COSTS_PATH = os.getenv(
+    "TRANSITION_COSTS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "transition_costs.json")
+)
+
+def get_random_template(seed=None, count=9, template=None):
+    # Pass a seed (e.g. a job fingerprint) to get the same template for the same job.
+    # Templates repeat cyclically to cover `count` transitions (slides - 1).
+    # Pass `template` to force one of TEMPLATE_NAMES (benchmarks, comparisons).
+    rng = random.Random(seed)
     templates = {
         "classic": ["fade"] * 9,
         "slide": ["slideleft", "slideright", "slideup", "slidedown", "slideleft", "slideright", "slideup", "slidedown", "slideleft"],
         "mix": ["fade", "slideleft", "circlecrop", "rectcrop", "distance", "slideup", "slidedown", "smoothleft", "slideright"],
-        "random": random.sample([
+        "random": rng.sample([
             "fade", "slideleft", "slideright", "circlecrop", "rectcrop",
             "distance", "slideup", "slidedown", "smoothleft"
         ], 9)
     }
-    chosen = random.choice(list(templates.keys()))
-    return templates[chosen], chosen
+    chosen = template or rng.choice(list(templates.keys()))
+    pattern = templates[chosen]
+    return [pattern[i % len(pattern)] for i in range(count)], chosen
+
+
+_costs = None
+
+def load_transition_costs(path=None):
+    # {"pixels": ..., "hold": cpu_s_per_frame, "transitions": {name: cpu_s_per_frame}}.
+    # Without a profiled table every transition costs the same as a held frame,
+    # so budgets still bound the frame count but never substitute anything.
+    global _costs
+    if path is None and _costs is not None:
+        return _costs
+    try:
+        with open(path or TRANSITION_COSTS_PATH) as f:
+            costs = json.load(f)
+    except (OSError, ValueError):
+        costs = {"pixels": 1080 * 1920, "hold": 1.0, "transitions": {}}
+    if path is None:
+        _costs = costs
+    return costs
+
+
+def estimate_render_cost(transitions, transition_frames, hold_frames, pixels=1080 * 1920, costs=None):
+    # Estimated CPU seconds for a render: held frames plus each transition's
+    # frames at its measured per-frame cost, scaled by canvas size.
+    costs = costs or load_transition_costs()
+    per_frame = costs["transitions"]
+    cost = hold_frames * costs["hold"]
+    for name, frames in zip(transitions, transition_frames):
+        cost += frames * per_frame.get(name, costs["hold"])
+    return cost * pixels / costs["pixels"]
+
+
+def get_template_within_budget(seed=None, count=9, budget=None, transition_frames=None, hold_frames=0,
+                               pixels=1080 * 1920, costs=None):
+    # get_random_template, then swap the most expensive transitions for the
+    # cheapest profiled one until the estimated CPU seconds fit `budget`.
+    # Returns (transitions, template, estimated_cost); the template name gets
+    # a "-budget" suffix when anything was substituted.
+    transitions, chosen = get_random_template(seed=seed, count=count)
+    costs = costs or load_transition_costs()
+    if transition_frames is None:
+        transition_frames = [30] * count
+    estimate = lambda names: estimate_render_cost(names, transition_frames, hold_frames, pixels, costs)
+    cost = estimate(transitions)
+    if budget is not None and not costs["transitions"]:
+        logger.warning("render_budget %s ignored: no transition cost table at %s", budget, TRANSITION_COSTS_PATH)
+    if budget is None or cost <= budget or not costs["transitions"]:
+        return transitions, chosen, cost
+
+    per_frame = costs["transitions"]
+    cheapest = min(per_frame, key=per_frame.get)
+    # Largest savings first; ties keep their order so the result stays deterministic
+    savings = sorted(
+        range(count),
+        key=lambda i: -(per_frame.get(transitions[i], costs["hold"]) - per_frame[cheapest]) * transition_frames[i]
+    )
+    substituted = list(transitions)
+    for i in savings:
+        if cost <= budget:
+            break
+        if substituted[i] == cheapest:
+            continue
+        substituted[i] = cheapest
+        cost = estimate(substituted)
+    # Over budget even with the cheapest transitions: the best we can do
+    return substituted, chosen if substituted == transitions else f"{chosen}-budget", cost